@@ -0,0 +1,35 @@
+import datetime
+import json
+import platform
+import subprocess
+from pathlib import Path
+from typing import Any
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            cwd=Path(__file__).parent,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(name: str, results: dict[str, Any], output: str | None) -> None:
+    payload = {
+        "benchmark": name,
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "results": results,
+    }
+    data = json.dumps(payload, indent=2)
+    if output:
+        Path(output).write_text(data + "\n")
+    else:
+        print(data)
@@ -0,0 +1,29 @@
+from gemapi.applications import Application
+from gemapi.applications import Input
+from gemapi.applications import Request
+from gemapi.responses import Response
+from gemapi.responses import StatusCode
+
+app = Application()
+
+_PAGE = "\n".join(f"=> /posts/{i} Post {i}" for i in range(200))
+
+
+@app.route("/")
+async def index(req: Request) -> Response:
+    return Response(StatusCode.SUCCESS, "text/gemini", "# Hello")
+
+
+@app.route("/hello/{name}")
+async def hello(req: Request, name: str) -> Response:
+    return Response(StatusCode.SUCCESS, "text/gemini", f"Hello {name}")
+
+
+@app.route("/search")
+async def search(req: Request, q: Input) -> Response:
+    return Response(StatusCode.SUCCESS, "text/gemini", q.get_value())
+
+
+@app.route("/page")
+async def page(req: Request) -> Response:
+    return Response(StatusCode.SUCCESS, "text/gemini", _PAGE)
@@ -0,0 +1,73 @@
+"""Compare the trie based Router.match with a linear scan over the routes.
+
+Usage: python -m benchmarks.bench_router
+"""
+
+import timeit
+
+from gemapi.request import Request
+from gemapi.router import Route
+from gemapi.router import Router
+
+ROUTE_COUNTS = (10, 100, 1000)
+NUMBER = 10_000
+
+
+def _handler(req: Request, slug: str) -> None:
+    return None
+
+
+def build_router(route_count: int) -> Router:
+    router = Router()
+    for i in range(route_count // 2):
+        router.route(f"/section{i}/{{slug}}")(_handler)
+        router.route(f"/section{i}/posts/{{slug}}")(_handler)
+    return router
+
+
+def linear_match(
+    routes: list[Route], path: str
+) -> tuple[Route | None, dict[str, str] | None]:
+    # The Router.match implementation before the trie
+    for route in routes:
+        if m := route.path_regex.match(path):
+            return route, m.groupdict()
+
+    return None, None
+
+
+def bench(route_count: int) -> dict[str, float]:
+    router = build_router(route_count)
+    routes = router._routes
+    last = route_count // 2 - 1
+    paths = {
+        "first": "/section0/hello",
+        "last": f"/section{last}/posts/hello",
+        "miss": "/nope/not-found",
+    }
+    results = {}
+    for name, path in paths.items():
+        assert router.match(path)[0] is linear_match(routes, path)[0]
+        for impl, func in (
+            ("trie", lambda: router.match(path)),
+            ("linear", lambda: linear_match(routes, path)),
+        ):
+            elapsed = min(timeit.repeat(func, number=NUMBER, repeat=3))
+            results[f"{impl}_{name}"] = elapsed / NUMBER * 1e9
+
+    return results
+
+
+def main() -> None:
+    print(f"{'routes':>6} {'case':>6} {'trie (ns)':>10} {'linear (ns)':>12}")
+    for route_count in ROUTE_COUNTS:
+        results = bench(route_count)
+        for case in ("first", "last", "miss"):
+            print(
+                f"{route_count:>6} {case:>6} {results[f'trie_{case}']:>10.0f} "
+                f"{results[f'linear_{case}']:>12.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""Compare two benchmark result files.
+
+Usage: python -m benchmarks.compare baseline.json candidate.json
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+
+def _numeric_results(path: str) -> dict[str, float]:
+    payload = json.loads(Path(path).read_text())
+    return {
+        name: value
+        for name, value in payload["results"].items()
+        if isinstance(value, (int, float))
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args()
+
+    baseline = _numeric_results(args.baseline)
+    candidate = _numeric_results(args.candidate)
+
+    width = max(len(name) for name in baseline | candidate)
+    for name in sorted(baseline.keys() & candidate.keys()):
+        before, after = baseline[name], candidate[name]
+        change = (after - before) / before * 100 if before else 0.0
+        print(f"{name:<{width}}  {before:>14.6g}  {after:>14.6g}  {change:+7.1f}%")
+
+
+if __name__ == "__main__":
+    main()
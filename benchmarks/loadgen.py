@@ -0,0 +1,193 @@
+"""TLS load generator for a gemapi server.
+
+Usage: python -m benchmarks.loadgen [--concurrency 50] [--duration 10]
+
+Without --port, the benchmark app (benchmarks/app.py) is started in a
+subprocess and its RSS is reported.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import ssl
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks._utils import write_results
+
+_DEFAULT_PATHS = ["/", "/hello/world", "/search?q", "/page"]
+
+
+def _run_server(port: int, directory: str) -> None:
+    from loguru import logger
+
+    from benchmarks.app import app
+    from gemapi.access_log import AccessLogger
+    from gemapi.server import Server
+
+    os.chdir(directory)
+    logger.remove()
+    app.access_logger = AccessLogger(sink=lambda lines: None)
+    asyncio.run(Server(app).run("localhost", port))
+
+
+def _rss_kib(pid: int) -> dict[str, int] | None:
+    try:
+        status = Path(f"/proc/{pid}/status").read_text()
+    except OSError:
+        return None
+
+    rss = {}
+    for line in status.splitlines():
+        key, _, value = line.partition(":")
+        if key in {"VmRSS", "VmHWM"}:
+            rss[key] = int(value.split()[0])
+    return rss
+
+
+def _percentile(sorted_values: list[float], percentile: float) -> float | None:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * percentile))
+    return sorted_values[index]
+
+
+class _Stats:
+    def __init__(self) -> None:
+        self.latencies: list[float] = []
+        self.handshakes: list[float] = []
+        self.errors = 0
+        self.statuses: dict[str, int] = {}
+
+
+async def _request(
+    stats: _Stats,
+    ssl_ctx: ssl.SSLContext,
+    host: str,
+    port: int,
+    path: str,
+) -> None:
+    started_at = time.perf_counter()
+    try:
+        reader, writer = await asyncio.open_connection(
+            host, port, ssl=ssl_ctx, server_hostname=host
+        )
+        handshake_done_at = time.perf_counter()
+        writer.write(f"gemini://{host}{path}\r\n".encode())
+        await writer.drain()
+        data = await reader.read()
+        writer.close()
+    except (OSError, ssl.SSLError, asyncio.IncompleteReadError):
+        stats.errors += 1
+        return None
+
+    finished_at = time.perf_counter()
+    stats.handshakes.append(handshake_done_at - started_at)
+    stats.latencies.append(finished_at - started_at)
+    status = data[:2].decode(errors="replace")
+    stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+
+async def _worker(
+    stats: _Stats,
+    ssl_ctx: ssl.SSLContext,
+    host: str,
+    port: int,
+    paths: list[str],
+    deadline: float,
+) -> None:
+    i = 0
+    while time.monotonic() < deadline:
+        await _request(stats, ssl_ctx, host, port, paths[i % len(paths)])
+        i += 1
+
+
+async def run_load(
+    host: str,
+    port: int,
+    concurrency: int,
+    duration: float,
+    paths: list[str],
+) -> dict:
+    ssl_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    ssl_ctx.check_hostname = False
+    ssl_ctx.verify_mode = ssl.CERT_NONE
+
+    stats = _Stats()
+    started_at = time.monotonic()
+    await asyncio.gather(
+        *[
+            _worker(stats, ssl_ctx, host, port, paths, started_at + duration)
+            for _ in range(concurrency)
+        ]
+    )
+    elapsed = time.monotonic() - started_at
+
+    latencies = sorted(stats.latencies)
+    handshakes = sorted(stats.handshakes)
+    return {
+        "concurrency": concurrency,
+        "duration": elapsed,
+        "requests": len(latencies),
+        "errors": stats.errors,
+        "statuses": stats.statuses,
+        "requests_per_second": len(latencies) / elapsed,
+        "latency_p50": _percentile(latencies, 0.5),
+        "latency_p99": _percentile(latencies, 0.99),
+        "latency_p999": _percentile(latencies, 0.999),
+        "handshake_p50": _percentile(handshakes, 0.5),
+        "handshake_p99": _percentile(handshakes, 0.99),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=None,
+        help="Target an already running server instead of the benchmark app",
+    )
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--path", action="append", dest="paths")
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    args = parser.parse_args()
+
+    server = None
+    port = args.port
+    with tempfile.TemporaryDirectory() as directory:
+        if port is None:
+            port = 19650
+            server = multiprocessing.Process(
+                target=_run_server, args=(port, directory), daemon=True
+            )
+            server.start()
+            # Wait for the certificate to be generated and the port bound
+            time.sleep(1)
+
+        try:
+            results = asyncio.run(
+                run_load(
+                    args.host,
+                    port,
+                    args.concurrency,
+                    args.duration,
+                    args.paths or _DEFAULT_PATHS,
+                )
+            )
+            if server and server.pid:
+                results["server_rss_kib"] = _rss_kib(server.pid)
+        finally:
+            if server:
+                server.terminate()
+                server.join()
+
+    write_results("loadgen", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Micro-benchmarks for the request hot path.
+
+Usage: python -m benchmarks.micro [--output results.json]
+
+Each result is the best time per operation in nanoseconds.
+"""
+
+import argparse
+import asyncio
+import timeit
+from typing import Any
+from typing import Callable
+from urllib.parse import urlparse
+
+from benchmarks import bench_router
+from benchmarks._utils import write_results
+from benchmarks.app import app
+from gemapi.applications import Application
+from gemapi.middleware import Middleware
+from gemapi.request import Request
+from gemapi.request import parse_request_line
+from gemapi.responses import NotFoundError
+from gemapi.responses import Response
+from gemapi.templates import compile_template
+
+_REPEAT = 5
+
+
+def _time_per_op(func: Callable[[], Any]) -> float:
+    number, _ = timeit.Timer(func).autorange()
+    best = min(timeit.repeat(func, number=number, repeat=_REPEAT))
+    return best / number * 1e9
+
+
+def _urlparse_request_line(data: bytes) -> Any:
+    # The urlparse based parser used before parse_request_line, as a reference
+    parsed_url = urlparse(data.decode()[:-2])
+    if parsed_url.scheme != "gemini":
+        raise ValueError(f"Invalid scheme {parsed_url.scheme}")
+
+    if parsed_url.path == "":
+        parsed_url = parsed_url._replace(path="/")
+
+    if any(segment in {".", ".."} for segment in parsed_url.path.split("/")):
+        raise ValueError("dot segments in path are not allowed")
+
+    return parsed_url
+
+
+def bench_parse_request_line() -> dict[str, float]:
+    results = {}
+    for name, data in [
+        ("root", b"gemini://localhost\r\n"),
+        ("query", b"gemini://localhost/hello/world?q=1\r\n"),
+        ("long", b"gemini://localhost/" + b"a/" * 500 + b"\r\n"),
+    ]:
+        results[f"parse_request_line_{name}"] = _time_per_op(
+            lambda: parse_request_line(data)
+        )
+        results[f"parse_request_line_{name}_urlparse"] = _time_per_op(
+            lambda: _urlparse_request_line(data)
+        )
+    return results
+
+
+def bench_router_match() -> dict[str, float]:
+    results = {}
+    for route_count in bench_router.ROUTE_COUNTS:
+        for name, value in bench_router.bench(route_count).items():
+            if name.startswith("trie_"):
+                case = name.removeprefix("trie_")
+                results[f"router_match_{route_count}_{case}"] = value
+    return results
+
+
+def bench_response_as_bytes() -> dict[str, float]:
+    small = Response(20, "text/gemini", "# Hello")
+    large = Response(20, "text/gemini", "=> /posts/1 Post\n" * 5000)
+    large_bytes = Response(20, "text/gemini", b"=> /posts/1 Post\n" * 5000)
+    return {
+        "response_as_bytes_small": _time_per_op(small.as_bytes),
+        "response_as_bytes_large": _time_per_op(large.as_bytes),
+        "response_as_bytes_large_bytes": _time_per_op(large_bytes.as_bytes),
+        "status_error_as_bytes": _time_per_op(
+            lambda: NotFoundError("Not found").as_response().as_bytes()
+        ),
+    }
+
+
+def bench_template_render() -> dict[str, float]:
+    render = compile_template(
+        "# {{ title }}\n{% for post in posts %}\n=> {{ post.url }} {{ post.title }}\n"
+        "{% endfor %}\n"
+    )
+    context = {
+        "title": "Posts",
+        "posts": [{"url": f"/posts/{i}", "title": f"Post {i}"} for i in range(100)],
+    }
+
+    def _fstring() -> bytes:
+        lines = [f"# {context['title']}"]
+        for post in context["posts"]:
+            lines.append(f"=> {post['url']} {post['title']}")  # type: ignore
+        return "\n".join(lines).encode("utf-8")
+
+    return {
+        "template_render_100_links": _time_per_op(lambda: render(context)),
+        "template_render_100_links_fstring": _time_per_op(_fstring),
+    }
+
+
+def bench_process_request() -> dict[str, float]:
+    loop = asyncio.new_event_loop()
+    results = {}
+    for name, url in [
+        ("static", "gemini://localhost/"),
+        ("path_param", "gemini://localhost/hello/world"),
+        ("input", "gemini://localhost/search?q"),
+        ("not_found", "gemini://localhost/nope"),
+    ]:
+        req = Request(
+            parsed_url=parse_request_line(url.encode() + b"\r\n"),
+            client_host="127.0.0.1",
+            client_port=0,
+        )
+
+        async def _run(iterations: int) -> None:
+            for _ in range(iterations):
+                try:
+                    await app._process_request(req)
+                except Exception:
+                    pass
+
+        results[f"process_request_{name}"] = (
+            _time_per_op(lambda: loop.run_until_complete(_run(100))) / 100
+        )
+
+    loop.close()
+    return results
+
+
+class _NoopMiddleware(Middleware):
+    def before(self, req: Request) -> None:
+        return None
+
+    async def after(self, req: Request, resp: Response) -> Response:
+        return resp
+
+
+def bench_middleware() -> dict[str, float]:
+    # Cost of the composed pipeline on top of a plain route
+    loop = asyncio.new_event_loop()
+    req = Request(
+        parsed_url=parse_request_line(b"gemini://localhost/\r\n"),
+        client_host="127.0.0.1",
+        client_port=0,
+    )
+    results = {}
+    for count in [0, 1, 3]:
+        middleware_app = Application()
+
+        @middleware_app.route("/")
+        async def index(req: Request) -> Response:
+            return Response(20, "text/gemini", "# Hello")
+
+        for _ in range(count):
+            middleware_app.add_middleware(_NoopMiddleware())
+
+        async def _run(iterations: int) -> None:
+            for _ in range(iterations):
+                await middleware_app._process_request(req)
+
+        results[f"middleware_{count}"] = (
+            _time_per_op(lambda: loop.run_until_complete(_run(100))) / 100
+        )
+
+    loop.close()
+    return results
+
+
+BENCHMARKS = [
+    bench_parse_request_line,
+    bench_router_match,
+    bench_response_as_bytes,
+    bench_template_render,
+    bench_process_request,
+    bench_middleware,
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    args = parser.parse_args()
+
+    results: dict[str, float] = {}
+    for benchmark in BENCHMARKS:
+        results.update(benchmark())
+
+    write_results("micro", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
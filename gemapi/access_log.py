@@ -0,0 +1,116 @@
+import queue
+import random
+import threading
+import time
+from typing import Callable
+from typing import NamedTuple
+
+from loguru import logger
+
+from gemapi.request import RequestTarget
+from gemapi.responses import StatusCode
+
+
+class AccessLogRecord(NamedTuple):
+    client_host: str
+    client_port: int
+    parsed_url: RequestTarget | None
+    status_code: StatusCode
+    meta: str
+    duration: float
+
+    def format(self) -> str:
+        url = self.parsed_url.geturl() if self.parsed_url else "-"
+        return (
+            f"{self.client_host}:{self.client_port} - {url} "
+            f"{self.status_code.name} {self.status_code.value} {self.meta} "
+            f"{self.duration * 1000:.2f}ms"
+        )
+
+
+def _loguru_sink(lines: list[str]) -> None:
+    for line in lines:
+        logger.info(line)
+
+
+_STOP = object()
+
+
+class AccessLogger:
+    # Records are formatted and written by a background thread so the
+    # request path never waits on log I/O. When the queue is full, records
+    # are dropped (and counted) instead of applying backpressure.
+    def __init__(
+        self,
+        sink: Callable[[list[str]], None] = _loguru_sink,
+        success_sample_rate: float = 1.0,
+        max_queue_size: int = 10_000,
+        batch_size: int = 256,
+        flush_interval: float = 0.5,
+    ) -> None:
+        self._sink = sink
+        self._success_sample_rate = success_sample_rate
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._thread: threading.Thread | None = None
+
+        self.dropped = 0
+
+    def log(self, record: AccessLogRecord) -> None:
+        if (
+            self._success_sample_rate < 1.0
+            and record.status_code < StatusCode.TEMPORARY_FAILURE
+            and random.random() >= self._success_sample_rate
+        ):
+            return None
+
+        # Started lazily so it runs in the worker processes
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run,
+                name="gemapi-access-log",
+                daemon=True,
+            )
+            self._thread.start()
+
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self) -> None:
+        if self._thread is None:
+            return None
+
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            batch = []
+            deadline = time.monotonic() + self._flush_interval
+            while item is not _STOP:
+                batch.append(item)
+                if len(batch) >= self._batch_size:
+                    break
+
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+
+            if batch:
+                try:
+                    self._sink([record.format() for record in batch])
+                except Exception:
+                    logger.exception("Failed to write access logs")
+
+            if item is _STOP:
+                return None
@@ -1,32 +1,291 @@
 import asyncio
+import functools
+import time
+from concurrent.futures import Executor
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
 from typing import Any
-from urllib.parse import urlparse
+from typing import Awaitable
+from typing import Callable
 
 from loguru import logger
 
+from gemapi.access_log import AccessLogger
+from gemapi.access_log import AccessLogRecord
+from gemapi.cache import CachedResponse
+from gemapi.cache import CacheKey
+from gemapi.cache import ResponseCache
+from gemapi.certificates import load_client_certificate
+from gemapi.content import ContentIndex
+from gemapi.metrics import BYTES_BUCKETS
+from gemapi.metrics import MetricsRegistry
+from gemapi.middleware import Endpoint
+from gemapi.middleware import Middleware
+from gemapi.middleware import compose
+from gemapi.proxy import Proxy
+from gemapi.proxy import Upstream
+from gemapi.proxy import parse_upstream_url
+from gemapi.ratelimit import RateLimiter
+from gemapi.request import ClientCertificate
 from gemapi.request import Input
 from gemapi.request import Request
+from gemapi.request import RequestTarget
 from gemapi.request import SensitiveInput
+from gemapi.request import parse_request_line
 from gemapi.responses import BadRequestError
 from gemapi.responses import BadRequestResponse
+from gemapi.responses import CertificateNotValidError
+from gemapi.responses import ClientCertificateRequiredError
 from gemapi.responses import InputResponse
 from gemapi.responses import NotFoundError
 from gemapi.responses import Response
 from gemapi.responses import SensitiveInputResponse
+from gemapi.responses import ServerUnavailableError
+from gemapi.responses import StallTimeoutWriter
+from gemapi.responses import StatusCode
 from gemapi.responses import StatusError
 from gemapi.responses import TemporaryFailureResponse
+from gemapi.router import Route
 from gemapi.router import Router
+from gemapi.staticfiles import StaticFiles
+from gemapi.templates import Templates
+
+# Serves the paths without a route (None when nothing matches)
+Mount = Proxy | ContentIndex | StaticFiles | None
+
+
+@dataclass
+class TimeoutStats:
+    handshake: int = 0
+    request: int = 0
+    write: int = 0
 
 
 class Application:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        response_cache: ResponseCache | None = None,
+        request_timeout: float | None = 10.0,
+        write_timeout: float | None = 60.0,
+        executor: Executor | None = None,
+        rate_limiter: RateLimiter | None = None,
+        access_logger: AccessLogger | None = None,
+        templates: Templates | None = None,
+    ) -> None:
+        # Non-coroutine handlers are run in this executor so they cannot
+        # block the event loop, a ProcessPoolExecutor can be used for CPU
+        # bound handlers
+        self._executor = executor or ThreadPoolExecutor(
+            thread_name_prefix="gemapi-handler"
+        )
+        self.executor_queue_depth = 0
+        self.rate_limiter = rate_limiter
+        self.access_logger = access_logger or AccessLogger()
+        self.templates = templates or Templates()
+        self._request_timeout = request_timeout
+        self._write_timeout = write_timeout
+        self.timeout_stats = TimeoutStats()
+        # Set by the server when shutting down, requests arriving while the
+        # in-flight ones complete are answered with a 41
+        self.draining = False
         self._default_router = Router()
         self._hostnames: dict[str, Router] = {}
+        self._static_mounts: list[StaticFiles] = []
+        self._proxy_mounts: list[Proxy] = []
+        self._content_indexes: list[ContentIndex] = []
+        # Shared by the proxy mounts, keyed by (host, port)
+        self._upstreams: dict[tuple[str, int], Upstream] = {}
+        self._middlewares: list[Middleware] = []
+        # Awaited by the server before accepting connections
+        self._startup_hooks: list[Callable[[], Awaitable[None]]] = []
+        # Middlewares composed with each route and mount, keyed by their id
+        self._pipelines: dict[int, Endpoint] = {}
+        # Executions of the coalesced routes, keyed like the response cache
+        self._in_flight: dict[CacheKey, asyncio.Future[Response | None]] = {}
+        self.coalesced_requests = 0
+        self.response_cache = (
+            response_cache if response_cache is not None else ResponseCache()
+        )
+        self.metrics = MetricsRegistry()
+        self._register_metrics()
+
+    def _register_metrics(self) -> None:
+        self._connections_in_flight = self.metrics.gauge(
+            "gemapi_connections_in_flight",
+            "Number of connections being processed.",
+        )
+        self._request_parse_seconds = self.metrics.histogram(
+            "gemapi_request_parse_seconds",
+            "Time spent parsing the request line.",
+        )
+        self._handler_seconds = self.metrics.histogram(
+            "gemapi_handler_seconds",
+            "Time spent in the route handlers.",
+            ("route",),
+        )
+        self._response_bytes = self.metrics.histogram(
+            "gemapi_response_bytes",
+            "Size of the responses in bytes.",
+            buckets=BYTES_BUCKETS,
+        )
+        self._responses_total = self.metrics.counter(
+            "gemapi_responses_total",
+            "Number of responses per hostname router and status class.",
+            ("router", "status_class"),
+        )
+
+        # Existing stats are read when the metrics are rendered
+        for kind in ("handshake", "request", "write"):
+            self.metrics.callback(
+                f"gemapi_{kind}_timeouts_total",
+                f"Number of connections dropped after a {kind} timeout.",
+                "counter",
+                functools.partial(getattr, self.timeout_stats, kind),
+            )
+        self.metrics.callback(
+            "gemapi_response_cache_hits_total",
+            "Number of response cache hits.",
+            "counter",
+            lambda: self.response_cache.hits,
+        )
+        self.metrics.callback(
+            "gemapi_response_cache_misses_total",
+            "Number of response cache misses.",
+            "counter",
+            lambda: self.response_cache.misses,
+        )
+        self.metrics.callback(
+            "gemapi_response_cache_bytes",
+            "Size of the cached responses in bytes.",
+            "gauge",
+            lambda: self.response_cache.size,
+        )
+        self.metrics.callback(
+            "gemapi_coalesced_requests_total",
+            "Number of handler executions saved by sharing in-flight ones.",
+            "counter",
+            lambda: self.coalesced_requests,
+        )
+        self.metrics.callback(
+            "gemapi_executor_queue_depth",
+            "Number of handlers waiting on or running in the executor.",
+            "gauge",
+            lambda: self.executor_queue_depth,
+        )
+        self.metrics.callback(
+            "gemapi_rate_limited_total",
+            "Number of requests answered with 44 by the application rate limiter.",
+            "counter",
+            lambda: self.rate_limiter.throttled if self.rate_limiter else 0,
+        )
+        self.metrics.callback(
+            "gemapi_access_log_dropped_total",
+            "Number of access log records dropped because the queue was full.",
+            "counter",
+            lambda: self.access_logger.dropped,
+        )
+
+    def add_metrics_route(self, path: str = "/metrics") -> None:
+        async def _metrics_handler(req: Request) -> Response:
+            return Response(
+                StatusCode.SUCCESS,
+                "text/plain; version=0.0.4",
+                self.metrics.render(),
+            )
+
+        self._default_router.route(path)(_metrics_handler)
+
+    def route(
+        self,
+        path: str,
+        cache_ttl: float | None = None,
+        run_in_executor: bool = True,
+        rate_limiter: RateLimiter | None = None,
+        coalesce: bool = False,
+    ):
+        return self._default_router.route(
+            path,
+            cache_ttl=cache_ttl,
+            run_in_executor=run_in_executor,
+            rate_limiter=rate_limiter,
+            coalesce=coalesce,
+        )
+
+    def add_middleware(self, middleware: Middleware) -> None:
+        # Middlewares run around the route handlers and the mounts (and the
+        # not found responses), in the order they are added
+        self._middlewares.append(middleware)
+        self._pipelines.clear()
+
+    def add_startup_hook(self, hook: Callable[[], Awaitable[None]]) -> None:
+        # Hooks run in the process and event loop serving the requests (in
+        # each worker with --workers), concurrently
+        self._startup_hooks.append(hook)
+
+    async def startup(self) -> None:
+        await asyncio.gather(*(hook() for hook in self._startup_hooks))
 
-    def route(self, path: str):
-        return self._default_router.route(path)
+    def mount_static(self, prefix: str, directory: Path | str) -> None:
+        self._static_mounts.append(StaticFiles(prefix, directory))
+
+    def mount_content_index(
+        self,
+        prefix: str,
+        directory: Path | str,
+        title: str,
+        base_url: str,
+        poll_interval: float = 5.0,
+        max_feed_entries: int = 50,
+        author: str | None = None,
+    ) -> ContentIndex:
+        # Serves the posts of the directory with a generated index and Atom
+        # feed, the directory is scanned again at most every poll_interval
+        content_index = ContentIndex(
+            prefix,
+            directory,
+            title,
+            base_url,
+            poll_interval=poll_interval,
+            max_feed_entries=max_feed_entries,
+            author=author,
+        )
+        self._content_indexes.append(content_index)
+        self.mount_static(prefix, directory)
+        return content_index
+
+    def mount_proxy(
+        self,
+        prefix: str,
+        upstream_url: str,
+        max_connections: int = 32,
+        timeout: float = 10.0,
+        cache_ttl: float | None = None,
+    ) -> Proxy:
+        # Forwards the requests under prefix to the upstream capsule, the
+        # connection limit applies per upstream host
+        host, port = parse_upstream_url(upstream_url)
+        if (upstream := self._upstreams.get((host, port))) is None:
+            upstream = Upstream(host, port, max_connections, timeout)
+            self._upstreams[(host, port)] = upstream
+        elif (upstream.max_connections, upstream.timeout) != (
+            max_connections,
+            timeout,
+        ):
+            raise ValueError(
+                f"{host}:{port} is already mounted with max_connections="
+                f"{upstream.max_connections} and timeout={upstream.timeout}"
+            )
+
+        proxy = Proxy(prefix, upstream_url, upstream, cache_ttl)
+        self._proxy_mounts.append(proxy)
+        return proxy
 
     def router_for_hostname(self, hostname: str) -> Router:
+        # Wildcards match a single label, like in certificates
+        if "*" in hostname and (not hostname.startswith("*.") or "*" in hostname[2:]):
+            raise ValueError(f"Invalid wildcard hostname {hostname}")
+
         if hostname not in self._hostnames:
             router = Router()
             self._hostnames[hostname] = router
@@ -35,102 +294,343 @@ class Application:
 
         return router
 
+    @property
+    def hostnames(self) -> list[str]:
+        return list(self._hostnames)
+
+    def _get_router(self, netloc: str) -> tuple[str, Router]:
+        # Check if there's router registered for the hostname
+        if (router := self._hostnames.get(netloc)) is not None:
+            return netloc, router
+
+        # Then for its parent domain (*.example.com for a.example.com)
+        wildcard = "*." + netloc.partition(".")[2]
+        if (router := self._hostnames.get(wildcard)) is not None:
+            return wildcard, router
+
+        # Or use the default router
+        return "default", self._default_router
+
     async def stream_handler(
         self,
         reader: asyncio.StreamReader,
         writer: asyncio.StreamWriter,
     ) -> None:
+        self._connections_in_flight.inc()
+        try:
+            await self._handle_stream(reader, writer)
+        finally:
+            self._connections_in_flight.dec()
+
+    async def _handle_stream(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        started_at = time.monotonic()
         client_host, client_port, *_ = writer.get_extra_info("peername")
+        parsed_url: RequestTarget | None = None
         resp: Response
 
         try:
-            data = await reader.read(1026)
-
-            # Ensure it's a valid request
-            # 'gemini://localhost/\r\n'
-            # 1. ending with a <CR><LF>
-            if not data.endswith(b"\r\n"):
-                raise BadRequestError("Not ending with a CRLF")
-
-            message = data.decode()
-
-            parsed_url = urlparse(message[:-2])
+            try:
+                data = await asyncio.wait_for(
+                    reader.readuntil(b"\r\n"),
+                    self._request_timeout,
+                )
+            except asyncio.LimitOverrunError:
+                raise BadRequestError("Request too long")
+            except asyncio.IncompleteReadError as exc:
+                # Like a request line ending with a LF only
+                if exc.partial:
+                    raise BadRequestError("Not ending with a CRLF")
+                raise
 
-            if parsed_url.scheme != "gemini":
-                raise BadRequestError(f"Invalid scheme {parsed_url.scheme}")
+            if self.draining:
+                raise ServerUnavailableError("Server is shutting down")
 
-            if parsed_url.path == "":
-                parsed_url = parsed_url._replace(path="/")
+            # Throttled clients are answered before parsing and routing
+            if self.rate_limiter is not None:
+                self.rate_limiter.check(client_host)
 
-            if "." in parsed_url.path:
-                raise BadRequestError("dots in path are not allowed")
+            parse_started_at = time.monotonic()
+            parsed_url = parse_request_line(data)
+            self._request_parse_seconds.observe(time.monotonic() - parse_started_at)
 
         except StatusError as status_error:
-            logger.error(f"{client_host}:{client_port} - {status_error.data()}")
             resp = status_error.as_response()
+        except asyncio.TimeoutError:
+            self.timeout_stats.request += 1
+            logger.warning(f"{client_host}:{client_port} - request line timeout")
+            writer.close()
+            return None
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # The client went away without sending anything
+            writer.close()
+            return None
         except Exception:
             logger.exception(f"{client_host}:{client_port} - 51")
             resp = BadRequestResponse("Bad request")
 
         else:
-            req = Request(
-                parsed_url=parsed_url,
-                client_host=client_host,
-                client_port=client_port,
-            )
-
             try:
+                req = Request(
+                    parsed_url=parsed_url,
+                    client_host=client_host,
+                    client_port=client_port,
+                    client_certificate=self._get_client_certificate(writer),
+                )
                 resp = await self._process_request(req)
             except StatusError as status_error:
-                logger.error(
-                    f"{client_host}:{client_port} - {req.parsed_url.geturl()} "
-                    f"{status_error.data()}"
-                )
                 resp = status_error.as_response()
             except Exception:
                 resp = TemporaryFailureResponse("Failed to process request")
                 logger.exception(
-                    f"{client_host}:{client_port} - "
-                    f"{req.parsed_url.geturl()} {resp.status_code.name} "
-                    f"{resp.status_code.value} {resp.meta}"
+                    f"{client_host}:{client_port} - {parsed_url.geturl()} failed"
                 )
+
+        written = 0
+        try:
+            if self._write_timeout is None:
+                written = await resp.write(writer)
             else:
-                logger.info(
-                    f"{client_host}:{client_port} - "
-                    f"{req.parsed_url.geturl()} {resp.status_code.name} "
-                    f"{resp.status_code.value} {resp.meta}"
+                written = await resp.write(
+                    StallTimeoutWriter(writer, self._write_timeout)
                 )
+        except asyncio.TimeoutError:
+            self.timeout_stats.write += 1
+            logger.warning(f"{client_host}:{client_port} - write timeout")
+            writer.transport.abort()
+        except Exception:
+            logger.exception(f"{client_host}:{client_port} - failed to write response")
+        finally:
+            writer.close()
 
-        writer.write(resp.as_bytes())
-        await writer.drain()
-        writer.close()
+        self._response_bytes.observe(written)
+        router_name = "default"
+        if parsed_url:
+            router_name, _ = self._get_router(parsed_url.netloc)
+        self._responses_total.inc(router_name, f"{resp.status_code.value // 10}x")
+        self.access_logger.log(
+            AccessLogRecord(
+                client_host=client_host,
+                client_port=client_port,
+                parsed_url=parsed_url,
+                status_code=resp.status_code,
+                meta=resp.meta,
+                duration=time.monotonic() - started_at,
+            )
+        )
 
-        return
+    def _get_client_certificate(
+        self,
+        writer: asyncio.StreamWriter,
+    ) -> ClientCertificate | None:
+        ssl_object = writer.get_extra_info("ssl_object")
+        if ssl_object is None:
+            return None
+
+        der_cert = ssl_object.getpeercert(binary_form=True)
+        if der_cert is None:
+            return None
+
+        return load_client_certificate(der_cert)
 
     async def _process_request(
         self,
         req: Request,
     ) -> Response:
-        # Check if there's router registered for the hostname
-        if req.parsed_url.netloc in self._hostnames:
-            router = self._hostnames[req.parsed_url.netloc]
-        else:
-            # Or use the default router
-            router = self._default_router
+        _, router = self._get_router(req.parsed_url.netloc)
 
         # Select the router
-        resp: Response
         matched_route, matched_params = router.match(req.parsed_url.path)
 
         # Build the response
         if not matched_route:
-            raise NotFoundError("Not found")
+            mount = self._match_mount(req.parsed_url.path)
+            if self._middlewares:
+                return await self._get_pipeline(mount)(req, {})
+
+            return await self._handle_mount(req, mount)
 
         if matched_params is None:
             raise ValueError("Missing matched params")
 
+        if matched_route.rate_limiter is not None:
+            matched_route.rate_limiter.check(req.client_host)
+
+        if self._middlewares:
+            return await self._get_pipeline(matched_route)(req, matched_params)
+
+        return await self._handle_route(req, matched_route, matched_params)
+
+    def _match_mount(self, path: str) -> Mount:
+        for proxy in self._proxy_mounts:
+            if proxy.matches(path):
+                return proxy
+
+        for content_index in self._content_indexes:
+            if content_index.matches(path):
+                return content_index
+
+        for static_files in self._static_mounts:
+            if static_files.matches(path):
+                return static_files
+
+        return None
+
+    async def _handle_mount(self, req: Request, mount: Mount) -> Response:
+        if mount is None:
+            raise NotFoundError("Not found")
+
+        if isinstance(mount, Proxy):
+            return await self._handle_proxy(req, mount)
+
+        return mount.get_response(req.parsed_url.path)
+
+    def _get_pipeline(self, target: Route | Mount) -> Endpoint:
+        if (pipeline := self._pipelines.get(id(target))) is None:
+            pipeline = compose(self._build_endpoint(target), self._middlewares)
+            self._pipelines[id(target)] = pipeline
+
+        return pipeline
+
+    def _build_endpoint(self, target: Route | Mount) -> Endpoint:
+        if isinstance(target, Route):
+            route = target
+
+            async def _route_endpoint(req: Request, params: dict[str, str]) -> Response:
+                return await self._handle_route(req, route, params)
+
+            return _route_endpoint
+
+        mount = target
+
+        async def _mount_endpoint(req: Request, params: dict[str, str]) -> Response:
+            return await self._handle_mount(req, mount)
+
+        return _mount_endpoint
+
+    async def _handle_route(
+        self,
+        req: Request,
+        matched_route: Route,
+        matched_params: dict[str, str],
+    ) -> Response:
+        if matched_route.cache_ttl is None and not matched_route.coalesce:
+            return await self._process_route(req, matched_route, matched_params)
+
+        cache_key = (req.parsed_url.netloc, req.parsed_url.path, req.parsed_url.query)
+        if matched_route.cache_ttl is not None and (
+            cached_resp := self.response_cache.get(cache_key)
+        ):
+            return cached_resp
+
+        compute = functools.partial(
+            self._process_cached_route, req, matched_route, matched_params, cache_key
+        )
+        if matched_route.coalesce:
+            return await self._coalesce(cache_key, compute)
+        return await compute()
+
+    async def _process_cached_route(
+        self,
+        req: Request,
+        matched_route: Route,
+        matched_params: dict[str, str],
+        cache_key: CacheKey,
+    ) -> Response:
+        if matched_route.cache_ttl is None:
+            return await self._process_route(req, matched_route, matched_params)
+
+        try:
+            resp = await self._process_route(req, matched_route, matched_params)
+        except StatusError as status_error:
+            # Errors are only cached if the cache is configured to do so
+            self.response_cache.put(
+                cache_key, status_error.as_response(), matched_route.cache_ttl
+            )
+            raise
+
+        return self.response_cache.put(cache_key, resp, matched_route.cache_ttl)
+
+    async def _coalesce(
+        self,
+        key: CacheKey,
+        compute: Callable[[], Awaitable[Response]],
+    ) -> Response:
+        # Concurrent requests for the same URL share a single execution, its
+        # response (or error) is given to all of them
+        while (future := self._in_flight.get(key)) is not None:
+            try:
+                shared_resp = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The request running the handler was cancelled, try again
+                if future.cancelled():
+                    continue
+                raise
+            except Exception:
+                self.coalesced_requests += 1
+                raise
+
+            if shared_resp is None:
+                # Streamed responses can only be sent once
+                return await compute()
+
+            self.coalesced_requests += 1
+            return shared_resp
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            resp = await compute()
+        except Exception as exc:
+            future.set_exception(exc)
+            # Only raised in the waiters, if any
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            del self._in_flight[key]
+
+        if not resp.buffered:
+            future.set_result(None)
+            return resp
+
+        shared_resp = CachedResponse(resp.status_code, resp.meta, resp.as_bytes())
+        future.set_result(shared_resp)
+        return shared_resp
+
+    async def _handle_proxy(self, req: Request, proxy: Proxy) -> Response:
+        if proxy.cache_ttl is None:
+            return await proxy.get_response(req)
+
+        cache_key = (req.parsed_url.netloc, req.parsed_url.path, req.parsed_url.query)
+        if cached_resp := self.response_cache.get(cache_key):
+            return cached_resp
+
+        return self.response_cache.put(
+            cache_key, await proxy.get_response(req), proxy.cache_ttl
+        )
+
+    async def _process_route(
+        self,
+        req: Request,
+        matched_route: Route,
+        matched_params: dict[str, str],
+    ) -> Response:
+        resp: Response
         handler_params: dict[str, Any] = {}
         handler_params.update(matched_params)
+        if client_certificate_parameter := matched_route.client_certificate_parameter:
+            if req.client_certificate is None:
+                raise ClientCertificateRequiredError("Client certificate required")
+            if req.client_certificate.is_expired():
+                raise CertificateNotValidError("Client certificate has expired")
+            handler_params[client_certificate_parameter.name] = req.client_certificate
+
         if matched_route.input_parameter and not req.parsed_url.query:
             if matched_route.input_parameter.annotation is Input:
                 resp = InputResponse(
@@ -151,9 +651,34 @@ class Application:
                     req.parsed_url.query
                 )
             # TODO: pass the path params wit the right type as kwargs
-            if matched_route.handler_is_coroutine:
-                resp = await matched_route.handler(req, **handler_params)
-            else:
-                resp = matched_route.handler(req, **handler_params)
+            handler_started_at = time.monotonic()
+            try:
+                if matched_route.handler_is_coroutine:
+                    resp = await matched_route.handler(req, **handler_params)
+                elif matched_route.run_in_executor:
+                    resp = await self._run_in_executor(
+                        matched_route.handler, req, handler_params
+                    )
+                else:
+                    resp = matched_route.handler(req, **handler_params)
+            finally:
+                self._handler_seconds.observe(
+                    time.monotonic() - handler_started_at, matched_route.path
+                )
 
         return resp
+
+    async def _run_in_executor(
+        self,
+        handler: Callable[..., Response],
+        req: Request,
+        handler_params: dict[str, Any],
+    ) -> Response:
+        self.executor_queue_depth += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor,
+                functools.partial(handler, req, **handler_params),
+            )
+        finally:
+            self.executor_queue_depth -= 1
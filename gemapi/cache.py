@@ -0,0 +1,118 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from gemapi.responses import Response
+from gemapi.responses import StatusCode
+from gemapi.responses import encode_header
+
+CacheKey = tuple[str, str, str]
+
+_DEFAULT_CACHEABLE_STATUS_CODES = frozenset(
+    {
+        StatusCode.SUCCESS,
+        StatusCode.TEMPORARY_REDIRECT,
+        StatusCode.PERMANENT_REDIRECT,
+    }
+)
+
+
+class CachedResponse(Response):
+    # Pre-encoded response (header and body), shared between requests
+    __slots__ = ("data", "_header")
+
+    def __init__(self, status_code: StatusCode, meta: str, data: bytes) -> None:
+        super().__init__(status_code, meta)
+        self.data = data
+        self._header = encode_header(self.status_code, meta)
+
+    def as_bytes(self) -> bytes:
+        header = encode_header(self.status_code, self.meta)
+        if header == self._header:
+            return self.data
+
+        # The status or meta was changed (by a middleware), the body is kept
+        return header + memoryview(self.data)[len(self._header) :]
+
+
+@dataclass(frozen=True)
+class _CacheEntry:
+    response: CachedResponse
+    expires_at: float
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        cacheable_status_codes: frozenset[StatusCode] = (
+            _DEFAULT_CACHEABLE_STATUS_CODES
+        ),
+    ) -> None:
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._cacheable_status_codes = cacheable_status_codes
+        self._entries: OrderedDict[CacheKey, _CacheEntry] = OrderedDict()
+        self._size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def get(self, key: CacheKey) -> CachedResponse | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.response
+
+    def put(self, key: CacheKey, resp: Response, ttl: float) -> Response:
+        # Returns the response to send, pre-encoded when it's cacheable
+        # Streamed responses are never buffered
+        if resp.status_code not in self._cacheable_status_codes or not resp.buffered:
+            return resp
+
+        data = resp.as_bytes()
+
+        cached_resp = CachedResponse(resp.status_code, resp.meta, data)
+        if len(data) > self._max_bytes:
+            return cached_resp
+
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = _CacheEntry(
+            response=cached_resp,
+            expires_at=time.monotonic() + ttl,
+        )
+        self._size += len(data)
+
+        while len(self._entries) > self._max_entries or self._size > self._max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+        return cached_resp
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._size = 0
+
+    def _remove(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key)
+        self._size -= len(entry.response.data)
@@ -1,18 +1,61 @@
 import datetime
+import hashlib
+import json
+from dataclasses import dataclass
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-from cryptography import x509
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric import ed25519
-from cryptography.hazmat.primitives.serialization import load_pem_private_key
-from cryptography.x509.oid import NameOID
 from loguru import logger
 
+from gemapi.request import ClientCertificate
+
+# cryptography is slow to import, it is only loaded when a certificate needs
+# to be parsed or generated
+if TYPE_CHECKING:
+    from cryptography import x509
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+
 # TODO:
 # logic to inspect/re-generate cert when needed
 
 _DEFAULT_DIRECTORY = Path(".")
+_DEFAULT_RENEWAL_MARGIN = datetime.timedelta(days=1)
+# Parsed client certificates, keyed by fingerprint
+_MAX_CLIENT_CERTIFICATES = 4096
+_client_certificates: dict[str, ClientCertificate] = {}
+
+
+@dataclass(frozen=True)
+class _CertificateInfo:
+    # Keyed by the SHA-256 of the PEM so a replaced certificate is detected
+    digest: str
+    hostnames: frozenset[str]
+    expires_at: datetime.datetime
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "digest": self.digest,
+                "hostnames": sorted(self.hostnames),
+                "expires_at": self.expires_at.isoformat(),
+            }
+        )
+
+    @classmethod
+    def from_json(cls, data: str) -> "_CertificateInfo":
+        raw = json.loads(data)
+        return cls(
+            digest=raw["digest"],
+            hostnames=frozenset(raw["hostnames"]),
+            expires_at=datetime.datetime.fromisoformat(raw["expires_at"]),
+        )
+
+
+def _write_atomically(path: Path, data: bytes) -> None:
+    # Running servers may reload the file at any time
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_bytes(data)
+    tmp_path.replace(path)
 
 
 class CertificateManager:
@@ -22,24 +65,28 @@ class CertificateManager:
         directory: Path | None = None,
         certfile: str = "cert.pem",
         keyfile: str = "key.pem",
+        renewal_margin: datetime.timedelta = _DEFAULT_RENEWAL_MARGIN,
     ) -> None:
         self._hostnames = hostnames
         self._directory = directory or _DEFAULT_DIRECTORY
         self._certfile = certfile
         self._keyfile = keyfile
+        self._renewal_margin = renewal_margin
+        self._certificate_info: _CertificateInfo | None = None
 
     def initialize(self) -> None:
         logger.info("Initializing certificate manager")
         self._setup_directory()
 
         if self.keyfile.exists() and self.certfile.exists():
-            cert = self.certificate
-            if self._is_certificate_matching_configuration(cert):
+            info = self._load_certificate_info()
+            if info.hostnames == set(self._hostnames):
                 logger.info("Found existing certificate")
-                if datetime.datetime.now(
-                    datetime.timezone.utc
-                ) > self._certificate_expires_at(cert):
-                    logger.info("Certificate has expired")
+                if (
+                    datetime.datetime.now(datetime.timezone.utc)
+                    > info.expires_at - self._renewal_margin
+                ):
+                    logger.info("Certificate has expired or is about to expire")
                 else:
                     return None
             else:
@@ -47,8 +94,16 @@ class CertificateManager:
 
         self._generate_certificate()
 
+    def renew(self) -> None:
+        logger.info("Renewing certificate")
+        self._setup_directory()
+        self._generate_certificate()
+
     def certificate_expires_at(self) -> datetime.datetime:
-        return self._certificate_expires_at(self.certificate)
+        return self._load_certificate_info().expires_at
+
+    def certificate_renews_at(self) -> datetime.datetime:
+        return self.certificate_expires_at() - self._renewal_margin
 
     def _setup_directory(self) -> None:
         if not self._directory.exists():
@@ -63,19 +118,44 @@ class CertificateManager:
         return self._directory / self._certfile
 
     @property
-    def certificate(self) -> x509.Certificate:
+    def infofile(self) -> Path:
+        return self._directory / f".{self._certfile}.json"
+
+    @property
+    def certificate(self) -> "x509.Certificate":
+        from cryptography import x509
+
         return x509.load_pem_x509_certificate(self.certfile.read_bytes())
 
-    def _is_certificate_matching_configuration(self, cert: x509.Certificate) -> bool:
-        subject_hostname = cert.subject.rfc4514_string().removeprefix("CN=")
-        san_ext = cert.extensions.get_extension_for_class(x509.SubjectAlternativeName)
-        hostnames = {subject_hostname} | {dns_name.value for dns_name in san_ext.value}
-        return hostnames == set(self._hostnames)
+    def _load_certificate_info(self) -> _CertificateInfo:
+        cert_bytes = self.certfile.read_bytes()
+        digest = hashlib.sha256(cert_bytes).hexdigest()
+        if self._certificate_info and self._certificate_info.digest == digest:
+            return self._certificate_info
+
+        info = None
+        try:
+            info = _CertificateInfo.from_json(self.infofile.read_text())
+        except (OSError, ValueError, KeyError):
+            pass
 
-    def _certificate_expires_at(self, cert: x509.Certificate) -> datetime.datetime:
-        return cert.not_valid_after.replace(tzinfo=datetime.timezone.utc)
+        if info is None or info.digest != digest:
+            # Stale or missing sidecar, parse the certificate (slow path)
+            from cryptography import x509
+
+            info = _parse_certificate_info(
+                x509.load_pem_x509_certificate(cert_bytes), digest
+            )
+            _write_atomically(self.infofile, info.to_json().encode())
+
+        self._certificate_info = info
+        return info
+
+    def _generate_private_key(self) -> "ed25519.Ed25519PrivateKey":
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import ed25519
+        from cryptography.hazmat.primitives.serialization import load_pem_private_key
 
-    def _generate_private_key(self) -> ed25519.Ed25519PrivateKey:
         if not self.keyfile.exists():
             logger.info("Generating private key")
             private_key = ed25519.Ed25519PrivateKey.generate()
@@ -84,12 +164,17 @@ class CertificateManager:
                 serialization.PrivateFormat.PKCS8,
                 serialization.NoEncryption(),
             )
-            self.keyfile.write_bytes(private_bytes)
+            _write_atomically(self.keyfile, private_bytes)
             return private_key
         else:
             return load_pem_private_key(self.keyfile.read_bytes(), None)  # type: ignore
 
     def _generate_certificate(self) -> None:
+        from cryptography import x509
+        from cryptography.hazmat.backends import default_backend
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.x509.oid import NameOID
+
         private_key = self._generate_private_key()
 
         logger.info("Generating certificate")
@@ -121,4 +206,67 @@ class CertificateManager:
 
         request = builder.sign(private_key, None, default_backend())
         cert_bytes = request.public_bytes(serialization.Encoding.PEM)
-        self.certfile.write_bytes(cert_bytes)
+        info = _parse_certificate_info(request, hashlib.sha256(cert_bytes).hexdigest())
+        # The sidecar is written first, it's ignored until the digest matches
+        _write_atomically(self.infofile, info.to_json().encode())
+        _write_atomically(self.certfile, cert_bytes)
+        self._certificate_info = info
+
+
+def _parse_certificate_info(cert: "x509.Certificate", digest: str) -> _CertificateInfo:
+    from cryptography import x509
+
+    subject_hostname = cert.subject.rfc4514_string().removeprefix("CN=")
+    san_ext = cert.extensions.get_extension_for_class(x509.SubjectAlternativeName)
+    return _CertificateInfo(
+        digest=digest,
+        hostnames=frozenset(
+            {subject_hostname} | {dns_name.value for dns_name in san_ext.value}
+        ),
+        expires_at=cert.not_valid_after.replace(tzinfo=datetime.timezone.utc),
+    )
+
+
+def load_client_certificate(der_cert: bytes) -> ClientCertificate:
+    # Hashing the certificate is much cheaper than parsing it, returning
+    # clients are served from the cache
+    fingerprint = hashlib.sha256(der_cert).hexdigest()
+    if (client_certificate := _client_certificates.get(fingerprint)) is not None:
+        return client_certificate
+
+    from cryptography import x509
+
+    cert = x509.load_der_x509_certificate(der_cert)
+    client_certificate = ClientCertificate(
+        fingerprint=fingerprint,
+        subject=cert.subject.rfc4514_string(),
+        expires_at=cert.not_valid_after.replace(tzinfo=datetime.timezone.utc),
+    )
+    if len(_client_certificates) >= _MAX_CLIENT_CERTIFICATES:
+        # Evict the oldest entry
+        del _client_certificates[next(iter(_client_certificates))]
+    _client_certificates[fingerprint] = client_certificate
+    return client_certificate
+
+
+def certificate_managers(
+    default_hostname: str,
+    hostnames: list[str],
+    directory: Path | None = None,
+) -> dict[str, CertificateManager]:
+    # The default certificate keeps the cert.pem/key.pem files, the other
+    # hostnames (including wildcards like *.example.com) get their own
+    managers = {default_hostname: CertificateManager([default_hostname], directory)}
+    for hostname in hostnames:
+        if hostname in managers:
+            continue
+
+        name = hostname.replace("*", "_wildcard")
+        managers[hostname] = CertificateManager(
+            [hostname],
+            directory,
+            certfile=f"{name}.cert.pem",
+            keyfile=f"{name}.key.pem",
+        )
+
+    return managers
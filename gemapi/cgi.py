@@ -0,0 +1,343 @@
+import asyncio
+import json
+import os
+import struct
+import sys
+from typing import Any
+from typing import AsyncIterator
+from typing import Awaitable
+from typing import Callable
+from typing import Iterable
+from typing import TypeVar
+
+from loguru import logger
+
+from gemapi.request import Request
+from gemapi.responses import MAX_HEADER_SIZE
+from gemapi.responses import CGIError
+from gemapi.responses import Response
+from gemapi.responses import StatusCode
+from gemapi.responses import StreamingResponse
+from gemapi.responses import parse_header
+
+_CHUNK_SIZE = 64 * 1024
+# Frames sent to/from the pool workers are prefixed by their length, an
+# empty frame ends a response
+_FRAME_HEADER = struct.Struct(">I")
+_WORKER_STARTUP_TIMEOUT = 10.0
+
+T = TypeVar("T")
+
+_FAILURES = (
+    OSError,
+    EOFError,
+    ValueError,
+    asyncio.LimitOverrunError,
+    asyncio.TimeoutError,
+)
+
+
+def _build_env(req: Request) -> dict[str, str]:
+    env = {
+        "GATEWAY_INTERFACE": "CGI/1.1",
+        "SERVER_PROTOCOL": "GEMINI",
+        "SERVER_SOFTWARE": "gemapi",
+        "GEMINI_URL": req.parsed_url.geturl(),
+        "SERVER_NAME": req.hostname,
+        "PATH_INFO": req.path,
+        "QUERY_STRING": req.query,
+        "REMOTE_ADDR": req.client_host,
+        "REMOTE_HOST": req.client_host,
+    }
+    if req.client_certificate is not None:
+        env["AUTH_TYPE"] = "CERTIFICATE"
+        env["TLS_CLIENT_HASH"] = req.client_certificate.fingerprint
+        env["TLS_CLIENT_SUBJECT"] = req.client_certificate.subject
+    return env
+
+
+class _Deadline:
+    def __init__(self, timeout: float) -> None:
+        self._expires_at = asyncio.get_running_loop().time() + timeout
+
+    async def wait_for(self, awaitable: Awaitable[T]) -> T:
+        remaining = self._expires_at - asyncio.get_running_loop().time()
+        return await asyncio.wait_for(awaitable, max(0.0, remaining))
+
+
+class _CGIResponse(StreamingResponse):
+    __slots__ = ("_release",)
+
+    def __init__(
+        self,
+        meta: str,
+        body: AsyncIterator[bytes],
+        release: Callable[[], None],
+    ) -> None:
+        super().__init__(StatusCode.SUCCESS, meta, body)
+        self._release: Callable[[], None] | None = release
+
+    async def aclose(self) -> None:
+        # The script is only released once its output is streamed, or when
+        # the response is discarded
+        try:
+            await super().aclose()
+        finally:
+            if self._release is not None:
+                release, self._release = self._release, None
+                release()
+
+
+class _PoolWorker:
+    def __init__(self, process: asyncio.subprocess.Process) -> None:
+        self.process = process
+        if process.stdin is None or process.stdout is None:
+            raise ValueError("Missing worker pipes")
+        self.stdin = process.stdin
+        self.stdout = process.stdout
+
+    async def read_frame(self) -> bytes:
+        (size,) = _FRAME_HEADER.unpack(await self.stdout.readexactly(4))
+        return await self.stdout.readexactly(size)
+
+    async def iter_frames(self) -> AsyncIterator[bytes]:
+        while frame := await self.read_frame():
+            yield frame
+
+
+class CGIHandler:
+    # Runs an external command for each request, either spawned per request
+    # or with a pool of long-lived workers (when `workers` is set) speaking
+    # the framed protocol of `run_worker`. The command output is a Gemini
+    # response (header line and body), failures are answered with a 42.
+    def __init__(
+        self,
+        command: list[str],
+        timeout: float = 10.0,
+        max_concurrency: int = 8,
+        workers: int | None = None,
+        env: dict[str, str] | None = None,
+    ) -> None:
+        if workers is not None and workers < 1:
+            raise ValueError(f"Invalid number of workers {workers}")
+
+        self._command = command
+        self._timeout = timeout
+        self._workers_count = workers
+        self._env = env or {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._idle_workers: asyncio.Queue[_PoolWorker] = asyncio.Queue()
+        # Workers are spawned by start() (in the process and loop serving the
+        # requests), and replaced on the next request when they fail
+        self._missing_workers = workers or 0
+        # Spawned scripts and workers, the exited ones are pruned on spawn
+        self._processes: set[asyncio.subprocess.Process] = set()
+
+    async def __call__(self, req: Request) -> Response:
+        env = {**self._env, **_build_env(req)}
+        if self._workers_count is None:
+            return await self._run_process(env)
+        return await self._run_in_worker(env)
+
+    async def start(self) -> None:
+        # Spawns the pool workers concurrently before the first request, meant
+        # to be registered with `app.add_startup_hook(cgi_handler.start)`
+        await self._fill_pool()
+
+    async def aclose(self) -> None:
+        # Stops the workers and the running scripts
+        for process in self._processes:
+            if process.returncode is None:
+                process.kill()
+            await process.wait()
+        self._processes.clear()
+
+    async def _spawn(self, **kwargs: Any) -> asyncio.subprocess.Process:
+        self._processes = {
+            process for process in self._processes if process.returncode is None
+        }
+        process = await asyncio.create_subprocess_exec(*self._command, **kwargs)
+        self._processes.add(process)
+        return process
+
+    async def _run_process(self, env: dict[str, str]) -> Response:
+        deadline = _Deadline(self._timeout)
+        try:
+            await deadline.wait_for(self._semaphore.acquire())
+        except asyncio.TimeoutError:
+            raise CGIError("CGI concurrency limit reached")
+
+        process: asyncio.subprocess.Process | None = None
+        handed_off = False
+        try:
+            process = await self._spawn(
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                env={"PATH": os.environ.get("PATH", ""), **env},
+            )
+            if process.stdout is None:
+                raise ValueError("Missing stdout")
+
+            stdout = process.stdout
+            header = await deadline.wait_for(stdout.readuntil(b"\r\n"))
+            status_code, meta = parse_header(header)
+            if status_code != StatusCode.SUCCESS:
+                return Response(status_code, meta)
+
+            async def _body() -> AsyncIterator[bytes]:
+                while chunk := await deadline.wait_for(stdout.read(_CHUNK_SIZE)):
+                    yield chunk
+
+            handed_off = True
+            return _CGIResponse(
+                meta,
+                _body(),
+                lambda: self._release_process(process),
+            )
+        except _FAILURES as exc:
+            logger.warning(f"CGI {self._command} failed: {exc!r}")
+            raise CGIError("CGI script failed") from exc
+        finally:
+            if not handed_off:
+                self._release_process(process)
+
+    def _release_process(self, process: asyncio.subprocess.Process | None) -> None:
+        if process is not None and process.returncode is None:
+            # Scripts that are still running after their response are killed
+            process.kill()
+        self._semaphore.release()
+
+    async def _run_in_worker(self, env: dict[str, str]) -> Response:
+        try:
+            await self._fill_pool()
+        except _FAILURES as exc:
+            logger.warning(f"Failed to start CGI worker {self._command}: {exc!r}")
+            raise CGIError("CGI worker failed to start") from exc
+
+        deadline = _Deadline(self._timeout)
+        try:
+            worker = await deadline.wait_for(self._idle_workers.get())
+        except asyncio.TimeoutError:
+            raise CGIError("No CGI worker available")
+
+        handed_off = False
+        healthy = False
+        try:
+            payload = json.dumps(env).encode("utf-8")
+            worker.stdin.write(_FRAME_HEADER.pack(len(payload)) + payload)
+            await deadline.wait_for(worker.stdin.drain())
+
+            # The header may be split over several frames or share one with
+            # the beginning of the body
+            frames = worker.iter_frames()
+            data = b""
+            while b"\r\n" not in data:
+                if len(data) > MAX_HEADER_SIZE:
+                    raise ValueError("Header too long")
+                data += await deadline.wait_for(frames.__anext__())
+
+            header, _, body_start = data.partition(b"\r\n")
+            status_code, meta = parse_header(header + b"\r\n")
+            if status_code != StatusCode.SUCCESS:
+                # Skip the remaining frames so the worker can be reused
+                async for _ in _read_with_deadline(frames, deadline):
+                    pass
+                healthy = True
+                return Response(status_code, meta)
+
+            async def _body() -> AsyncIterator[bytes]:
+                nonlocal healthy
+                if body_start:
+                    yield body_start
+                async for chunk in _read_with_deadline(frames, deadline):
+                    yield chunk
+                healthy = True
+
+            handed_off = True
+            return _CGIResponse(
+                meta,
+                _body(),
+                lambda: self._release_worker(worker, healthy),
+            )
+        except (*_FAILURES, StopAsyncIteration) as exc:
+            logger.warning(f"CGI worker {self._command} failed: {exc!r}")
+            raise CGIError("CGI worker failed") from exc
+        finally:
+            if not handed_off:
+                self._release_worker(worker, healthy)
+
+    async def _fill_pool(self) -> None:
+        if not self._missing_workers:
+            return None
+
+        missing, self._missing_workers = self._missing_workers, 0
+        results = await asyncio.gather(
+            *(self._start_worker() for _ in range(missing)),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    async def _start_worker(self) -> None:
+        try:
+            process = await self._spawn(
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                env={**os.environ, **self._env},
+            )
+        except BaseException:
+            self._missing_workers += 1
+            raise
+
+        # Workers send an empty frame once they're ready, so their startup is
+        # not accounted in the request timeouts
+        worker = _PoolWorker(process)
+        try:
+            if await asyncio.wait_for(worker.read_frame(), _WORKER_STARTUP_TIMEOUT):
+                raise ValueError("Unexpected worker ready frame")
+        except BaseException:
+            self._release_worker(worker, healthy=False)
+            raise
+
+        self._idle_workers.put_nowait(worker)
+
+    def _release_worker(self, worker: _PoolWorker, healthy: bool) -> None:
+        if healthy and worker.process.returncode is None:
+            self._idle_workers.put_nowait(worker)
+            return None
+
+        # The worker is in an unknown state (timeout, crash or interrupted
+        # response), it will be replaced
+        if worker.process.returncode is None:
+            worker.process.kill()
+        self._missing_workers += 1
+
+
+async def _read_with_deadline(
+    frames: AsyncIterator[bytes],
+    deadline: _Deadline,
+) -> AsyncIterator[bytes]:
+    while True:
+        try:
+            yield await deadline.wait_for(frames.__anext__())
+        except StopAsyncIteration:
+            return
+
+
+def run_worker(handler: Callable[[dict[str, str]], Iterable[bytes | str]]) -> None:
+    # Entrypoint of the pool workers: the handler gets the CGI environment of
+    # each request and returns the response (header line and body)
+    stdin = sys.stdin.buffer
+    stdout = sys.stdout.buffer
+    stdout.write(_FRAME_HEADER.pack(0))
+    stdout.flush()
+    while size_data := stdin.read(_FRAME_HEADER.size):
+        (size,) = _FRAME_HEADER.unpack(size_data)
+        env = json.loads(stdin.read(size))
+        for chunk in handler(env):
+            data = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+            if data:
+                stdout.write(_FRAME_HEADER.pack(len(data)) + data)
+        stdout.write(_FRAME_HEADER.pack(0))
+        stdout.flush()
@@ -1,10 +1,9 @@
 import asyncio
 import importlib
+import time
 
 import click
-
-from gemapi.applications import Application
-from gemapi.server import Server
+from loguru import logger
 
 
 @click.group()
@@ -14,13 +13,92 @@ def main():
 
 @click.command()
 @click.argument("app")
-def run(app: str) -> None:
+@click.option("--host", default="localhost", show_default=True)
+@click.option("--port", default=1965, show_default=True)
+@click.option(
+    "--workers",
+    default=1,
+    show_default=True,
+    help="Number of worker processes sharing the port with SO_REUSEPORT.",
+)
+@click.option(
+    "--metrics-port",
+    type=int,
+    default=None,
+    help=(
+        "Expose Prometheus metrics over HTTP on this local port "
+        "(worker N of --workers uses this port + N)."
+    ),
+)
+@click.option(
+    "--profile-startup",
+    is_flag=True,
+    default=False,
+    help="Log the time spent importing the app and in each startup step.",
+)
+@click.option(
+    "--drain-timeout",
+    default=10.0,
+    show_default=True,
+    help="Seconds given to the in-flight requests to complete on shutdown.",
+)
+@click.option(
+    "--trusted-client-certificates",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="PEM bundle of the client certificates (or CAs) to accept.",
+)
+def run(
+    app: str,
+    host: str,
+    port: int,
+    workers: int,
+    metrics_port: int | None,
+    profile_startup: bool,
+    drain_timeout: float,
+    trusted_client_certificates: str | None,
+) -> None:
+    import_started_at = time.perf_counter()
+    # Imported here so the startup profile accounts for the import of gemapi
+    from gemapi.applications import Application
+    from gemapi.server import Server
+    from gemapi.workers import Supervisor
+
+    app_import_started_at = time.perf_counter()
     mod, attr = app.split(":")
     application = getattr(importlib.import_module(mod), attr)
     if not isinstance(application, Application):
         raise ValueError(f"{app} is not a valid app")
 
-    asyncio.run(Server(application).run(), debug=True)
+    if profile_startup:
+        gemapi_duration = app_import_started_at - import_started_at
+        app_duration = time.perf_counter() - app_import_started_at
+        logger.info(
+            f"Startup profile: import_gemapi={gemapi_duration * 1000:.2f}ms "
+            f"import_app={app_duration * 1000:.2f}ms"
+        )
+
+    if workers > 1:
+        Supervisor(
+            application,
+            workers,
+            host=host,
+            port=port,
+            metrics_port=metrics_port,
+            profile_startup=profile_startup,
+            drain_timeout=drain_timeout,
+            trusted_client_certificates=trusted_client_certificates,
+        ).run()
+    else:
+        asyncio.run(
+            Server(
+                application,
+                profile_startup=profile_startup,
+                drain_timeout=drain_timeout,
+                trusted_client_certificates=trusted_client_certificates,
+            ).run(host, port, metrics_port=metrics_port),
+            debug=True,
+        )
 
 
 main.add_command(run)
@@ -0,0 +1,279 @@
+import asyncio
+import datetime
+import os
+import re
+import stat
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+from loguru import logger
+
+from gemapi.cache import CachedResponse
+from gemapi.responses import StatusCode
+from gemapi.responses import encode_header
+from gemapi.staticfiles import GEMINI_EXTENSIONS
+
+# Gemlog posts are named (or titled) like "2022-08-01 Title"
+_DATE_REGEX = re.compile(r"^(\d{4}-\d{2}-\d{2})[\s_-]*(.*)$")
+# Only the beginning of the files is read to find their title
+_MAX_HEADING_SEARCH_SIZE = 4096
+_FEED_PATH = "atom.xml"
+
+
+@dataclass(frozen=True)
+class ContentEntry:
+    # Path of the post relative to the index (like "2022-08-01-hello.gmi")
+    path: str
+    title: str
+    date: datetime.date | None
+    updated_at: datetime.datetime
+
+
+@dataclass(frozen=True)
+class _ScannedFile:
+    mtime_ns: int
+    size: int
+    entry: ContentEntry
+
+
+def _parse_date(value: str) -> tuple[datetime.date | None, str]:
+    if match := _DATE_REGEX.match(value):
+        try:
+            return datetime.date.fromisoformat(match.group(1)), match.group(2)
+        except ValueError:
+            pass
+    return None, value
+
+
+def _parse_entry(path: Path, relative_path: str, mtime_ns: int) -> ContentEntry:
+    with path.open("rb") as f:
+        head = f.read(_MAX_HEADING_SEARCH_SIZE).decode("utf-8", errors="replace")
+
+    date, stem_title = _parse_date(path.stem)
+    title = stem_title.replace("-", " ").replace("_", " ") or path.stem
+    for line in head.splitlines():
+        if line.startswith("# "):
+            heading_date, title = _parse_date(line[2:].strip())
+            date = date or heading_date
+            break
+
+    return ContentEntry(
+        path=relative_path,
+        title=title,
+        date=date,
+        updated_at=datetime.datetime.fromtimestamp(
+            mtime_ns / 1e9, datetime.timezone.utc
+        ).replace(microsecond=0),
+    )
+
+
+class ContentIndex:
+    # Index and Atom feed of a directory of gemtext posts, pre-rendered and
+    # refreshed incrementally: files are only parsed again when their mtime
+    # or size changes
+    def __init__(
+        self,
+        prefix: str,
+        directory: Path | str,
+        title: str,
+        base_url: str,
+        poll_interval: float = 5.0,
+        max_feed_entries: int = 50,
+        index: str = "index.gmi",
+        author: str | None = None,
+    ) -> None:
+        self._prefix = prefix.rstrip("/")
+        self._directory = Path(directory).resolve()
+        self._title = title
+        # The feed requires an author, the title is used when there's none
+        self._author = author or title
+        self._base_url = base_url.rstrip("/") + self._prefix
+        self._poll_interval = poll_interval
+        self._max_feed_entries = max_feed_entries
+        self._index = index
+        self._files: dict[str, _ScannedFile] = {}
+        self._checked_at = 0.0
+        self._refresh_task: asyncio.Task | None = None
+        self.parsed_files = 0
+
+        if not self._directory.is_dir():
+            raise ValueError(f"{directory} is not a directory")
+
+        self.entries: list[ContentEntry] = []
+        self._index_response = CachedResponse(StatusCode.SUCCESS, "text/gemini", b"")
+        self._feed_response = CachedResponse(
+            StatusCode.SUCCESS, "application/atom+xml", b""
+        )
+        self.scan()
+
+    def matches(self, path: str) -> bool:
+        return path in (
+            self._prefix + "/",
+            f"{self._prefix}/{self._index}",
+            f"{self._prefix}/{_FEED_PATH}",
+        )
+
+    def get_response(self, path: str) -> CachedResponse:
+        self._maybe_refresh()
+        if path.endswith(_FEED_PATH):
+            return self._feed_response
+        return self._index_response
+
+    def scan(self) -> int:
+        # Returns the number of added, updated and removed files
+        files: dict[str, _ScannedFile] = {}
+        changes = 0
+        for path, relative_path, stat_result in self._walk(self._directory, ""):
+            previous = self._files.get(relative_path)
+            if (
+                previous is not None
+                and previous.mtime_ns == stat_result.st_mtime_ns
+                and previous.size == stat_result.st_size
+            ):
+                files[relative_path] = previous
+                continue
+
+            try:
+                entry = _parse_entry(path, relative_path, stat_result.st_mtime_ns)
+            except OSError:
+                continue
+
+            self.parsed_files += 1
+            changes += 1
+            files[relative_path] = _ScannedFile(
+                stat_result.st_mtime_ns, stat_result.st_size, entry
+            )
+
+        changes += len(self._files.keys() - files.keys())
+        self._files = files
+        if changes or not self._index_response.data:
+            self._render()
+        self._checked_at = time.monotonic()
+        return changes
+
+    def _walk(
+        self,
+        directory: Path,
+        relative_directory: str,
+    ) -> list[tuple[Path, str, os.stat_result]]:
+        files: list[tuple[Path, str, os.stat_result]] = []
+        try:
+            dir_entries = list(os.scandir(directory))
+        except OSError:
+            return files
+
+        for dir_entry in dir_entries:
+            if dir_entry.name.startswith("."):
+                continue
+
+            relative_path = relative_directory + dir_entry.name
+            try:
+                stat_result = dir_entry.stat()
+            except OSError:
+                continue
+
+            if stat.S_ISDIR(stat_result.st_mode):
+                files.extend(self._walk(Path(dir_entry.path), relative_path + "/"))
+            elif (
+                stat.S_ISREG(stat_result.st_mode)
+                and Path(dir_entry.name).suffix in GEMINI_EXTENSIONS
+                and dir_entry.name != self._index
+            ):
+                files.append((Path(dir_entry.path), relative_path, stat_result))
+
+        return files
+
+    def _render(self) -> None:
+        # Newest posts first, undated ones last
+        self.entries = sorted(
+            (scanned_file.entry for scanned_file in self._files.values()),
+            key=lambda entry: (entry.date or datetime.date.min, entry.path),
+            reverse=True,
+        )
+
+        lines = [f"# {self._title}", ""]
+        for entry in self.entries:
+            url = quote(entry.path)
+            if entry.date:
+                lines.append(f"=> {url} {entry.date} - {entry.title}")
+            else:
+                lines.append(f"=> {url} {entry.title}")
+        lines.append("")
+        lines.append(f"=> {_FEED_PATH} Atom feed")
+
+        body = ("\n".join(lines) + "\n").encode("utf-8")
+        self._index_response = CachedResponse(
+            StatusCode.SUCCESS,
+            "text/gemini",
+            encode_header(StatusCode.SUCCESS, "text/gemini") + body,
+        )
+
+        feed = self._render_feed().encode("utf-8")
+        self._feed_response = CachedResponse(
+            StatusCode.SUCCESS,
+            "application/atom+xml",
+            encode_header(StatusCode.SUCCESS, "application/atom+xml") + feed,
+        )
+
+    def _render_feed(self) -> str:
+        entries = self.entries[: self._max_feed_entries]
+        updated_at = max(
+            (entry.updated_at for entry in entries),
+            default=datetime.datetime.fromtimestamp(0, datetime.timezone.utc),
+        )
+        parts = [
+            '<?xml version="1.0" encoding="utf-8"?>',
+            '<feed xmlns="http://www.w3.org/2005/Atom">',
+            f"<id>{escape(self._base_url)}/</id>",
+            f"<title>{escape(self._title)}</title>",
+            f"<updated>{updated_at.isoformat()}</updated>",
+            f"<author><name>{escape(self._author)}</name></author>",
+            f'<link href="{escape(self._base_url)}/" rel="alternate"/>',
+        ]
+        for entry in entries:
+            url = escape(f"{self._base_url}/{quote(entry.path)}")
+            # Posts are dated by their name, the mtime is used for the others
+            if entry.date:
+                published_at = datetime.datetime.combine(
+                    entry.date, datetime.time(), datetime.timezone.utc
+                )
+            else:
+                published_at = entry.updated_at
+            parts.extend(
+                [
+                    "<entry>",
+                    f"<id>{url}</id>",
+                    f"<title>{escape(entry.title)}</title>",
+                    f"<published>{published_at.isoformat()}</published>",
+                    f"<updated>{entry.updated_at.isoformat()}</updated>",
+                    f'<link href="{url}" rel="alternate"/>',
+                    "</entry>",
+                ]
+            )
+        parts.append("</feed>")
+        return "\n".join(parts) + "\n"
+
+    def _maybe_refresh(self) -> None:
+        # The current index is served while the directory is scanned again in
+        # a thread, so the requests never wait for the scan
+        if time.monotonic() - self._checked_at < self._poll_interval:
+            return None
+
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return None
+
+        self._checked_at = time.monotonic()
+        self._refresh_task = asyncio.get_running_loop().create_task(self._refresh())
+
+    async def _refresh(self) -> None:
+        try:
+            changes = await asyncio.to_thread(self.scan)
+        except Exception:
+            logger.exception(f"Failed to scan {self._directory}")
+            return None
+
+        if changes:
+            logger.info(f"Content index {self._prefix}/ updated, {changes} changes")
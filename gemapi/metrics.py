@@ -0,0 +1,277 @@
+import asyncio
+import bisect
+from typing import Callable
+from typing import ClassVar
+from typing import Iterator
+from typing import TypeVar
+
+from loguru import logger
+
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+BYTES_BUCKETS = (
+    256,
+    1024,
+    4096,
+    16384,
+    65536,
+    262144,
+    1048576,
+    4194304,
+    16777216,
+)
+
+LabelValues = tuple[str, ...]
+
+
+def _format_labels(
+    labelnames: LabelValues,
+    label_values: LabelValues,
+    const_labels: str = "",
+) -> str:
+    labels = [const_labels] if const_labels else []
+    labels.extend(
+        f'{name}="{_escape_label_value(value)}"'
+        for name, value in zip(labelnames, label_values)
+    )
+    if not labels:
+        return ""
+    return "{" + ",".join(labels) + "}"
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    TYPE: ClassVar[str]
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: LabelValues = (),
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+
+    def render(self, const_labels: str = "") -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.TYPE}"
+        yield from self._render_samples(const_labels)
+
+    def _render_samples(self, const_labels: str) -> Iterator[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    TYPE = "counter"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: LabelValues = (),
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def get(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def _render_samples(self, const_labels: str) -> Iterator[str]:
+        for label_values, value in self._values.items():
+            labels = _format_labels(self.labelnames, label_values, const_labels)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    TYPE = "gauge"
+
+    def dec(self, *label_values: str, amount: float = 1) -> None:
+        self._values[label_values] = self._values.get(label_values, 0) - amount
+
+    def set(self, *label_values: str, value: float) -> None:
+        self._values[label_values] = value
+
+
+class CallbackMetric(_Metric):
+    # Reads its value from existing stats (e.g. the response cache hits)
+    # when rendered, so it has no cost on the request path
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        metric_type: str,
+        callback: Callable[[], float],
+    ) -> None:
+        super().__init__(name, documentation)
+        self.TYPE = metric_type  # type: ignore
+        self._callback = callback
+
+    def _render_samples(self, const_labels: str) -> Iterator[str]:
+        labels = _format_labels((), (), const_labels)
+        yield f"{self.name}{labels} {_format_value(self._callback())}"
+
+
+class Histogram(_Metric):
+    TYPE = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: LabelValues = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._buckets = buckets
+        # Per label values: [count per bucket..., count for +Inf, sum]
+        self._values: dict[LabelValues, list[float]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        values = self._values.get(label_values)
+        if values is None:
+            values = self._values[label_values] = [0] * (len(self._buckets) + 2)
+
+        values[bisect.bisect_left(self._buckets, value)] += 1
+        values[-1] += value
+
+    def count(self, *label_values: str) -> int:
+        values = self._values.get(label_values)
+        return int(sum(values[:-1])) if values else 0
+
+    def _render_samples(self, const_labels: str) -> Iterator[str]:
+        labelnames = self.labelnames + ("le",)
+        for label_values, values in self._values.items():
+            cumulative_count = 0
+            for bucket, bucket_count in zip(
+                self._buckets + (float("inf"),), values[:-1]
+            ):
+                cumulative_count += int(bucket_count)
+                labels = _format_labels(
+                    labelnames, label_values + (_format_value(bucket),), const_labels
+                )
+                yield f"{self.name}_bucket{labels} {cumulative_count}"
+
+            labels = _format_labels(self.labelnames, label_values, const_labels)
+            yield f"{self.name}_sum{labels} {_format_value(values[-1])}"
+            yield f"{self.name}_count{labels} {cumulative_count}"
+
+
+_MetricT = TypeVar("_MetricT", bound=_Metric)
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        # Added to all the samples (like the worker of the process)
+        self.const_labels: dict[str, str] = {}
+
+    def counter(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: LabelValues = (),
+    ) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: LabelValues = (),
+    ) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: LabelValues = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(
+        self,
+        name: str,
+        documentation: str,
+        metric_type: str,
+        callback: Callable[[], float],
+    ) -> CallbackMetric:
+        return self._register(
+            CallbackMetric(name, documentation, metric_type, callback)
+        )
+
+    def _register(self, metric: _MetricT) -> _MetricT:
+        if existing_metric := self._metrics.get(metric.name):
+            if not isinstance(existing_metric, type(metric)):
+                raise ValueError(f"{metric.name} is already registered")
+            return existing_metric
+
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        const_labels = _format_labels(
+            tuple(self.const_labels), tuple(self.const_labels.values())
+        )[1:-1]
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render(const_labels))
+        return "\n".join(lines) + "\n"
+
+
+async def serve_metrics(
+    registry: MetricsRegistry,
+    host: str = "127.0.0.1",
+    port: int = 9165,
+) -> asyncio.AbstractServer:
+    # Minimal HTTP/1.0 endpoint on a plain TCP port for Prometheus scrapers
+    async def _handler(
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        try:
+            await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 5.0)
+            body = registry.render().encode("utf-8")
+            writer.write(
+                b"HTTP/1.0 200 OK\r\n"
+                b"Content-Type: text/plain; version=0.0.4\r\n"
+                + f"Content-Length: {len(body)}\r\n\r\n".encode("ascii")
+                + body
+            )
+            await writer.drain()
+        except Exception:
+            logger.debug("Failed to serve metrics")
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(_handler, host, port)
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
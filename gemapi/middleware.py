@@ -0,0 +1,80 @@
+import copy
+import inspect
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+
+from gemapi.cache import CachedResponse
+from gemapi.request import Request
+from gemapi.responses import Response
+from gemapi.responses import StatusError
+
+# Processes a matched route: (request, path params) -> response
+Endpoint = Callable[[Request, dict[str, str]], Awaitable[Response]]
+
+
+class Middleware:
+    # Subclasses define `before(req)` and/or `after(req, resp)`, either as
+    # plain methods or coroutines. `before` may return a response to skip the
+    # handler, `after` returns the response to send (errors raised as
+    # StatusError are passed to it as responses).
+    pass
+
+
+def _get_hook(middleware: Middleware, name: str) -> tuple[Any, bool]:
+    hook = getattr(middleware, name, None)
+    return hook, inspect.iscoroutinefunction(hook)
+
+
+def _wrap(endpoint: Endpoint, middleware: Middleware) -> Endpoint:
+    before, before_is_coroutine = _get_hook(middleware, "before")
+    after, after_is_coroutine = _get_hook(middleware, "after")
+    if before is None and after is None:
+        raise ValueError(f"{middleware!r} has no before/after hook")
+
+    async def _call(req: Request, params: dict[str, str]) -> Response:
+        if before is not None:
+            early_resp = await before(req) if before_is_coroutine else before(req)
+            if early_resp is not None:
+                return early_resp
+
+        if after is None:
+            return await endpoint(req, params)
+
+        try:
+            resp = await endpoint(req, params)
+        except StatusError as status_error:
+            resp = status_error.as_response()
+
+        after_resp: Response | None = None
+        try:
+            after_resp = (
+                await after(req, resp) if after_is_coroutine else after(req, resp)
+            )
+            return after_resp
+        finally:
+            # Responses replaced by the hook are never written
+            if after_resp is not resp:
+                await resp.aclose()
+
+    return _call
+
+
+def _copy_shared_responses(endpoint: Endpoint) -> Endpoint:
+    async def _call(req: Request, params: dict[str, str]) -> Response:
+        resp = await endpoint(req, params)
+        # Cached and coalesced responses are shared between requests, the
+        # hooks get a copy they can modify
+        if isinstance(resp, CachedResponse):
+            return copy.copy(resp)
+        return resp
+
+    return _call
+
+
+def compose(endpoint: Endpoint, middlewares: list[Middleware]) -> Endpoint:
+    # The first middleware is the outermost one
+    endpoint = _copy_shared_responses(endpoint)
+    for middleware in reversed(middlewares):
+        endpoint = _wrap(endpoint, middleware)
+    return endpoint
@@ -0,0 +1,186 @@
+import asyncio
+import ssl
+from typing import AsyncIterator
+from urllib.parse import urlsplit
+
+from loguru import logger
+
+from gemapi.request import Request
+from gemapi.responses import MAX_HEADER_SIZE
+from gemapi.responses import ProxyError
+from gemapi.responses import Response
+from gemapi.responses import StatusCode
+from gemapi.responses import StreamingResponse
+from gemapi.responses import parse_header
+
+_CHUNK_SIZE = 64 * 1024
+
+
+class _SessionReusingContext(ssl.SSLContext):
+    # asyncio doesn't expose the session argument, the last session received
+    # from the upstream is used to resume the next connections
+    session: ssl.SSLSession | None = None
+
+    def wrap_bio(  # type: ignore[override]
+        self,
+        incoming: ssl.MemoryBIO,
+        outgoing: ssl.MemoryBIO,
+        server_side: bool = False,
+        server_hostname: str | None = None,
+        session: ssl.SSLSession | None = None,
+    ) -> ssl.SSLObject:
+        return super().wrap_bio(
+            incoming,
+            outgoing,
+            server_side=server_side,
+            server_hostname=server_hostname,
+            session=session or self.session,
+        )
+
+
+class _ProxyResponse(StreamingResponse):
+    __slots__ = ("_upstream", "_upstream_writer")
+
+    def __init__(
+        self,
+        meta: str,
+        upstream: "Upstream",
+        upstream_reader: asyncio.StreamReader,
+        upstream_writer: asyncio.StreamWriter,
+    ) -> None:
+        super().__init__(
+            StatusCode.SUCCESS,
+            meta,
+            upstream._iter_body(upstream_reader),
+        )
+        self._upstream = upstream
+        self._upstream_writer: asyncio.StreamWriter | None = upstream_writer
+
+    async def aclose(self) -> None:
+        # The upstream connection is kept until the body is streamed, or the
+        # response is discarded
+        try:
+            await super().aclose()
+        finally:
+            if self._upstream_writer is not None:
+                upstream_writer, self._upstream_writer = self._upstream_writer, None
+                self._upstream._release(upstream_writer)
+
+
+class Upstream:
+    def __init__(
+        self,
+        host: str,
+        port: int = 1965,
+        max_connections: int = 32,
+        timeout: float = 10.0,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_connections)
+        # Shared by all the connections to the upstream, capsules use
+        # self-signed certificates so they are not verified
+        self._ssl_ctx = _SessionReusingContext(ssl.PROTOCOL_TLS_CLIENT)
+        self._ssl_ctx.check_hostname = False
+        self._ssl_ctx.verify_mode = ssl.CERT_NONE
+
+        self.connections = 0
+        self.resumed_sessions = 0
+
+    async def fetch(self, url: str, buffered: bool = False) -> Response:
+        # The body of success responses is streamed unless buffered is set
+        await self._semaphore.acquire()
+        upstream_writer: asyncio.StreamWriter | None = None
+        # Set once the connection is owned by the streamed response
+        handed_off = False
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(
+                    self.host,
+                    self.port,
+                    ssl=self._ssl_ctx,
+                    server_hostname=self.host,
+                    limit=MAX_HEADER_SIZE,
+                ),
+                self.timeout,
+            )
+            upstream_writer = writer
+            self.connections += 1
+            if writer.get_extra_info("ssl_object").session_reused:
+                self.resumed_sessions += 1
+
+            writer.write(url.encode("utf-8") + b"\r\n")
+            header = await asyncio.wait_for(reader.readuntil(b"\r\n"), self.timeout)
+            status_code, meta = parse_header(header)
+
+            if status_code == StatusCode.SUCCESS and not buffered:
+                handed_off = True
+                return _ProxyResponse(meta, self, reader, writer)
+
+            body = b""
+            if status_code == StatusCode.SUCCESS:
+                body = b"".join([chunk async for chunk in self._iter_body(reader)])
+            return Response(status_code, meta, body or None)
+        except (
+            OSError,
+            EOFError,
+            ValueError,
+            asyncio.LimitOverrunError,
+            asyncio.TimeoutError,
+        ) as exc:
+            logger.warning(f"Upstream {self.host}:{self.port} failed: {exc!r}")
+            raise ProxyError("Upstream request failed") from exc
+        finally:
+            # Streamed responses release the connection once written
+            if handed_off:
+                pass
+            elif upstream_writer is not None:
+                self._release(upstream_writer)
+            else:
+                self._semaphore.release()
+
+    async def _iter_body(self, reader: asyncio.StreamReader) -> AsyncIterator[bytes]:
+        while chunk := await asyncio.wait_for(reader.read(_CHUNK_SIZE), self.timeout):
+            yield chunk
+
+    def _release(self, upstream_writer: asyncio.StreamWriter) -> None:
+        # The session tickets are sent after the handshake with TLS 1.3, the
+        # session is saved once the response is read
+        ssl_object = upstream_writer.get_extra_info("ssl_object")
+        if ssl_object is not None and ssl_object.session is not None:
+            self._ssl_ctx.session = ssl_object.session
+        upstream_writer.close()
+        self._semaphore.release()
+
+
+class Proxy:
+    def __init__(
+        self,
+        prefix: str,
+        upstream_url: str,
+        upstream: Upstream,
+        cache_ttl: float | None = None,
+    ) -> None:
+        self._prefix = prefix.rstrip("/")
+        self._upstream_url = upstream_url.rstrip("/")
+        self.upstream = upstream
+        self.cache_ttl = cache_ttl
+
+    def matches(self, path: str) -> bool:
+        return path == self._prefix or path.startswith(self._prefix + "/")
+
+    async def get_response(self, req: Request) -> Response:
+        url = self._upstream_url + (req.path[len(self._prefix) :] or "/")
+        if req.query:
+            url += "?" + req.query
+        # Cached responses need the full body
+        return await self.upstream.fetch(url, buffered=self.cache_ttl is not None)
+
+
+def parse_upstream_url(upstream_url: str) -> tuple[str, int]:
+    parsed_url = urlsplit(upstream_url)
+    if parsed_url.scheme != "gemini" or not parsed_url.hostname:
+        raise ValueError(f"Invalid upstream URL {upstream_url}")
+    return parsed_url.hostname, parsed_url.port or 1965
@@ -0,0 +1,68 @@
+import math
+import time
+from collections import OrderedDict
+
+from gemapi.responses import StatusCode
+from gemapi.responses import StatusError
+
+
+class SlowDownError(StatusError):
+    STATUS_CODE = StatusCode.SLOW_DOWN
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(str(retry_after))
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    # Token bucket per client allowing `rate` requests per second with bursts
+    # of `burst` requests. At most `max_clients` buckets are tracked, the
+    # least recently seen clients are forgotten first.
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        max_clients: int = 10_000,
+    ) -> None:
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst at least 1")
+
+        self._rate = rate
+        self._burst = burst
+        self._max_clients = max_clients
+        # Buckets are idle long enough to be full again after this delay
+        self._refill_time = burst / rate
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+        self.throttled = 0
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def check(self, key: str) -> None:
+        now = time.monotonic()
+        self._purge(now)
+
+        tokens, updated_at = self._buckets.pop(key, (self._burst, now))
+        tokens = min(self._burst, tokens + (now - updated_at) * self._rate)
+        retry_after = 0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = math.ceil((1 - tokens) / self._rate)
+
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self._max_clients:
+            self._buckets.popitem(last=False)
+
+        if retry_after:
+            self.throttled += 1
+            raise SlowDownError(retry_after)
+
+    def _purge(self, now: float) -> None:
+        # Buckets are ordered by last update so only the oldest need checking
+        while self._buckets:
+            _, (_, updated_at) = next(iter(self._buckets.items()))
+            if now - updated_at < self._refill_time:
+                break
+            self._buckets.popitem(last=False)
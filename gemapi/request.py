@@ -1,16 +1,133 @@
-from urllib.parse import ParseResult
+import datetime
+import re
+from dataclasses import dataclass
+from typing import NamedTuple
+from urllib.parse import unquote
+
+from gemapi.responses import BadRequestError
+
+# 1024 bytes for the URL and 2 bytes for the <CR><LF>
+MAX_REQUEST_LINE_SIZE = 1026
+
+_SCHEME_PREFIX = "gemini://"
+_DOT_SEGMENTS = {".", ".."}
+_CONTROL_CHARS_REGEX = re.compile("[\x00-\x1f\x7f]")
+_INVALID_PERCENT_ESCAPE_REGEX = re.compile("%(?![0-9a-fA-F]{2})")
+
+
+class RequestTarget(NamedTuple):
+    # Drop-in replacement for the urlparse result, without params/fragment
+    scheme: str
+    netloc: str
+    path: str
+    query: str
+
+    def geturl(self) -> str:
+        url = f"{self.scheme}://{self.netloc}{self.path}"
+        return f"{url}?{self.query}" if self.query else url
+
+
+def parse_request_line(data: bytes) -> RequestTarget:
+    # Parses and validates 'gemini://host[:port]/path?query\r\n'
+    if len(data) > MAX_REQUEST_LINE_SIZE:
+        raise BadRequestError("Request too long")
+
+    if not data.endswith(b"\r\n"):
+        raise BadRequestError("Missing <CR><LF>")
+
+    try:
+        url = data[:-2].decode()
+    except UnicodeDecodeError:
+        raise BadRequestError("Request is not valid UTF-8")
+
+    # The scheme is case-insensitive
+    if not url.startswith(_SCHEME_PREFIX) and url[:9].lower() != _SCHEME_PREFIX:
+        scheme, _, _ = url.partition(":")
+        raise BadRequestError(f"Invalid scheme {scheme}")
+
+    # isprintable is a cheap pre-check, it's also false for some non-ASCII chars
+    if not url.isprintable() and _CONTROL_CHARS_REGEX.search(url):
+        raise BadRequestError("Invalid character in request")
+
+    # Fragments are not part of the request, like urlparse they are dropped
+    rest, _, _ = url[9:].partition("#")
+    rest, _, query = rest.partition("?")
+
+    slash_index = rest.find("/")
+    if slash_index == -1:
+        netloc, path = rest, "/"
+    else:
+        netloc, path = rest[:slash_index], rest[slash_index:]
+
+    if not netloc or ":" in netloc or "@" in netloc or "[" in netloc:
+        _validate_netloc(netloc)
+
+    if "%" in url and (
+        _INVALID_PERCENT_ESCAPE_REGEX.search(path)
+        or _INVALID_PERCENT_ESCAPE_REGEX.search(query)
+    ):
+        raise BadRequestError("Invalid percent-encoding")
+
+    if "." in path or "%" in path:
+        for segment in path.split("/"):
+            if segment in _DOT_SEGMENTS or (
+                "%" in segment and unquote(segment) in _DOT_SEGMENTS
+            ):
+                raise BadRequestError("dot segments in path are not allowed")
+
+    # Skips the NamedTuple __new__ wrapper, which is noticeably slower
+    return tuple.__new__(RequestTarget, ("gemini", netloc, path, query))
+
+
+def _validate_netloc(netloc: str) -> None:
+    if not netloc:
+        raise BadRequestError("Missing host")
+
+    if "@" in netloc:
+        raise BadRequestError("Userinfo is not allowed")
+
+    if netloc.startswith("["):
+        # IPv6 literal
+        end = netloc.find("]")
+        if end == -1:
+            raise BadRequestError("Invalid host")
+        port = netloc[end + 1 :]
+        if port and not port.startswith(":"):
+            raise BadRequestError("Invalid host")
+        port = port[1:]
+    else:
+        _, _, port = netloc.partition(":")
+
+    if port and not (port.isascii() and port.isdigit() and 0 < int(port) <= 65535):
+        raise BadRequestError(f"Invalid port {port}")
+
+
+@dataclass(frozen=True)
+class ClientCertificate:
+    # Identity of a client certificate, the fingerprint is the SHA-256 of the
+    # DER encoded certificate
+    fingerprint: str
+    subject: str
+    expires_at: datetime.datetime
+
+    def is_expired(self) -> bool:
+        return datetime.datetime.now(datetime.timezone.utc) > self.expires_at
 
 
 class Request:
+    __slots__ = ("parsed_url", "client_host", "client_port", "client_certificate")
+
     def __init__(
         self,
-        parsed_url: ParseResult,
+        parsed_url: RequestTarget,
         client_host: str,
         client_port: int,
+        client_certificate: ClientCertificate | None = None,
     ) -> None:
         self.parsed_url = parsed_url
         self.client_host = client_host
         self.client_port = client_port
+        self.client_certificate = client_certificate
 
     @property
     def hostname(self) -> str:
@@ -26,6 +143,8 @@ class Request:
 
 
 class Input:
+    __slots__ = ("_value",)
+
     def __init__(self, value: str | None = None) -> None:
         self._value: str | None = value
 
@@ -36,4 +155,4 @@ class Input:
 
 
 class SensitiveInput(Input):
-    pass
+    __slots__ = ()
@@ -1,5 +1,14 @@
+import asyncio
+import functools
+from collections import deque
 from enum import IntEnum
+from typing import Any
+from typing import AsyncIterable
+from typing import Awaitable
+from typing import BinaryIO
 from typing import ClassVar
+from typing import Iterable
+from typing import TypeVar
 
 
 class StatusCode(IntEnum):
@@ -28,12 +37,68 @@ class StatusCode(IntEnum):
     CERTIFICATE_NOT_VALID = 62
 
 
+T = TypeVar("T")
+
+# Each chunk of this size has to be flushed within the stall timeout
+_STALL_CHUNK_SIZE = 64 * 1024
+
+
+@functools.lru_cache(maxsize=1024)
+def encode_header(status_code: StatusCode, meta: str) -> bytes:
+    # Most responses share a few status/meta pairs ("20 text/gemini",
+    # "51 Not found"...), their encoded header line is reused
+    return f"{status_code.value} {meta}\r\n".encode("utf-8")
+
+
+class StallTimeoutWriter(asyncio.StreamWriter):
+    # Aborts the responses when a chunk can't be flushed within the timeout
+    # (the client stopped reading), instead of bounding the whole write, so
+    # large bodies can still be sent to slow clients. Large writes are split
+    # and sent on drain, the responses always drain after writing.
+    def __init__(self, writer: asyncio.StreamWriter, timeout: float) -> None:
+        # Shares the transport of the wrapped writer
+        self._writer = writer
+        self._transport = writer.transport
+        self._reader = None
+        self._loop = asyncio.get_running_loop()
+        self._pending: deque[memoryview] = deque()
+        self.timeout = timeout
+
+    def write(self, data: bytes | bytearray | memoryview) -> None:
+        view = memoryview(data)
+        if not self._pending and view.nbytes <= _STALL_CHUNK_SIZE:
+            self._transport.write(view)
+            return None
+
+        for start in range(0, view.nbytes, _STALL_CHUNK_SIZE):
+            self._pending.append(view[start : start + _STALL_CHUNK_SIZE])
+
+    def writelines(self, data: Iterable[bytes | bytearray | memoryview]) -> None:
+        for item in data:
+            self.write(item)
+
+    async def drain(self) -> None:
+        while self._pending:
+            self._transport.write(self._pending.popleft())
+            await self.bound(self._writer.drain())
+        await self.bound(self._writer.drain())
+
+    async def bound(self, awaitable: Awaitable[T]) -> T:
+        return await asyncio.wait_for(awaitable, self.timeout)
+
+
 class Response:
+    __slots__ = ("status_code", "meta", "body")
+
+    # Whether the response can be cached and shared as bytes, streamed ones
+    # are only written
+    buffered: ClassVar[bool] = True
+
     def __init__(
         self,
         status_code: StatusCode | int,
         meta: str,
-        body: str | None = None,
+        body: str | bytes | memoryview | None = None,
     ) -> None:
         self.status_code = (
             status_code
@@ -44,11 +109,126 @@ class Response:
         self.body = body
 
     def as_bytes(self) -> bytes:
-        data = f"{self.status_code.value} {self.meta}\r\n"
-        if self.body:
-            data += self.body
+        header = encode_header(self.status_code, self.meta)
+        body = self.body
+        if not body:
+            return header
+
+        if isinstance(body, str):
+            return header + body.encode("utf-8")
+
+        return header + body
+
+    async def write(self, writer: asyncio.StreamWriter) -> int:
+        body = self.body
+        if isinstance(body, (bytes, memoryview)) and body:
+            # Avoids copying the body into a new buffer with the header
+            header = encode_header(self.status_code, self.meta)
+            writer.writelines((header, body))
+            await writer.drain()
+            size = body.nbytes if isinstance(body, memoryview) else len(body)
+            return len(header) + size
+
+        data = self.as_bytes()
+        writer.write(data)
+        await writer.drain()
+        return len(data)
+
+    async def aclose(self) -> None:
+        # Releases what the response holds when it's discarded without being
+        # written (like when replaced by a middleware)
+        return None
+
+
+# 2 digits status, a space, 1024 bytes of meta and the <CR><LF>
+MAX_HEADER_SIZE = 1029
+
+
+def parse_header(header: bytes) -> tuple[StatusCode, str]:
+    # Parses a response header line, from an upstream server or a script
+    if len(header) > MAX_HEADER_SIZE:
+        raise ValueError("Header too long")
+
+    status, _, meta = header[:-2].decode("utf-8").partition(" ")
+    if len(status) != 2 or not status.isdigit():
+        raise ValueError(f"Invalid header {header!r}")
+
+    try:
+        return StatusCode(int(status)), meta
+    except ValueError:
+        # Unknown codes are handled like the base code of their class
+        return StatusCode(int(status[0]) * 10), meta
+
+
+_STREAMING_CHUNK_SIZE = 64 * 1024
+_END_OF_BODY: Any = object()
 
-        return data.encode("utf-8")
+
+class StreamingResponse(Response):
+    __slots__ = ("body_iterator", "chunk_size")
+
+    buffered = False
+
+    def __init__(
+        self,
+        status_code: StatusCode | int,
+        meta: str,
+        body: AsyncIterable[bytes | str] | Iterable[bytes | str] | BinaryIO,
+        chunk_size: int = _STREAMING_CHUNK_SIZE,
+    ) -> None:
+        super().__init__(status_code, meta)
+        self.body_iterator = body
+        self.chunk_size = chunk_size
+
+    def as_bytes(self) -> bytes:
+        # The body may be an async iterator, it can only be written
+        raise TypeError("StreamingResponse cannot be buffered")
+
+    async def write(self, writer: asyncio.StreamWriter) -> int:
+        try:
+            header = encode_header(self.status_code, self.meta)
+            writer.write(header)
+            await writer.drain()
+            written = len(header)
+
+            async for chunk in self._iter_chunks():
+                if not chunk:
+                    continue
+
+                data = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+                writer.write(data)
+                written += len(data)
+                # Wait for the transport buffer to be flushed before producing
+                # the next chunk so only one chunk per connection is kept in
+                # memory
+                await writer.drain()
+
+            return written
+        finally:
+            await self.aclose()
+
+    async def aclose(self) -> None:
+        body = self.body_iterator
+        if (aclose := getattr(body, "aclose", None)) is not None:
+            await aclose()
+        elif (close := getattr(body, "close", None)) is not None:
+            close()
+
+    async def _iter_chunks(self) -> AsyncIterable[bytes | str]:
+        body = self.body_iterator
+        if isinstance(body, AsyncIterable):
+            async for chunk in body:
+                yield chunk
+        elif hasattr(body, "read"):
+            # Files and sync iterators may block, they're read in a thread
+            while chunk := await asyncio.to_thread(body.read, self.chunk_size):
+                yield chunk
+        else:
+            iterator = iter(body)
+            while (
+                chunk := await asyncio.to_thread(next, iterator, _END_OF_BODY)
+            ) is not _END_OF_BODY:
+                yield chunk
 
 
 class StatusError(Exception):
@@ -81,26 +261,60 @@ class TemporaryFailureError(StatusError):
     STATUS_CODE = StatusCode.TEMPORARY_FAILURE
 
 
+class ServerUnavailableError(StatusError):
+    STATUS_CODE = StatusCode.SERVER_UNAVAILABLE
+
+
+class CGIError(StatusError):
+    STATUS_CODE = StatusCode.CGI_ERROR
+
+
+class ProxyError(StatusError):
+    STATUS_CODE = StatusCode.PROXY_ERROR
+
+
+class ClientCertificateRequiredError(StatusError):
+    STATUS_CODE = StatusCode.CLIENT_CERTIFICATE_REQUIRED
+
+
+class CertificateNotAuthorisedError(StatusError):
+    STATUS_CODE = StatusCode.CERTIFICATE_NOT_AUTHORISED
+
+
+class CertificateNotValidError(StatusError):
+    STATUS_CODE = StatusCode.CERTIFICATE_NOT_VALID
+
+
 class NotFoundResponse(Response):
+    __slots__ = ()
+
     def __init__(self, meta: str = "Not found") -> None:
         super().__init__(StatusCode.NOT_FOUND, meta)
 
 
 class InputResponse(Response):
+    __slots__ = ()
+
     def __init__(self, meta: str) -> None:
         super().__init__(StatusCode.INPUT, meta)
 
 
 class SensitiveInputResponse(Response):
+    __slots__ = ()
+
     def __init__(self, meta: str) -> None:
         super().__init__(StatusCode.SENSITIVE_INPUT, meta)
 
 
 class BadRequestResponse(Response):
+    __slots__ = ()
+
     def __init__(self, meta: str) -> None:
         super().__init__(StatusCode.BAD_REQUEST, meta)
 
 
 class TemporaryFailureResponse(Response):
+    __slots__ = ()
+
     def __init__(self, meta: str) -> None:
         super().__init__(StatusCode.TEMPORARY_FAILURE, meta)
@@ -1,10 +1,13 @@
 import inspect
 import re
 from dataclasses import dataclass
+from dataclasses import field
 from enum import Enum
 from typing import Any
 from typing import Callable
 
+from gemapi.ratelimit import RateLimiter
+from gemapi.request import ClientCertificate
 from gemapi.request import Input
 from gemapi.request import SensitiveInput
 
@@ -28,18 +31,33 @@ class PathParam:
 
 @dataclass(frozen=True)
 class Route:
+    path: str
     path_regex: re.Pattern
     path_params: list[PathParam]
     handler_signature: inspect.Signature
     input_parameter: inspect.Parameter | None
     handler: Callable[..., Any]
     handler_is_coroutine: bool
+    cache_ttl: float | None = None
+    run_in_executor: bool = True
+    rate_limiter: RateLimiter | None = None
+    client_certificate_parameter: inspect.Parameter | None = None
+    coalesce: bool = False
 
     @classmethod
-    def from_path(cls, path: str, handler: Callable[..., Any]) -> "Route":
+    def from_path(
+        cls,
+        path: str,
+        handler: Callable[..., Any],
+        cache_ttl: float | None = None,
+        run_in_executor: bool = True,
+        rate_limiter: RateLimiter | None = None,
+        coalesce: bool = False,
+    ) -> "Route":
         path_regex, path_params = _build_path_regex(path)
         func_sig = inspect.signature(handler)
         maybe_input_param: inspect.Parameter | None = None
+        maybe_client_certificate_param: inspect.Parameter | None = None
 
         for path_param in path_params:
             if path_param.name not in func_sig.parameters:
@@ -56,14 +74,35 @@ class Route:
                         f"{handler.__name__}: Only 1 Input/SensitiveInput "
                         "parameter is allowed"
                     )
+            elif param.annotation is ClientCertificate:
+                if maybe_client_certificate_param is not None:
+                    raise ValueError(
+                        f"{handler.__name__}: Only 1 ClientCertificate "
+                        "parameter is allowed"
+                    )
+                if cache_ttl is not None or coalesce:
+                    # The responses are shared by all the clients
+                    raise ValueError(
+                        f"{handler.__name__}: ClientCertificate parameters "
+                        "cannot be used with cache_ttl or coalesce"
+                    )
+                maybe_client_certificate_param = param
 
         return cls(
+            path=path,
             path_regex=path_regex,
             path_params=path_params,
             handler_signature=func_sig,
             input_parameter=maybe_input_param,
             handler=handler,
-            handler_is_coroutine=inspect.iscoroutinefunction(handler),
+            # Callable objects (like CGIHandler) may define an async __call__
+            handler_is_coroutine=inspect.iscoroutinefunction(handler)
+            or inspect.iscoroutinefunction(getattr(handler, "__call__", None)),
+            cache_ttl=cache_ttl,
+            run_in_executor=run_in_executor,
+            rate_limiter=rate_limiter,
+            client_certificate_parameter=maybe_client_certificate_param,
+            coalesce=coalesce,
         )
 
 
@@ -95,21 +134,126 @@ def _build_path_regex(path: str) -> tuple[re.Pattern, list[PathParam]]:
     return re.compile(path + "$"), path_params
 
 
+@dataclass(frozen=True)
+class _DynamicSegment:
+    template: str
+    regex: re.Pattern
+    # Set when the whole segment is a single str param, which only needs a
+    # non-empty check instead of a regex match
+    param_name: str | None
+
+    @classmethod
+    def from_template(cls, template: str) -> "_DynamicSegment":
+        regex, path_params = _build_path_regex(template)
+        param_name = None
+        if (
+            len(path_params) == 1
+            and path_params[0].matcher is PathParamMatcher.STR
+            and _PARAM_REGEX.fullmatch(template)
+        ):
+            param_name = path_params[0].name
+
+        return cls(template=template, regex=regex, param_name=param_name)
+
+    def match(self, segment: str) -> dict[str, str] | None:
+        if self.param_name is not None:
+            return {self.param_name: segment} if segment else None
+
+        if m := self.regex.match(segment):
+            return m.groupdict()
+
+        return None
+
+
+@dataclass
+class _Node:
+    static: dict[str, "_Node"] = field(default_factory=dict)
+    dynamic: list[tuple[_DynamicSegment, "_Node"]] = field(default_factory=list)
+    route: Route | None = None
+
+    def child(self, template: str) -> "_Node":
+        if not _PARAM_REGEX.search(template):
+            if template not in self.static:
+                self.static[template] = _Node()
+            return self.static[template]
+
+        for dynamic_segment, node in self.dynamic:
+            if dynamic_segment.template == template:
+                return node
+
+        node = _Node()
+        self.dynamic.append((_DynamicSegment.from_template(template), node))
+        return node
+
+
 class Router:
     def __init__(self) -> None:
         self._routes: list[Route] = []
+        self._root = _Node()
 
-    def route(self, path: str) -> Callable[..., Any]:
+    def route(
+        self,
+        path: str,
+        cache_ttl: float | None = None,
+        run_in_executor: bool = True,
+        rate_limiter: RateLimiter | None = None,
+        coalesce: bool = False,
+    ) -> Callable[..., Any]:
         def _decorator(handler: Callable[..., Any]) -> Callable[..., Any]:
-            route = Route.from_path(path, handler)
-            self._routes.append(route)
+            route = Route.from_path(
+                path,
+                handler,
+                cache_ttl=cache_ttl,
+                run_in_executor=run_in_executor,
+                rate_limiter=rate_limiter,
+                coalesce=coalesce,
+            )
+            self._add_route(route)
             return handler
 
         return _decorator
 
+    def _add_route(self, route: Route) -> None:
+        self._routes.append(route)
+
+        node = self._root
+        for template in route.path.split("/"):
+            node = node.child(template)
+
+        # The first registered route wins, like it did with the linear scan
+        if node.route is None:
+            node.route = route
+
     def match(self, path: str) -> tuple[Route | None, dict[str, str] | None]:
-        for route in self._routes:
-            if m := route.path_regex.match(path):
-                return route, m.groupdict()
+        params: dict[str, str] = {}
+        if route := _match_node(self._root, path.split("/"), 0, params):
+            return route, params
 
         return None, None
+
+
+def _match_node(
+    node: _Node,
+    segments: list[str],
+    index: int,
+    params: dict[str, str],
+) -> Route | None:
+    if index == len(segments):
+        return node.route
+
+    segment = segments[index]
+
+    # Static segments always take precedence over path params
+    if (static_node := node.static.get(segment)) is not None:
+        if route := _match_node(static_node, segments, index + 1, params):
+            return route
+
+    for dynamic_segment, dynamic_node in node.dynamic:
+        if (matched_params := dynamic_segment.match(segment)) is None:
+            continue
+
+        if route := _match_node(dynamic_node, segments, index + 1, params):
+            params.update(matched_params)
+            return route
+
+    return None
@@ -2,58 +2,272 @@ import asyncio
 import datetime
 import signal
 import ssl
+import sys
+import time
+from pathlib import Path
 
 from loguru import logger
 
 from gemapi.applications import Application
 from gemapi.certificates import CertificateManager
+from gemapi.certificates import certificate_managers
+from gemapi.metrics import serve_metrics
+from gemapi.request import MAX_REQUEST_LINE_SIZE
 
 
 class Server:
-    def __init__(self, application: Application) -> None:
+    def __init__(
+        self,
+        application: Application,
+        handshake_timeout: float = 10.0,
+        profile_startup: bool = False,
+        drain_timeout: float = 10.0,
+        trusted_client_certificates: str | Path | None = None,
+    ) -> None:
         self._application = application
+        self._handshake_timeout = handshake_timeout
+        self._drain_timeout = drain_timeout
+        # PEM bundle of the client certificates (or their CAs) to accept
+        self._trusted_client_certificates = trusted_client_certificates
+        # Tasks handling the accepted connections, waited for on shutdown
+        self._connections: set[asyncio.Task] = set()
+        self._stop_requested: asyncio.Event | None = None
+        self._profile_startup = profile_startup
+        # Seconds spent in each startup step, logged when profiling
+        self.startup_timings: dict[str, float] = {}
+        # The default context is used for the handshake, the contexts of the
+        # hostname routers are prebuilt and selected from the SNI server name
+        self._ssl_ctx: ssl.SSLContext | None = None
+        self._sni_contexts: dict[str, ssl.SSLContext] = {}
+        self._default_hostname: str | None = None
+        self._renewal_timers: dict[str, asyncio.TimerHandle] = {}
+        self._handshake_seconds = application.metrics.histogram(
+            "gemapi_tls_handshake_seconds",
+            "Time spent in the TLS handshake.",
+        )
 
-    async def run(self, host: str = "localhost", port: int = 1965):
-        cm = CertificateManager([host])
+    async def run(
+        self,
+        host: str = "localhost",
+        port: int = 1965,
+        reuse_port: bool = False,
+        manage_certificate: bool = True,
+        metrics_port: int | None = None,
+        metrics_host: str = "127.0.0.1",
+    ):
+        # One certificate per hostname router, served on the same socket
+        self._default_hostname = host
+        managers = certificate_managers(host, self._application.hostnames)
         loop = asyncio.get_event_loop()
-        signals = (signal.SIGHUP, signal.SIGTERM, signal.SIGINT)
+        self._stop_requested = asyncio.Event()
+        signals = (signal.SIGTERM, signal.SIGINT)
         for s in signals:
-            loop.add_signal_handler(
-                s, lambda s=s: asyncio.create_task(self._shutdown(s, loop))
-            )
-        while True:
-            cm.initialize()
-            server = await asyncio.start_server(
-                self._application.stream_handler, host, port, ssl=self._get_ssl_ctx(cm)
-            )
-            addrs = ", ".join(str(sock.getsockname()) for sock in server.sockets)
-            logger.info(f"Serving on {addrs}")
-            stop = asyncio.Event()
+            loop.add_signal_handler(s, self._request_stop, s)
+
+        # When running as a worker, the certificate is managed by the
+        # supervisor process and SIGHUP only reloads it from the disk
+        loop.add_signal_handler(
+            signal.SIGHUP,
+            lambda: self._rotate_certificates(managers, renew=manage_certificate),
+        )
+        step_started_at = time.perf_counter()
+        if manage_certificate:
+            for cm in managers.values():
+                cm.initialize()
+        self._record_startup_step("certificate", step_started_at)
+
+        step_started_at = time.perf_counter()
+        for hostname, cm in managers.items():
+            self._load_certificate(hostname, cm, schedule_renewal=manage_certificate)
+        self._record_startup_step("ssl_context", step_started_at)
 
-            def restart_server():
-                logger.info("Certificate is expiring, restarting server")
-                stop.set()
+        step_started_at = time.perf_counter()
+        await self._application.startup()
+        self._record_startup_step("startup_hooks", step_started_at)
+
+        step_started_at = time.perf_counter()
+        server = await asyncio.start_server(
+            self._handle_connection,
+            host,
+            port,
+            reuse_port=reuse_port,
+        )
+        self._record_startup_step("listen", step_started_at)
+        addrs = ", ".join(str(sock.getsockname()) for sock in server.sockets)
+        logger.info(f"Serving on {addrs}")
 
-            expires_in = (
-                cm.certificate_expires_at().timestamp()
-                - datetime.datetime.now(datetime.timezone.utc).timestamp()
+        if self._profile_startup:
+            steps = " ".join(
+                f"{step}={duration * 1000:.2f}ms"
+                for step, duration in self.startup_timings.items()
             )
-            logger.info(f"Certificate is expiring in {expires_in}")
-            timer = loop.call_later(
-                expires_in,
-                restart_server,
+            logger.info(
+                f"Startup profile: {steps} "
+                f"cryptography_imported={'cryptography' in sys.modules}"
             )
 
-            try:
-                await stop.wait()
-            except asyncio.exceptions.CancelledError:
-                logger.info("stop cancelled")
-                break
+        if metrics_port is not None:
+            await serve_metrics(self._application.metrics, metrics_host, metrics_port)
+
+        try:
+            await self._stop_requested.wait()
+        except asyncio.exceptions.CancelledError:
+            logger.info("stop cancelled")
             server.close()
-            timer.cancel()
+            raise
+
+        await self._drain(server)
 
+        for renewal_timer in self._renewal_timers.values():
+            renewal_timer.cancel()
+
+        self._application.access_logger.close()
         logger.info("Exiting")
 
+    def _record_startup_step(self, step: str, started_at: float) -> None:
+        self.startup_timings[step] = time.perf_counter() - started_at
+
+    def _load_certificate(
+        self,
+        hostname: str,
+        cm: CertificateManager,
+        schedule_renewal: bool,
+    ) -> None:
+        # New connections will use the new context, the listening socket and
+        # the in-flight connections are left untouched
+        ssl_ctx = self._get_ssl_ctx(cm)
+        if hostname == self._default_hostname:
+            ssl_ctx.sni_callback = self._select_ssl_ctx
+            self._ssl_ctx = ssl_ctx
+        else:
+            self._sni_contexts[hostname] = ssl_ctx
+
+        if renewal_timer := self._renewal_timers.pop(hostname, None):
+            renewal_timer.cancel()
+
+        if schedule_renewal:
+            renews_in = max(
+                0.0,
+                cm.certificate_renews_at().timestamp()
+                - datetime.datetime.now(datetime.timezone.utc).timestamp(),
+            )
+            logger.info(f"Certificate for {hostname} will be renewed in {renews_in}")
+            self._renewal_timers[hostname] = asyncio.get_running_loop().call_later(
+                renews_in,
+                self._rotate_certificate,
+                hostname,
+                cm,
+                True,
+            )
+
+    def _rotate_certificate(
+        self,
+        hostname: str,
+        cm: CertificateManager,
+        renew: bool,
+    ) -> None:
+        try:
+            if renew:
+                cm.renew()
+            else:
+                logger.info(f"Reloading certificate for {hostname}")
+            self._load_certificate(hostname, cm, schedule_renewal=renew)
+        except Exception:
+            logger.exception(f"Failed to rotate the certificate for {hostname}")
+
+    def _rotate_certificates(
+        self,
+        managers: dict[str, CertificateManager],
+        renew: bool,
+    ) -> None:
+        for hostname, cm in managers.items():
+            self._rotate_certificate(hostname, cm, renew)
+
+    def _select_ssl_ctx(
+        self,
+        ssl_obj: ssl.SSLObject,
+        server_name: str | None,
+        ssl_ctx: ssl.SSLContext,
+    ) -> None:
+        # Called during the handshake, clients not sending SNI (or for an
+        # unknown hostname) get the default certificate
+        if server_name is None or not self._sni_contexts:
+            return None
+
+        server_name = server_name.lower()
+        selected_ctx = self._sni_contexts.get(server_name)
+        if selected_ctx is None:
+            selected_ctx = self._sni_contexts.get("*." + server_name.partition(".")[2])
+
+        if selected_ctx is not None:
+            ssl_obj.context = selected_ctx
+        return None
+
+    async def _handle_connection(
+        self,
+        plain_reader: asyncio.StreamReader,
+        plain_writer: asyncio.StreamWriter,
+    ) -> None:
+        if self._ssl_ctx is None:
+            raise ValueError("Server is not running")
+
+        task = asyncio.current_task()
+        if task is None:
+            raise ValueError("Not running in a task")
+
+        self._connections.add(task)
+        try:
+            await self._handle_tls_connection(plain_reader, plain_writer)
+        finally:
+            self._connections.discard(task)
+
+    async def _handle_tls_connection(
+        self,
+        plain_reader: asyncio.StreamReader,
+        plain_writer: asyncio.StreamWriter,
+    ) -> None:
+        if self._ssl_ctx is None:
+            raise ValueError("Server is not running")
+
+        # The TLS handshake is done here instead of by the server so it can
+        # be bounded and accounted for
+        peername = plain_writer.get_extra_info("peername")
+        # Stop reading before yielding to the loop, otherwise the client hello
+        # may be consumed by the plain stream before start_tls takes over
+        plain_writer.transport.pause_reading()  # type: ignore
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=MAX_REQUEST_LINE_SIZE)
+        protocol = asyncio.StreamReaderProtocol(reader)
+        handshake_started_at = time.monotonic()
+        try:
+            transport = await asyncio.wait_for(
+                loop.start_tls(
+                    plain_writer.transport,
+                    protocol,
+                    self._ssl_ctx,
+                    server_side=True,
+                ),
+                self._handshake_timeout,
+            )
+        except asyncio.TimeoutError:
+            self._application.timeout_stats.handshake += 1
+            logger.warning(f"{peername} - TLS handshake timeout")
+            plain_writer.transport.abort()
+            return None
+        except (ssl.SSLError, OSError) as exc:
+            logger.debug(f"{peername} - TLS handshake failed: {exc!r}")
+            plain_writer.transport.abort()
+            return None
+
+        if transport is None:
+            return None
+
+        self._handshake_seconds.observe(time.monotonic() - handshake_started_at)
+
+        protocol.connection_made(transport)
+        writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+        await self._application.stream_handler(reader, writer)
+
     def _get_ssl_ctx(self, cm: CertificateManager) -> ssl.SSLContext:
         # Only allow TLS 1.3
         ssl_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
@@ -65,16 +279,38 @@ class Server:
             & ssl.OP_NO_TLSv1_2
         )
         ssl_ctx.load_cert_chain(str(cm.certfile), keyfile=str(cm.keyfile))
+        if self._trusted_client_certificates is not None:
+            # The ssl module cannot accept any self-signed certificate, so
+            # clients must be registered (the bundle is reloaded on SIGHUP).
+            # Clients without a certificate are still accepted.
+            ssl_ctx.verify_mode = ssl.CERT_OPTIONAL
+            ssl_ctx.load_verify_locations(cafile=str(self._trusted_client_certificates))
         return ssl_ctx
 
-    async def _shutdown(self, signal, loop):
+    def _request_stop(self, signal: signal.Signals) -> None:
         logger.info(f"Caught {signal=}")
-        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        if self._stop_requested is not None:
+            self._stop_requested.set()
 
-        logger.info(f"Cancelling {len(tasks)} tasks")
+    async def _drain(self, server: asyncio.Server) -> None:
+        # Stop accepting (workers sharing the port or the next process get the
+        # new connections), then let the in-flight ones complete
+        server.close()
+        self._application.draining = True
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._drain_timeout
+        while self._connections and (remaining := deadline - loop.time()) > 0:
+            logger.info(f"Draining {len(self._connections)} connections in flight")
+            await asyncio.wait(set(self._connections), timeout=min(remaining, 1.0))
 
-        [task.cancel() for task in tasks]
+        if self._connections:
+            logger.warning(
+                f"Cancelling {len(self._connections)} connections after the "
+                f"{self._drain_timeout}s drain timeout"
+            )
+            tasks = list(self._connections)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
 
-        await asyncio.gather(*tasks)
-        logger.info("stopping loop")
-        loop.stop()
+        logger.info("Drained connections")
@@ -0,0 +1,187 @@
+import asyncio
+import mimetypes
+import mmap
+import stat
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO
+from urllib.parse import unquote
+
+from gemapi.responses import NotFoundError
+from gemapi.responses import Response
+from gemapi.responses import StallTimeoutWriter
+from gemapi.responses import StatusCode
+from gemapi.responses import encode_header
+
+GEMINI_EXTENSIONS = {".gmi", ".gemini"}
+_DEFAULT_MIME_TYPE = "application/octet-stream"
+_MMAP_CHUNK_SIZE = 256 * 1024
+_SENDFILE_CHUNK_SIZE = 256 * 1024
+_MAX_CACHE_ENTRIES = 4096
+
+
+def _guess_mime_type(path: Path) -> str:
+    if path.suffix in GEMINI_EXTENSIONS:
+        return "text/gemini"
+
+    mime_type, _ = mimetypes.guess_type(path.name)
+    return mime_type or _DEFAULT_MIME_TYPE
+
+
+@dataclass(frozen=True)
+class _FileInfo:
+    path: Path
+    size: int
+    mime_type: str
+    is_directory: bool
+    checked_at: float
+
+
+class FileResponse(Response):
+    __slots__ = ("path", "size")
+
+    # Files are sent from the disk, they're never kept in memory
+    buffered = False
+
+    def __init__(self, path: Path, size: int, mime_type: str) -> None:
+        super().__init__(StatusCode.SUCCESS, mime_type)
+        self.path = path
+        self.size = size
+
+    def as_bytes(self) -> bytes:
+        return encode_header(self.status_code, self.meta) + self.path.read_bytes()
+
+    async def write(self, writer: asyncio.StreamWriter) -> int:
+        header = encode_header(self.status_code, self.meta)
+        writer.write(header)
+        await writer.drain()
+
+        if not self.size:
+            return len(header)
+
+        with self.path.open("rb") as f:
+            # Native sendfile is only possible when the socket is not wrapped
+            # by TLS (i.e. when TLS is terminated in front of gemapi), and
+            # there's no socket at all with in-memory streams
+            if (
+                writer.get_extra_info("sslcontext") is None
+                and writer.get_extra_info("socket") is not None
+            ):
+                try:
+                    return len(header) + await self._sendfile(writer, f)
+                except (asyncio.SendfileNotAvailableError, RuntimeError):
+                    pass
+
+            return len(header) + await self._write_mmap(writer, f.fileno(), f.tell())
+
+    async def _sendfile(self, writer: asyncio.StreamWriter, f: BinaryIO) -> int:
+        # The progress of sendfile can't be observed, it's sent in small
+        # chunks that are each bounded by the stall timeout
+        loop = asyncio.get_running_loop()
+        sent = 0
+        while sent < self.size:
+            sendfile = loop.sendfile(
+                writer.transport,
+                f,
+                count=min(_SENDFILE_CHUNK_SIZE, self.size - sent),
+                fallback=False,
+            )
+            if isinstance(writer, StallTimeoutWriter):
+                chunk_sent = await writer.bound(sendfile)
+            else:
+                chunk_sent = await sendfile
+            if not chunk_sent:
+                break
+            sent += chunk_sent
+
+        return sent
+
+    async def _write_mmap(
+        self,
+        writer: asyncio.StreamWriter,
+        fileno: int,
+        offset: int,
+    ) -> int:
+        # The mapping is not closed explicitly as the transport may still
+        # reference the last chunks, it will be unmapped once released
+        view = memoryview(mmap.mmap(fileno, 0, access=mmap.ACCESS_READ))
+        for start in range(offset, self.size, _MMAP_CHUNK_SIZE):
+            writer.write(view[start : start + _MMAP_CHUNK_SIZE])
+            await writer.drain()
+
+        return self.size - offset
+
+
+class StaticFiles:
+    def __init__(
+        self,
+        prefix: str,
+        directory: Path | str,
+        index: str = "index.gmi",
+        cache_ttl: float = 1.0,
+    ) -> None:
+        self._prefix = prefix.rstrip("/")
+        self._directory = Path(directory).resolve()
+        self._index = index
+        self._cache_ttl = cache_ttl
+        self._cache: dict[str, _FileInfo] = {}
+
+        if not self._directory.is_dir():
+            raise ValueError(f"{directory} is not a directory")
+
+    def matches(self, path: str) -> bool:
+        return path == self._prefix or path.startswith(self._prefix + "/")
+
+    def get_response(self, path: str) -> Response:
+        now = time.monotonic()
+        file_info = self._cache.get(path)
+        if file_info is None or now - file_info.checked_at > self._cache_ttl:
+            file_info = self._lookup(path, now)
+            if file_info is None:
+                self._cache.pop(path, None)
+                raise NotFoundError("Not found")
+
+            if len(self._cache) >= _MAX_CACHE_ENTRIES:
+                self._cache.clear()
+            self._cache[path] = file_info
+
+        # Redirect to the trailing slash so relative links in the index work
+        if file_info.is_directory and not path.endswith("/"):
+            return Response(StatusCode.PERMANENT_REDIRECT, path + "/")
+
+        return FileResponse(file_info.path, file_info.size, file_info.mime_type)
+
+    def _lookup(self, path: str, now: float) -> _FileInfo | None:
+        # Dot-segments are removed by parse_request_line, the decoded ones are
+        # caught by the path traversal check
+        relative_path = unquote(path[len(self._prefix) :]).lstrip("/")
+        if "\x00" in relative_path:
+            return None
+
+        candidate = (self._directory / relative_path).resolve()
+
+        # Guard against path traversal (including via symlinks)
+        if not candidate.is_relative_to(self._directory):
+            return None
+
+        is_directory = False
+        try:
+            stat_result = candidate.stat()
+            if stat.S_ISDIR(stat_result.st_mode):
+                is_directory = True
+                candidate = candidate / self._index
+                stat_result = candidate.stat()
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+        if not stat.S_ISREG(stat_result.st_mode):
+            return None
+
+        return _FileInfo(
+            path=candidate,
+            size=stat_result.st_size,
+            mime_type=_guess_mime_type(candidate),
+            is_directory=is_directory,
+            checked_at=now,
+        )
@@ -0,0 +1,410 @@
+import asyncio
+import os
+import re
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any
+from typing import Callable
+
+from gemapi.responses import Response
+from gemapi.responses import StatusCode
+from gemapi.responses import encode_header
+
+# {{ user.name }} or {{ body|raw }} to skip the escaping
+_EXPRESSION_REGEX = re.compile(r"{{\s*(.*?)\s*}}")
+_NAME = r"[a-zA-Z_][a-zA-Z0-9_]*(?:\.[a-zA-Z_][a-zA-Z0-9_]*)*"
+_NAME_REGEX = re.compile(f"^{_NAME}$")
+_VALUE_REGEX = re.compile(rf"^({_NAME})(\s*\|\s*raw)?$")
+# Block tags must be on their own line, which is removed from the output
+_BLOCK_TAG_REGEX = re.compile(r"^\s*{%\s*(.*?)\s*%}\s*$")
+
+# Where a value is rendered, to escape what would change the line types
+_TEXT = "_escape_text"
+_PRE = "_escape_pre"
+# Link, heading, list item and quote lines, newlines are replaced by spaces
+_SINGLE_LINE = "_escape_single_line"
+# Link URLs, the whitespaces (which would end the URL) are percent-encoded
+_LINK_URL = "_escape_link_url"
+# Values at the start of a line are always escaped
+_LINE_START_ESCAPES = {
+    _TEXT: "_escape_text_start",
+    _PRE: "_escape_pre_start",
+}
+# Strings matching these conditions need no escaping, they're checked inline
+_ESCAPE_CONDITIONS = {
+    _TEXT: "'\\n' in {var}",
+    _PRE: "'\\n' in {var}",
+    _SINGLE_LINE: "'\\n' in {var} or '\\r' in {var}",
+    _LINK_URL: "' ' in {var} or not {var}.isprintable()",
+}
+# Static text bigger than this is emitted as its own pre-encoded chunk, the
+# rest is encoded along with the values
+_MAX_INLINED_STATIC_SIZE = 256
+
+_TEXT_MARKERS = ("=>", "#", "```", "* ", ">")
+_PRE_MARKERS = ("```",)
+
+_URL_WHITESPACE_ESCAPES = str.maketrans(
+    {" ": "%20", "\t": "%09", "\n": "%0A", "\r": "%0D"}
+)
+
+RenderFunc = Callable[[Mapping[str, Any]], list[bytes]]
+
+
+class TemplateSyntaxError(ValueError):
+    pass
+
+
+def _escape_single_line(value: Any) -> str:
+    text = value if isinstance(value, str) else str(value)
+    if "\n" in text or "\r" in text:
+        return " ".join(text.splitlines())
+    return text
+
+
+def _escape_link_url(value: Any) -> str:
+    return str(value).translate(_URL_WHITESPACE_ESCAPES)
+
+
+def _at_line_start(previous_values: tuple[Any, ...], line_start: bool) -> bool:
+    # Whether the values rendered just before a value leave it at the start of
+    # a line: they're all empty (and nothing precedes them) or end a line
+    for value in reversed(previous_values):
+        if text := value if type(value) is str else str(value):
+            return text.endswith("\n")
+    return line_start
+
+
+def _escape_lines(text: str, markers: tuple[str, ...], first_line: int) -> str:
+    # Lines starting with a marker are turned into text lines by a space
+    lines = text.split("\n")
+    for i in range(first_line, len(lines)):
+        if lines[i].startswith(markers):
+            lines[i] = " " + lines[i]
+    return "\n".join(lines)
+
+
+def _escape_text(value: Any) -> str:
+    return _escape_lines(str(value), _TEXT_MARKERS, 1)
+
+
+def _escape_text_start(value: Any) -> str:
+    return _escape_lines(str(value), _TEXT_MARKERS, 0)
+
+
+def _escape_pre(value: Any) -> str:
+    return _escape_lines(str(value), _PRE_MARKERS, 1)
+
+
+def _escape_pre_start(value: Any) -> str:
+    return _escape_lines(str(value), _PRE_MARKERS, 0)
+
+
+def _encode_text(chunks: list[bytes], text: list[str]) -> None:
+    # The rendered text is encoded at once instead of value by value
+    if text:
+        chunks.append("".join(text).encode("utf-8"))
+        text.clear()
+
+
+def _lookup(obj: Any, attr: str) -> Any:
+    if isinstance(obj, Mapping):
+        return obj[attr]
+    return getattr(obj, attr)
+
+
+_NAMESPACE = {
+    func.__name__: func
+    for func in [
+        _escape_single_line,
+        _escape_link_url,
+        _at_line_start,
+        _escape_text,
+        _escape_text_start,
+        _escape_pre,
+        _escape_pre_start,
+        _encode_text,
+        _lookup,
+    ]
+}
+
+
+class _Compiler:
+    # Compiles a template into the source of a Python function rendering it:
+    # values are assigned to local variables and each line is rendered by an
+    # f-string appended to a list of text, encoded when a chunk is complete
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._code = [
+            "def _render(_ctx):",
+            " _chunks = []",
+            " _text = []",
+            " _append = _text.append",
+        ]
+        self._indent = 1
+        self._blocks: list[str] = []
+        self._loop_vars: list[str] = []
+        self._vars_count = 0
+        # The f-string being built, with {var} placeholders for the values
+        self._fstring = ""
+        self._fstring_has_values = False
+        # Static text not yet added to the f-string
+        self._static = ""
+
+    def compile(self, source: str) -> RenderFunc:
+        in_pre = False
+        for lineno, line in enumerate(source.splitlines(keepends=True), start=1):
+            if tag := _BLOCK_TAG_REGEX.match(line):
+                self._flush()
+                self._compile_tag(tag.group(1), lineno)
+                continue
+
+            self._compile_line(line, in_pre, lineno)
+            if line.startswith("```"):
+                in_pre = not in_pre
+
+        if self._blocks:
+            raise TemplateSyntaxError(
+                f"{self._name}: unclosed {self._blocks[-1]} block"
+            )
+
+        self._flush()
+        self._emit("_encode_text(_chunks, _text)")
+        self._emit("return _chunks")
+
+        namespace: dict[str, Any] = dict(_NAMESPACE)
+        exec(
+            compile("\n".join(self._code), f"<template {self._name}>", "exec"),
+            namespace,
+        )
+        return namespace["_render"]
+
+    def _compile_line(self, line: str, in_pre: bool, lineno: int) -> None:
+        if line.startswith("```") or (
+            not in_pre and line.startswith(("=>", "#", "* ", ">"))
+        ):
+            line_mode = _SINGLE_LINE
+        elif in_pre:
+            line_mode = _PRE
+        else:
+            line_mode = _TEXT
+
+        position = 0
+        # Values rendered since the last static text of the line, which decide
+        # at render time if the next value starts a line
+        previous_vars: list[str] = []
+        after_static = False
+        for expression in _EXPRESSION_REGEX.finditer(line):
+            if static := line[position : expression.start()]:
+                previous_vars = []
+                after_static = True
+            self._static += static
+            self._push_static()
+            position = expression.end()
+
+            if not (value := _VALUE_REGEX.match(expression.group(1))):
+                raise TemplateSyntaxError(
+                    f"{self._name}:{lineno}: invalid expression "
+                    f"{expression.group(1)!r}"
+                )
+
+            var = self._new_var()
+            self._emit(f"{var} = {self._compile_value(value.group(1))}")
+            value_mode = line_mode
+            if line.startswith("=>") and not any(
+                char.isspace()
+                for char in _EXPRESSION_REGEX.sub(
+                    "", line[2 : expression.start()].lstrip()
+                )
+            ):
+                value_mode = _LINK_URL
+
+            condition = _ESCAPE_CONDITIONS[value_mode].format(var=var)
+            if value.group(2):
+                # Formatting the f-string calls str() on the raw values
+                pass
+            elif value_mode not in _LINE_START_ESCAPES or (
+                after_static and not previous_vars
+            ):
+                self._emit(f"if type({var}) is not str or {condition}:")
+                self._emit(f" {var} = {value_mode}({var})")
+            elif not previous_vars:
+                self._emit(f"{var} = {_LINE_START_ESCAPES[value_mode]}({var})")
+            else:
+                previous_values = "(" + ", ".join(previous_vars) + ",)"
+                line_start = not after_static
+                self._emit(f"if _at_line_start({previous_values}, {line_start}):")
+                self._emit(f" {var} = {_LINE_START_ESCAPES[value_mode]}({var})")
+                self._emit(f"elif type({var}) is not str or {condition}:")
+                self._emit(f" {var} = {value_mode}({var})")
+            previous_vars.append(var)
+
+            self._fstring += "{" + var + "}"
+            self._fstring_has_values = True
+
+        self._static += line[position:]
+        # The f-string is appended once its line is complete, static lines
+        # are merged with the next line
+        if self._fstring_has_values:
+            self._flush()
+
+    def _compile_tag(self, tag: str, lineno: int) -> None:
+        match tag.split():
+            case ["for", loop_var, "in", value] if loop_var.isidentifier():
+                self._emit(f"for _l_{loop_var} in {self._compile_value(value)}:")
+                self._loop_vars.append(loop_var)
+                self._open_block("for")
+            case ["endfor"]:
+                self._close_block("for", lineno)
+                self._loop_vars.pop()
+            case ["if", "not", value]:
+                self._emit(f"if not {self._compile_value(value)}:")
+                self._open_block("if")
+            case ["if", value]:
+                self._emit(f"if {self._compile_value(value)}:")
+                self._open_block("if")
+            case ["else"] if self._blocks and self._blocks[-1] == "if":
+                self._emit("pass")
+                self._indent -= 1
+                self._emit("else:")
+                self._indent += 1
+            case ["endif"]:
+                self._close_block("if", lineno)
+            case _:
+                raise TemplateSyntaxError(f"{self._name}:{lineno}: invalid tag {tag!r}")
+
+    def _compile_value(self, value: str) -> str:
+        if not _NAME_REGEX.match(value):
+            raise TemplateSyntaxError(f"{self._name}: invalid expression {value!r}")
+
+        name, *attrs = value.split(".")
+        if name in self._loop_vars:
+            expression = f"_l_{name}"
+        else:
+            expression = f"_ctx[{name!r}]"
+
+        for attr in attrs:
+            # Dicts are looked up inline, isinstance on the Mapping ABC is slow
+            var = self._new_var()
+            expression = (
+                f"({var}[{attr!r}] if type({var} := {expression}) is dict "
+                f"else _lookup({var}, {attr!r}))"
+            )
+        return expression
+
+    def _new_var(self) -> str:
+        self._vars_count += 1
+        return f"_v{self._vars_count}"
+
+    def _open_block(self, block: str) -> None:
+        self._blocks.append(block)
+        self._indent += 1
+
+    def _close_block(self, block: str, lineno: int) -> None:
+        if not self._blocks or self._blocks[-1] != block:
+            raise TemplateSyntaxError(f"{self._name}:{lineno}: unexpected end{block}")
+        self._blocks.pop()
+        # Empty blocks are valid
+        self._emit("pass")
+        self._indent -= 1
+
+    def _push_static(self) -> None:
+        text = self._static
+        self._static = ""
+        if len(text) > _MAX_INLINED_STATIC_SIZE:
+            # Encoded once, when the template is compiled, and emitted as is
+            self._flush_fstring()
+            self._emit("_encode_text(_chunks, _text)")
+            self._emit(f"_chunks.append({text.encode('utf-8')!r})")
+        else:
+            self._fstring += text.replace("{", "{{").replace("}", "}}")
+
+    def _flush(self) -> None:
+        self._push_static()
+        self._flush_fstring()
+
+    def _flush_fstring(self) -> None:
+        if self._fstring:
+            self._emit(f"_append(f{self._fstring!r})")
+            self._fstring = ""
+            self._fstring_has_values = False
+
+    def _emit(self, line: str) -> None:
+        self._code.append(" " * self._indent + line)
+
+
+def compile_template(source: str, name: str = "<string>") -> RenderFunc:
+    return _Compiler(name).compile(source)
+
+
+class TemplateResponse(Response):
+    __slots__ = ("chunks",)
+
+    def __init__(
+        self,
+        chunks: list[bytes],
+        meta: str = "text/gemini",
+        status_code: StatusCode | int = StatusCode.SUCCESS,
+    ) -> None:
+        super().__init__(status_code, meta)
+        self.chunks = chunks
+
+    def as_bytes(self) -> bytes:
+        return encode_header(self.status_code, self.meta) + b"".join(self.chunks)
+
+    async def write(self, writer: asyncio.StreamWriter) -> int:
+        # The chunks are handed to the transport without being joined first
+        header = encode_header(self.status_code, self.meta)
+        writer.write(header)
+        writer.writelines(self.chunks)
+        await writer.drain()
+        return len(header) + sum(len(chunk) for chunk in self.chunks)
+
+
+class Templates:
+    def __init__(
+        self,
+        directory: str | Path = "templates",
+        auto_reload: bool = False,
+    ) -> None:
+        self._directory = Path(directory)
+        # Templates are compiled on first use, and recompiled when their mtime
+        # changes with auto_reload (meant for development)
+        self._auto_reload = auto_reload
+        self._compiled: dict[str, tuple[int, RenderFunc]] = {}
+
+    def render(
+        self,
+        name: str,
+        context: Mapping[str, Any] | None = None,
+    ) -> list[bytes]:
+        return self.get_template(name)(context or {})
+
+    def response(
+        self,
+        name: str,
+        context: Mapping[str, Any] | None = None,
+        meta: str = "text/gemini",
+    ) -> TemplateResponse:
+        return TemplateResponse(self.render(name, context), meta=meta)
+
+    def get_template(self, name: str) -> RenderFunc:
+        compiled = self._compiled.get(name)
+        if compiled is not None and not self._auto_reload:
+            return compiled[1]
+
+        path = self._path(name)
+        mtime_ns = os.stat(path).st_mtime_ns
+        if compiled is not None and compiled[0] == mtime_ns:
+            return compiled[1]
+
+        render = compile_template(path.read_text(encoding="utf-8"), name)
+        self._compiled[name] = (mtime_ns, render)
+        return render
+
+    def _path(self, name: str) -> Path:
+        directory = self._directory.resolve()
+        path = (directory / name).resolve()
+        if not path.is_relative_to(directory):
+            raise ValueError(f"Template {name} is outside of {self._directory}")
+        return path
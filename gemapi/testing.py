@@ -0,0 +1,87 @@
+import asyncio
+import itertools
+from dataclasses import dataclass
+from typing import Any
+
+from gemapi.applications import Application
+from gemapi.request import MAX_REQUEST_LINE_SIZE
+from gemapi.responses import StatusCode
+
+
+@dataclass(frozen=True)
+class TestResponse:
+    __test__ = False
+
+    status_code: StatusCode
+    meta: str
+    body: bytes
+
+    def text(self) -> str:
+        return self.body.decode("utf-8")
+
+
+class _MemoryTransport(asyncio.Transport):
+    # Collects what the application writes, sendfile is not supported so
+    # file responses fall back to regular writes
+    def __init__(self, peername: tuple[str, int]) -> None:
+        super().__init__({"peername": peername})
+        self.data = bytearray()
+        self._closing = False
+
+    def write(self, data: Any) -> None:
+        self.data += data
+
+    def is_closing(self) -> bool:
+        return self._closing
+
+    def close(self) -> None:
+        self._closing = True
+
+    def abort(self) -> None:
+        self._closing = True
+
+
+class TestClient:
+    # Runs requests through Application.stream_handler with in-memory
+    # streams: no TLS, sockets or server process, and requests can be run
+    # concurrently
+    __test__ = False
+
+    def __init__(
+        self,
+        application: Application,
+        hostname: str = "localhost",
+        client_host: str = "127.0.0.1",
+    ) -> None:
+        self._application = application
+        self._hostname = hostname
+        self._client_host = client_host
+        self._client_ports = itertools.count(1024)
+
+    async def request(self, url: str) -> TestResponse:
+        # Paths are requested on the client hostname
+        if url.startswith("/"):
+            url = f"gemini://{self._hostname}{url}"
+        return await self.send(url.encode("utf-8") + b"\r\n")
+
+    async def send(self, data: bytes) -> TestResponse:
+        # Sends a raw request line
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=MAX_REQUEST_LINE_SIZE)
+        reader.feed_data(data)
+        reader.feed_eof()
+        transport = _MemoryTransport((self._client_host, next(self._client_ports)))
+        protocol = asyncio.StreamReaderProtocol(reader)
+        writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+
+        await self._application.stream_handler(reader, writer)
+        return _parse_response(bytes(transport.data))
+
+
+def _parse_response(data: bytes) -> TestResponse:
+    header, separator, body = data.partition(b"\r\n")
+    if not separator:
+        raise ValueError(f"Invalid response {data!r}")
+
+    status_code, _, meta = header.decode("utf-8").partition(" ")
+    return TestResponse(StatusCode(int(status_code)), meta, body)
@@ -0,0 +1,177 @@
+import asyncio
+import datetime
+import multiprocessing
+import os
+import signal
+import time
+from multiprocessing.connection import wait
+from multiprocessing.process import BaseProcess
+from pathlib import Path
+from types import FrameType
+
+from loguru import logger
+
+from gemapi.applications import Application
+from gemapi.certificates import certificate_managers
+from gemapi.server import Server
+
+# Workers exiting before this delay are considered to be crash looping
+_MIN_WORKER_UPTIME = 1.0
+_RESTART_DELAY = 1.0
+# Workers are killed if they're still running this long after the drain
+_SHUTDOWN_TIMEOUT = 10.0
+
+
+def _run_worker(
+    application: Application,
+    index: int,
+    host: str,
+    port: int,
+    metrics_port: int | None,
+    profile_startup: bool,
+    drain_timeout: float,
+    trusted_client_certificates: str | Path | None,
+) -> None:
+    for s in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+        signal.signal(s, signal.SIG_DFL)
+
+    # Each worker serves its own metrics, on the next port of the range
+    if metrics_port is not None:
+        application.metrics.const_labels["worker"] = str(index)
+        metrics_port += index
+
+    asyncio.run(
+        Server(
+            application,
+            profile_startup=profile_startup,
+            drain_timeout=drain_timeout,
+            trusted_client_certificates=trusted_client_certificates,
+        ).run(
+            host,
+            port,
+            reuse_port=True,
+            manage_certificate=False,
+            metrics_port=metrics_port,
+        )
+    )
+
+
+class Supervisor:
+    def __init__(
+        self,
+        application: Application,
+        workers: int,
+        host: str = "localhost",
+        port: int = 1965,
+        metrics_port: int | None = None,
+        profile_startup: bool = False,
+        drain_timeout: float = 10.0,
+        trusted_client_certificates: str | Path | None = None,
+    ) -> None:
+        if workers < 1:
+            raise ValueError(f"Invalid number of workers {workers}")
+
+        self._application = application
+        self._workers_count = workers
+        self._host = host
+        self._port = port
+        self._metrics_port = metrics_port
+        self._profile_startup = profile_startup
+        self._drain_timeout = drain_timeout
+        self._trusted_client_certificates = trusted_client_certificates
+        self._context = multiprocessing.get_context("fork")
+        # Worker process -> (index, started_at)
+        self._workers: dict[BaseProcess, tuple[int, float]] = {}
+        self._stopping = False
+        self._renewal_requested = False
+
+    def run(self) -> None:
+        # Generate the certificates once so workers don't race to write them
+        managers = certificate_managers(self._host, self._application.hostnames)
+        for cm in managers.values():
+            cm.initialize()
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_renewal)
+
+        for index in range(self._workers_count):
+            self._spawn_worker(index)
+
+        renew_at = {
+            hostname: cm.certificate_renews_at() for hostname, cm in managers.items()
+        }
+        while not self._stopping:
+            wait([worker.sentinel for worker in self._workers], timeout=1.0)
+
+            now = datetime.datetime.now(datetime.timezone.utc)
+            if self._renewal_requested or now > min(renew_at.values()):
+                for hostname, cm in managers.items():
+                    if self._renewal_requested or now > renew_at[hostname]:
+                        cm.renew()
+                        renew_at[hostname] = cm.certificate_renews_at()
+                self._renewal_requested = False
+                # Workers load the new certificate without closing the socket
+                for worker in self._workers:
+                    if worker.pid and worker.is_alive():
+                        os.kill(worker.pid, signal.SIGHUP)
+
+            self._restart_dead_workers()
+
+        self._stop_workers(list(self._workers), signal.SIGTERM)
+        logger.info("Exiting")
+
+    def _handle_stop(self, signum: int, frame: FrameType | None) -> None:
+        logger.info(f"Caught signal={signum}")
+        self._stopping = True
+
+    def _handle_renewal(self, signum: int, frame: FrameType | None) -> None:
+        logger.info(f"Caught signal={signum}")
+        self._renewal_requested = True
+
+    def _spawn_worker(self, index: int) -> None:
+        worker = self._context.Process(
+            target=_run_worker,
+            args=(
+                self._application,
+                index,
+                self._host,
+                self._port,
+                self._metrics_port,
+                self._profile_startup,
+                self._drain_timeout,
+                self._trusted_client_certificates,
+            ),
+        )
+        worker.start()
+        self._workers[worker] = (index, time.monotonic())
+        logger.info(f"Started worker index={index} pid={worker.pid}")
+
+    def _restart_dead_workers(self) -> None:
+        for worker, (index, started_at) in list(self._workers.items()):
+            if worker.is_alive():
+                continue
+
+            del self._workers[worker]
+            logger.warning(
+                f"Worker pid={worker.pid} exited with exitcode={worker.exitcode}"
+            )
+            if time.monotonic() - started_at < _MIN_WORKER_UPTIME:
+                time.sleep(_RESTART_DELAY)
+
+            # The replacement takes over the index (and the metrics port)
+            if not self._stopping:
+                self._spawn_worker(index)
+
+    def _stop_workers(self, workers: list[BaseProcess], signum: int) -> None:
+        for worker in workers:
+            if worker.pid and worker.is_alive():
+                os.kill(worker.pid, signum)
+
+        deadline = time.monotonic() + self._drain_timeout + _SHUTDOWN_TIMEOUT
+        for worker in workers:
+            worker.join(max(0.0, deadline - time.monotonic()))
+            if worker.is_alive():
+                logger.warning(f"Killing worker pid={worker.pid}")
+                worker.kill()
+                worker.join()
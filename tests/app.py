@@ -1,13 +1,24 @@
+from pathlib import Path
+
 from gemapi.applications import Application
 from gemapi.applications import Input
 from gemapi.applications import Request
 from gemapi.responses import NotFoundError
 from gemapi.responses import Response
 from gemapi.responses import StatusCode
+from gemapi.responses import StreamingResponse
+from gemapi.templates import Templates
 
-app = Application()
+app = Application(
+    request_timeout=1.0,
+    templates=Templates(Path(__file__).parent / "templates"),
+)
 
 example_dot_com_router = app.router_for_hostname("example.com")
+wildcard_router = app.router_for_hostname("*.example.org")
+
+app.mount_static("/static", Path(__file__).parent / "static")
+app.add_metrics_route("/metrics")
 
 
 @app.route("/")
@@ -41,6 +52,42 @@ def search(req: Request, q: Input) -> Response:
     )
 
 
+@app.route("/stream")
+async def stream(req: Request) -> Response:
+    async def _body():
+        for i in range(3):
+            yield f"line {i}\n"
+
+    return StreamingResponse(
+        status_code=StatusCode.SUCCESS,
+        meta="text/gemini",
+        body=_body(),
+    )
+
+
+@app.route("/stream-sync")
+def stream_sync(req: Request) -> Response:
+    return StreamingResponse(
+        status_code=StatusCode.SUCCESS,
+        meta="text/plain",
+        body=(b"x" * 1024 for _ in range(1024)),
+    )
+
+
+@app.route("/bytes")
+async def bytes_body(req: Request) -> Response:
+    return Response(
+        status_code=StatusCode.SUCCESS,
+        meta="text/plain",
+        body=memoryview(b"raw bytes body"),
+    )
+
+
+@app.route("/template")
+def template(req: Request) -> Response:
+    return app.templates.response("list.gmi", {"title": "List", "items": ["a", "b"]})
+
+
 @example_dot_com_router.route("/test")
 def example_dot_com__test(req: Request) -> Response:
     return Response(
@@ -48,3 +95,12 @@ def example_dot_com__test(req: Request) -> Response:
         meta="text/gemini",
         body="example.com test",
     )
+
+
+@wildcard_router.route("/")
+def wildcard_index(req: Request) -> Response:
+    return Response(
+        status_code=StatusCode.SUCCESS,
+        meta="text/gemini",
+        body=req.parsed_url.netloc,
+    )
@@ -1,27 +1,50 @@
 import asyncio
 import multiprocessing
+import os
 import tempfile
 import time
 
+# ignition uses cryptography's serialization module without importing it, it
+# used to be imported as a side effect of importing gemapi
+import cryptography.hazmat.primitives.serialization  # noqa: F401
 import ignition  # type: ignore
 import pytest
 
+from gemapi.request import Request
+from gemapi.request import parse_request_line
 from gemapi.server import Server
 
 from .app import app
 
 
-def run_app():
-    asyncio.run(Server(app).run())
+def build_request(url: str) -> Request:
+    return Request(
+        parsed_url=parse_request_line(url.encode() + b"\r\n"),
+        client_host="127.0.0.1",
+        client_port=0,
+    )
+
+
+def run_app(directory):
+    # The certificates are generated in the working directory
+    os.chdir(directory)
+    asyncio.run(Server(app, handshake_timeout=1.0).run(metrics_port=9165))
 
 
 @pytest.fixture(scope="session")
-def test_application():
+def server_process(tmp_path_factory):
     with tempfile.NamedTemporaryFile() as tmp_file:
         ignition.set_default_hosts_file(tmp_file.name)
 
-        proc = multiprocessing.Process(target=run_app, args=())
+        proc = multiprocessing.Process(
+            target=run_app, args=(tmp_path_factory.mktemp("server"),)
+        )
         proc.start()
         time.sleep(1)
-        yield app
+        yield proc
         proc.terminate()
+
+
+@pytest.fixture(scope="session")
+def test_application(server_process):
+    yield app
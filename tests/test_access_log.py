@@ -0,0 +1,52 @@
+from gemapi.access_log import AccessLogger
+from gemapi.access_log import AccessLogRecord
+from gemapi.request import parse_request_line
+from gemapi.responses import StatusCode
+
+
+def _build_record(status_code: StatusCode) -> AccessLogRecord:
+    return AccessLogRecord(
+        client_host="127.0.0.1",
+        client_port=1234,
+        parsed_url=parse_request_line(b"gemini://localhost/hello\r\n"),
+        status_code=status_code,
+        meta="text/gemini",
+        duration=0.001,
+    )
+
+
+def test_access_logger__batches() -> None:
+    batches: list[list[str]] = []
+    access_logger = AccessLogger(sink=batches.append, batch_size=2)
+
+    for _ in range(3):
+        access_logger.log(_build_record(StatusCode.SUCCESS))
+    access_logger.close()
+
+    assert sum(len(batch) for batch in batches) == 3
+    assert all(len(batch) <= 2 for batch in batches)
+    assert batches[0][0] == (
+        "127.0.0.1:1234 - gemini://localhost/hello SUCCESS 20 text/gemini 1.00ms"
+    )
+
+
+def test_access_logger__sampling() -> None:
+    batches: list[list[str]] = []
+    access_logger = AccessLogger(sink=batches.append, success_sample_rate=0.0)
+
+    access_logger.log(_build_record(StatusCode.SUCCESS))
+    access_logger.log(_build_record(StatusCode.NOT_FOUND))
+    access_logger.close()
+
+    assert [line.split()[3] for batch in batches for line in batch] == ["NOT_FOUND"]
+
+
+def test_access_logger__drops_when_full() -> None:
+    access_logger = AccessLogger(sink=lambda lines: None, max_queue_size=1)
+    # Fill the queue before the writer thread is started
+    access_logger._queue.put_nowait(_build_record(StatusCode.SUCCESS))
+    access_logger._thread = object()  # type: ignore
+
+    access_logger.log(_build_record(StatusCode.SUCCESS))
+
+    assert access_logger.dropped == 1
@@ -1,9 +1,14 @@
+import os
+import signal
 import socket
+import ssl
+import time
 from contextlib import contextmanager
 from functools import wraps
 from unittest import mock
 
 import ignition  # type: ignore
+from cryptography import x509
 
 
 @contextmanager
@@ -33,6 +38,23 @@ def mock_dns(hostnames):
         yield
 
 
+@contextmanager
+def tls_connection(server_hostname: str | None = "localhost"):
+    ssl_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    ssl_ctx.check_hostname = False
+    ssl_ctx.verify_mode = ssl.CERT_NONE
+    with socket.create_connection(("localhost", 1965), timeout=5) as sock:
+        with ssl_ctx.wrap_socket(sock, server_hostname=server_hostname) as tls_sock:
+            yield tls_sock
+
+
+def read_all(sock: socket.socket) -> bytes:
+    data = b""
+    while chunk := sock.recv(4096):
+        data += chunk
+    return data
+
+
 def test_app(test_application):
     response = ignition.request("//localhost/")
 
@@ -84,3 +106,150 @@ def test_app_hostname_route(test_application):
 
     response = ignition.request("//localhost/test")
     assert response.status == "51"
+
+
+def _certificate_hostnames(server_hostname: str | None) -> set[str]:
+    with tls_connection(server_hostname) as sock:
+        der_cert = sock.getpeercert(binary_form=True)
+
+    cert = x509.load_der_x509_certificate(der_cert)
+    san_ext = cert.extensions.get_extension_for_class(x509.SubjectAlternativeName)
+    return set(san_ext.value.get_values_for_type(x509.DNSName))
+
+
+def test_app__sni_certificates(test_application):
+    assert _certificate_hostnames("localhost") == {"localhost"}
+    assert _certificate_hostnames(None) == {"localhost"}
+    assert _certificate_hostnames("unknown.com") == {"localhost"}
+    assert _certificate_hostnames("example.com") == {"example.com"}
+    assert _certificate_hostnames("a.example.org") == {"*.example.org"}
+
+
+def test_app_wildcard_hostname_route(test_application):
+    with mock_dns({"a.example.org"}):
+        response = ignition.request("//a.example.org/")
+
+    assert response.status == "20"
+    assert response.data() == "a.example.org"
+
+
+def test_app__streaming_response(test_application):
+    response = ignition.request("//localhost/stream")
+
+    assert response.status == "20"
+    assert response.data() == "line 0\nline 1\nline 2\n"
+
+
+def test_app__streaming_response__sync_iterator(test_application):
+    response = ignition.request("//localhost/stream-sync")
+
+    assert response.status == "20"
+    assert response.data() == "x" * 1024 * 1024
+
+
+def test_app__bytes_body(test_application):
+    response = ignition.request("//localhost/bytes")
+
+    assert response.status == "20"
+    assert response.data() == "raw bytes body"
+
+
+def test_app__template(test_application):
+    response = ignition.request("//localhost/template")
+
+    assert response.status == "20"
+    assert response.meta == "text/gemini"
+    assert response.data() == "# List\n* a\n* b\n"
+
+
+def test_app__static_files(test_application):
+    response = ignition.request("//localhost/static/")
+
+    assert response.status == "20"
+    assert response.meta == "text/gemini"
+    assert response.data() == "# Static index\n=> docs/ Docs\n"
+
+    response = ignition.request("//localhost/static/hello.txt")
+
+    assert response.status == "20"
+    assert response.meta == "text/plain"
+    assert response.data() == "hello\n"
+
+
+def test_app__static_files__directory_redirect(test_application):
+    response = ignition.request("//localhost/static/docs")
+
+    assert response.status == "31"
+    assert response.meta == "/static/docs/"
+
+
+def test_app__static_files__not_found(test_application):
+    response = ignition.request("//localhost/static/nope.gmi")
+
+    assert response.status == "51"
+
+
+def test_app__split_request_line(test_application):
+    with tls_connection() as sock:
+        sock.sendall(b"gemini://localhost/")
+        time.sleep(0.1)
+        sock.sendall(b"\r\n")
+
+        assert read_all(sock) == b"20 text/gemini\r\ntoto"
+
+
+def test_app__request_line_too_long(test_application):
+    with tls_connection() as sock:
+        sock.sendall(b"gemini://localhost/" + b"a" * 1024 + b"\r\n")
+
+        assert read_all(sock).startswith(b"59 ")
+
+
+def test_app__request_line_timeout(test_application):
+    with tls_connection() as sock:
+        sock.sendall(b"gemini://localhost/")
+        started_at = time.monotonic()
+
+        assert read_all(sock) == b""
+        assert time.monotonic() - started_at < 3
+
+
+def test_app__handshake_timeout(test_application):
+    with socket.create_connection(("localhost", 1965), timeout=5) as sock:
+        started_at = time.monotonic()
+
+        assert read_all(sock) == b""
+        assert time.monotonic() - started_at < 3
+
+
+def test_app__metrics_route(test_application):
+    ignition.request("//localhost/")
+    response = ignition.request("//localhost/metrics")
+
+    assert response.status == "20"
+    assert response.meta == "text/plain; version=0.0.4"
+    assert 'gemapi_handler_seconds_count{route="/"}' in response.data()
+    assert "gemapi_tls_handshake_seconds_count" in response.data()
+
+
+def test_app__metrics_port(test_application):
+    with socket.create_connection(("127.0.0.1", 9165), timeout=5) as sock:
+        sock.sendall(b"GET /metrics HTTP/1.0\r\n\r\n")
+        response = read_all(sock)
+
+    assert response.startswith(b"HTTP/1.0 200 OK\r\n")
+    assert b'gemapi_responses_total{router="default",status_class="2x"}' in response
+
+
+def test_app__certificate_rotation_on_sighup(test_application, server_process):
+    with tls_connection() as sock:
+        certificate = sock.getpeercert(binary_form=True)
+
+    os.kill(server_process.pid, signal.SIGHUP)
+    time.sleep(0.5)
+
+    with tls_connection() as sock:
+        assert sock.getpeercert(binary_form=True) != certificate
+        sock.sendall(b"gemini://localhost/\r\n")
+
+        assert read_all(sock) == b"20 text/gemini\r\ntoto"
@@ -0,0 +1,206 @@
+import asyncio
+import datetime
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from gemapi.applications import Application
+from gemapi.ratelimit import RateLimiter
+from gemapi.ratelimit import SlowDownError
+from gemapi.request import ClientCertificate
+from gemapi.request import Request
+from gemapi.responses import CertificateNotValidError
+from gemapi.responses import ClientCertificateRequiredError
+from gemapi.responses import NotFoundError
+from gemapi.responses import Response
+
+from .conftest import build_request
+
+
+def _pid_handler(req: Request) -> Response:
+    return Response(20, "text/plain", str(os.getpid()))
+
+
+@pytest.mark.asyncio
+async def test_application__sync_handlers_run_in_executor() -> None:
+    app = Application()
+
+    @app.route("/threaded")
+    def threaded(req: Request) -> Response:
+        assert app.executor_queue_depth == 1
+        return Response(20, "text/plain", threading.current_thread().name)
+
+    @app.route("/inline", run_in_executor=False)
+    def inline(req: Request) -> Response:
+        return Response(20, "text/plain", threading.current_thread().name)
+
+    resp = await app._process_request(build_request("gemini://localhost/threaded"))
+    assert isinstance(resp.body, str) and resp.body.startswith("gemapi-handler")
+    assert app.executor_queue_depth == 0
+
+    resp = await app._process_request(build_request("gemini://localhost/inline"))
+    assert resp.body == threading.current_thread().name
+
+
+@pytest.mark.asyncio
+async def test_application__process_pool_executor() -> None:
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        app = Application(executor=executor)
+        app.route("/pid")(_pid_handler)
+
+        resp = await app._process_request(build_request("gemini://localhost/pid"))
+
+    assert resp.body is not None and resp.body != str(os.getpid())
+
+
+@pytest.mark.asyncio
+async def test_application__route_rate_limiter() -> None:
+    app = Application()
+
+    @app.route("/limited", rate_limiter=RateLimiter(rate=0.1, burst=1))
+    async def limited(req: Request) -> Response:
+        return Response(20, "text/plain", "ok")
+
+    resp = await app._process_request(build_request("gemini://localhost/limited"))
+    assert resp.body == "ok"
+
+    with pytest.raises(SlowDownError):
+        await app._process_request(build_request("gemini://localhost/limited"))
+
+
+@pytest.mark.asyncio
+async def test_application__wildcard_hostname() -> None:
+    app = Application()
+    app.router_for_hostname("*.example.com").route("/")(
+        lambda req: Response(20, "text/plain", "wildcard")
+    )
+    app.router_for_hostname("www.example.com").route("/")(
+        lambda req: Response(20, "text/plain", "www")
+    )
+
+    for netloc, body in [
+        ("a.example.com", "wildcard"),
+        ("www.example.com", "www"),
+    ]:
+        resp = await app._process_request(build_request(f"gemini://{netloc}/"))
+        assert resp.body == body
+
+    # Only a single label is matched
+    with pytest.raises(NotFoundError):
+        await app._process_request(build_request("gemini://a.b.example.com/"))
+    with pytest.raises(NotFoundError):
+        await app._process_request(build_request("gemini://example.com/"))
+
+
+@pytest.mark.parametrize("hostname", ["*", "a.*.com", "*example.com", "*.*.com"])
+def test_application__invalid_wildcard_hostname(hostname: str) -> None:
+    with pytest.raises(ValueError):
+        Application().router_for_hostname(hostname)
+
+
+@pytest.mark.asyncio
+async def test_application__client_certificate_param() -> None:
+    app = Application()
+
+    @app.route("/account")
+    async def account(req: Request, identity: ClientCertificate) -> Response:
+        return Response(20, "text/plain", identity.fingerprint)
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    req = build_request("gemini://localhost/account")
+    with pytest.raises(ClientCertificateRequiredError):
+        await app._process_request(req)
+
+    req.client_certificate = ClientCertificate(
+        "abc", "CN=alice", now - datetime.timedelta(days=1)
+    )
+    with pytest.raises(CertificateNotValidError):
+        await app._process_request(req)
+
+    req.client_certificate = ClientCertificate(
+        "abc", "CN=alice", now + datetime.timedelta(days=1)
+    )
+    resp = await app._process_request(req)
+    assert resp.body == "abc"
+
+
+def test_application__client_certificate_param_with_cache() -> None:
+    app = Application()
+
+    with pytest.raises(ValueError):
+
+        @app.route("/account", cache_ttl=60)
+        async def account(req: Request, identity: ClientCertificate) -> Response:
+            return Response(20, "text/plain", identity.fingerprint)
+
+
+@pytest.mark.asyncio
+async def test_application__coalesce() -> None:
+    app = Application()
+    calls = []
+
+    @app.route("/expensive", coalesce=True)
+    async def expensive(req: Request) -> Response:
+        calls.append(req.query)
+        await asyncio.sleep(0.05)
+        if req.query == "missing":
+            raise NotFoundError("Missing")
+        return Response(20, "text/plain", req.query)
+
+    responses = await asyncio.gather(
+        *[
+            app._process_request(build_request(f"gemini://localhost/expensive?{q}"))
+            for q in ["a", "a", "a", "b"]
+        ]
+    )
+    assert [resp.as_bytes() for resp in responses] == [
+        b"20 text/plain\r\na",
+        b"20 text/plain\r\na",
+        b"20 text/plain\r\na",
+        b"20 text/plain\r\nb",
+    ]
+    assert calls == ["a", "b"]
+    assert app.coalesced_requests == 2
+
+    # Errors are raised in all the requests
+    results = await asyncio.gather(
+        *[
+            app._process_request(build_request("gemini://localhost/expensive?missing"))
+            for _ in range(3)
+        ],
+        return_exceptions=True,
+    )
+    assert all(isinstance(result, NotFoundError) for result in results)
+    assert calls == ["a", "b", "missing"]
+    assert app.coalesced_requests == 4
+
+    # Requests arriving after the execution run the handler again
+    await app._process_request(build_request("gemini://localhost/expensive?a"))
+    assert calls == ["a", "b", "missing", "a"]
+
+
+@pytest.mark.asyncio
+async def test_application__coalesce_cancelled() -> None:
+    app = Application()
+    calls = 0
+
+    @app.route("/expensive", coalesce=True)
+    async def expensive(req: Request) -> Response:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return Response(20, "text/plain", "ok")
+
+    req = build_request("gemini://localhost/expensive")
+    first = asyncio.create_task(app._process_request(req))
+    second = asyncio.create_task(app._process_request(req))
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    # The waiting request runs the handler itself
+    resp = await second
+    assert resp.as_bytes() == b"20 text/plain\r\nok"
+    assert calls == 2
+    assert app.coalesced_requests == 0
@@ -0,0 +1,118 @@
+from pathlib import Path
+
+import pytest
+
+from gemapi.applications import Application
+from gemapi.cache import ResponseCache
+from gemapi.request import Input
+from gemapi.request import Request
+from gemapi.responses import NotFoundError
+from gemapi.responses import Response
+from gemapi.responses import StatusCode
+from gemapi.responses import StreamingResponse
+from gemapi.staticfiles import FileResponse
+
+from .conftest import build_request
+
+
+def test_response_cache__lru_eviction() -> None:
+    cache = ResponseCache(max_entries=2)
+    for path in ["/a", "/b"]:
+        cache.put(("localhost", path, ""), Response(20, "text/gemini", path), 60)
+
+    assert cache.get(("localhost", "/a", "")) is not None
+    cache.put(("localhost", "/c", ""), Response(20, "text/gemini", "/c"), 60)
+
+    assert len(cache) == 2
+    assert cache.evictions == 1
+    assert cache.get(("localhost", "/b", "")) is None
+    assert cache.get(("localhost", "/a", "")) is not None
+
+
+def test_response_cache__max_bytes() -> None:
+    cache = ResponseCache(max_bytes=40)
+    cache.put(("localhost", "/a", ""), Response(20, "text/gemini", "a" * 10), 60)
+    cache.put(("localhost", "/b", ""), Response(20, "text/gemini", "b" * 10), 60)
+
+    assert len(cache) == 1
+    assert cache.size <= 40
+
+    resp = cache.put(("localhost", "/c", ""), Response(20, "text/gemini", "c" * 50), 60)
+    assert resp.as_bytes() == b"20 text/gemini\r\n" + b"c" * 50
+    assert cache.get(("localhost", "/c", "")) is None
+
+
+def test_response_cache__unbuffered_responses(tmp_path: Path) -> None:
+    cache = ResponseCache()
+    (tmp_path / "a.gmi").write_text("a")
+    responses = [
+        StreamingResponse(20, "text/gemini", [b"a"]),
+        FileResponse(tmp_path / "a.gmi", 1, "text/gemini"),
+    ]
+
+    # Streamed responses are sent as is, and never cached
+    for resp in responses:
+        assert not resp.buffered
+        assert cache.put(("localhost", "/a", ""), resp, 60) is resp
+    assert len(cache) == 0
+    assert responses[1].as_bytes() == b"20 text/gemini\r\na"
+
+
+def test_response_cache__ttl() -> None:
+    cache = ResponseCache()
+    cache.put(("localhost", "/a", ""), Response(20, "text/gemini", "a"), 0)
+
+    assert cache.get(("localhost", "/a", "")) is None
+    assert len(cache) == 0
+
+
+def test_response_cache__status_codes() -> None:
+    cache = ResponseCache()
+    cache.put(("localhost", "/", ""), Response(10, "q"), 60)
+    cache.put(("localhost", "/", "a"), Response(51, "Not found"), 60)
+
+    assert len(cache) == 0
+
+    cache = ResponseCache(cacheable_status_codes=frozenset({StatusCode.NOT_FOUND}))
+    cache.put(("localhost", "/", "a"), Response(51, "Not found"), 60)
+
+    assert len(cache) == 1
+
+
+@pytest.mark.asyncio
+async def test_application__cache_ttl() -> None:
+    app = Application()
+    calls = []
+
+    @app.route("/feed", cache_ttl=60)
+    async def feed(req: Request) -> Response:
+        calls.append(req)
+        return Response(20, "text/gemini", f"call {len(calls)}")
+
+    @app.route("/search", cache_ttl=60)
+    async def search(req: Request, q: Input) -> Response:
+        calls.append(req)
+        return Response(20, "text/gemini", q.get_value())
+
+    @app.route("/missing", cache_ttl=60)
+    async def missing(req: Request) -> Response:
+        calls.append(req)
+        raise NotFoundError("nope")
+
+    for _ in range(2):
+        resp = await app._process_request(build_request("gemini://localhost/feed"))
+        assert resp.as_bytes() == b"20 text/gemini\r\ncall 1"
+
+    for _ in range(2):
+        resp = await app._process_request(build_request("gemini://localhost/search"))
+        assert resp.status_code == StatusCode.INPUT
+
+    resp = await app._process_request(build_request("gemini://localhost/search?a"))
+    assert resp.as_bytes() == b"20 text/gemini\r\na"
+
+    for _ in range(2):
+        with pytest.raises(NotFoundError):
+            await app._process_request(build_request("gemini://localhost/missing"))
+
+    assert len(calls) == 4
+    assert app.response_cache.hits == 1
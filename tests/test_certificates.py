@@ -0,0 +1,88 @@
+import hashlib
+import ssl
+import subprocess
+import sys
+from pathlib import Path
+
+from gemapi.certificates import CertificateManager
+from gemapi.certificates import certificate_managers
+from gemapi.certificates import load_client_certificate
+
+
+def test_certificate_manager__info_sidecar(tmp_path: Path) -> None:
+    cm = CertificateManager(["localhost"], directory=tmp_path)
+    cm.initialize()
+
+    assert cm.infofile.exists()
+    expires_at = cm.certificate_expires_at()
+
+    # A fresh manager reads the sidecar without importing cryptography
+    code = (
+        "import sys; from pathlib import Path;"
+        "from gemapi.certificates import CertificateManager;"
+        f"cm = CertificateManager(['localhost'], directory=Path({str(tmp_path)!r}));"
+        "cm.initialize();"
+        "print(cm.certificate_expires_at().isoformat());"
+        "print('cryptography' in sys.modules)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        check=True,
+        cwd=Path(__file__).parent.parent,
+        text=True,
+    ).stdout.splitlines()
+    assert output == [expires_at.isoformat(), "False"]
+
+
+def test_certificate_manager__stale_sidecar(tmp_path: Path) -> None:
+    cm = CertificateManager(["localhost"], directory=tmp_path)
+    cm.initialize()
+    cm.infofile.write_text("{}")
+
+    # The certificate is parsed again and the sidecar is refreshed
+    other_cm = CertificateManager(["localhost"], directory=tmp_path)
+    assert other_cm.certificate_expires_at() == cm.certificate_expires_at()
+    assert "digest" in cm.infofile.read_text()
+
+
+def test_certificate_manager__hostnames_mismatch(tmp_path: Path) -> None:
+    cm = CertificateManager(["localhost"], directory=tmp_path)
+    cm.initialize()
+    certificate = cm.certfile.read_bytes()
+
+    other_cm = CertificateManager(["example.com"], directory=tmp_path)
+    other_cm.initialize()
+
+    assert other_cm.certfile.read_bytes() != certificate
+
+
+def test_certificate_managers(tmp_path: Path) -> None:
+    managers = certificate_managers(
+        "localhost", ["localhost", "example.com", "*.example.org"], tmp_path
+    )
+    for cm in managers.values():
+        cm.initialize()
+
+    assert list(managers) == ["localhost", "example.com", "*.example.org"]
+    assert managers["localhost"].certfile == tmp_path / "cert.pem"
+    assert (
+        managers["*.example.org"].certfile
+        == tmp_path / "_wildcard.example.org.cert.pem"
+    )
+    assert managers["*.example.org"].certificate_expires_at()
+
+
+def test_load_client_certificate(tmp_path: Path) -> None:
+    cm = CertificateManager(["alice"], directory=tmp_path)
+    cm.initialize()
+    der_cert = ssl.PEM_cert_to_DER_cert(cm.certfile.read_text())
+
+    client_certificate = load_client_certificate(der_cert)
+
+    assert client_certificate.fingerprint == hashlib.sha256(der_cert).hexdigest()
+    assert client_certificate.subject == "CN=alice"
+    assert client_certificate.expires_at == cm.certificate_expires_at()
+    assert not client_certificate.is_expired()
+    # Returning clients are not parsed again
+    assert load_client_certificate(bytes(der_cert)) is client_certificate
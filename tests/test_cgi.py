@@ -0,0 +1,194 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from gemapi.applications import Application
+from gemapi.cgi import CGIHandler
+from gemapi.middleware import Middleware
+from gemapi.request import Request
+from gemapi.responses import Response
+from gemapi.responses import StatusCode
+from gemapi.testing import TestClient
+
+from .conftest import build_request
+
+_SCRIPT = """
+import os, sys, time
+query = os.environ["QUERY_STRING"]
+if query == "fail":
+    sys.exit(1)
+if query == "slow":
+    time.sleep(0.3)
+if query == "missing":
+    sys.stdout.write("51 Missing\\r\\n")
+    sys.exit(0)
+sys.stdout.write("20 text/gemini\\r\\n")
+sys.stdout.write(f"{os.environ['PATH_INFO']} {query}\\n")
+"""
+
+_WORKER = """
+import os, time
+from gemapi.cgi import run_worker
+
+def handler(env):
+    if env["QUERY_STRING"] == "crash":
+        raise SystemExit(1)
+    if env["QUERY_STRING"] == "slow":
+        time.sleep(0.3)
+    yield "20 text/gemini\\r\\n"
+    yield f"{os.getpid()} {env['QUERY_STRING']}"
+
+run_worker(handler)
+"""
+
+
+class _ReplaceResponse(Middleware):
+    def after(self, req: Request, resp: Response) -> Response:
+        return Response(resp.status_code, resp.meta + "; replaced")
+
+
+def _build_client(
+    tmp_path: Path,
+    source: str,
+    middlewares: list[Middleware] | None = None,
+    **kwargs,
+) -> tuple[TestClient, CGIHandler]:
+    script = tmp_path / "script.py"
+    script.write_text(source)
+    app = Application()
+    for middleware in middlewares or []:
+        app.add_middleware(middleware)
+    cgi_handler = CGIHandler(
+        [sys.executable, str(script)],
+        env={"PYTHONPATH": str(Path(__file__).parent.parent)},
+        **kwargs,
+    )
+    app.route("/cgi")(cgi_handler)
+    return TestClient(app), cgi_handler
+
+
+@pytest.mark.asyncio
+async def test_cgi_handler(tmp_path: Path) -> None:
+    client, cgi_handler = _build_client(tmp_path, _SCRIPT, timeout=0.2)
+
+    resp = await client.request("/cgi?hello")
+    assert resp.status_code == StatusCode.SUCCESS
+    assert resp.meta == "text/gemini"
+    assert resp.text() == "/cgi hello\n"
+
+    resp = await client.request("/cgi?missing")
+    assert resp.status_code == StatusCode.NOT_FOUND
+    assert resp.meta == "Missing"
+
+    for query in ["fail", "slow"]:
+        resp = await client.request(f"/cgi?{query}")
+        assert resp.status_code == StatusCode.CGI_ERROR
+
+    await cgi_handler.aclose()
+
+
+@pytest.mark.asyncio
+async def test_cgi_handler__max_concurrency(tmp_path: Path) -> None:
+    client, cgi_handler = _build_client(tmp_path, _SCRIPT, max_concurrency=1)
+
+    started_at = time.monotonic()
+    responses = await asyncio.gather(*[client.request("/cgi?slow") for _ in range(3)])
+
+    assert [resp.text() for resp in responses] == ["/cgi slow\n"] * 3
+    assert time.monotonic() - started_at >= 0.9
+    await cgi_handler.aclose()
+
+
+@pytest.mark.asyncio
+async def test_cgi_handler__workers(tmp_path: Path) -> None:
+    client, cgi_handler = _build_client(tmp_path, _WORKER, workers=1, timeout=0.2)
+
+    resp = await client.request("/cgi?a")
+    assert resp.status_code == StatusCode.SUCCESS
+    pid, query = resp.text().split()
+    assert query == "a"
+
+    # The worker is reused
+    resp = await client.request("/cgi?b")
+    assert resp.text() == f"{pid} b"
+
+    # Crashed and timed out workers are replaced
+    for query in ["crash", "slow"]:
+        resp = await client.request(f"/cgi?{query}")
+        assert resp.status_code == StatusCode.CGI_ERROR
+
+        resp = await client.request("/cgi?c")
+        new_pid, _ = resp.text().split()
+        assert new_pid != pid
+        pid = new_pid
+
+    await cgi_handler.aclose()
+
+
+@pytest.mark.asyncio
+async def test_cgi_handler__start(tmp_path: Path) -> None:
+    script = tmp_path / "script.py"
+    script.write_text("import time\ntime.sleep(0.5)\n" + _WORKER)
+    app = Application()
+    cgi_handler = CGIHandler(
+        [sys.executable, str(script)],
+        env={"PYTHONPATH": str(Path(__file__).parent.parent)},
+        workers=3,
+        timeout=0.2,
+    )
+    app.route("/cgi")(cgi_handler)
+    app.add_startup_hook(cgi_handler.start)
+
+    # The workers are started concurrently, before the first request
+    started_at = time.monotonic()
+    await app.startup()
+    assert time.monotonic() - started_at < 1.4
+    assert cgi_handler._idle_workers.qsize() == 3
+
+    resp = await TestClient(app).request("/cgi?a")
+    assert resp.status_code == StatusCode.SUCCESS
+
+    await cgi_handler.aclose()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "source,kwargs",
+    [(_SCRIPT, {"max_concurrency": 2}), (_WORKER, {"workers": 2})],
+)
+async def test_cgi_handler__discarded_response(
+    tmp_path: Path,
+    source: str,
+    kwargs: dict,
+) -> None:
+    client, cgi_handler = _build_client(
+        tmp_path, source, middlewares=[_ReplaceResponse()], timeout=5, **kwargs
+    )
+
+    # The script (or worker) is released even if its response is never written
+    for _ in range(4):
+        resp = await asyncio.wait_for(client.request("/cgi?a"), 10)
+        assert resp.status_code == StatusCode.SUCCESS
+        assert resp.meta == "text/gemini; replaced"
+
+    await cgi_handler.aclose()
+
+
+@pytest.mark.asyncio
+async def test_cgi_handler__concurrency_limit_timeout(tmp_path: Path) -> None:
+    client, cgi_handler = _build_client(
+        tmp_path, _SCRIPT, max_concurrency=1, timeout=0.2
+    )
+
+    # The slot is held by a response that is not written yet
+    held_resp = await cgi_handler(build_request("gemini://localhost/cgi?a"))
+    resp = await asyncio.wait_for(client.request("/cgi?a"), 5)
+    assert resp.status_code == StatusCode.CGI_ERROR
+
+    await held_resp.aclose()
+    resp = await client.request("/cgi?a")
+    assert resp.status_code == StatusCode.SUCCESS
+    await cgi_handler.aclose()
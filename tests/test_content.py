@@ -0,0 +1,132 @@
+import asyncio
+import os
+from pathlib import Path
+from xml.etree import ElementTree
+
+import pytest
+
+from gemapi.applications import Application
+from gemapi.content import ContentIndex
+from gemapi.responses import StatusCode
+from gemapi.testing import TestClient
+
+_ATOM = "{http://www.w3.org/2005/Atom}"
+
+
+def _write_posts(directory: Path) -> None:
+    (directory / "2022-08-01-hello.gmi").write_text("# Hello world\n\nFirst post")
+    (directory / "2022-09-12-untitled.gmi").write_text("No heading")
+    (directory / "drafts").mkdir()
+    (directory / "drafts" / "idea.gmi").write_text("# 2022-10-01 An idea & more")
+    (directory / "index.gmi").write_text("# Custom index")
+    (directory / "about me.gmi").write_text("# About me")
+    (directory / "image.png").write_bytes(b"")
+
+
+def test_content_index(tmp_path: Path) -> None:
+    _write_posts(tmp_path)
+
+    content_index = ContentIndex(
+        "/gemlog", tmp_path, "My gemlog", "gemini://example.com"
+    )
+
+    _, _, feed_data = content_index.get_response("/gemlog/atom.xml").data.partition(
+        b"\r\n"
+    )
+    feed = ElementTree.fromstring(feed_data)
+    # The title is used when there's no author
+    assert feed.findtext(f"{_ATOM}author/{_ATOM}name") == "My gemlog"
+    assert [
+        (entry.path, str(entry.date), entry.title) for entry in content_index.entries
+    ] == [
+        ("drafts/idea.gmi", "2022-10-01", "An idea & more"),
+        ("2022-09-12-untitled.gmi", "2022-09-12", "untitled"),
+        ("2022-08-01-hello.gmi", "2022-08-01", "Hello world"),
+        ("about me.gmi", "None", "About me"),
+    ]
+    assert content_index.get_response("/gemlog/").as_bytes() == (
+        b"20 text/gemini\r\n"
+        b"# My gemlog\n\n"
+        b"=> drafts/idea.gmi 2022-10-01 - An idea & more\n"
+        b"=> 2022-09-12-untitled.gmi 2022-09-12 - untitled\n"
+        b"=> 2022-08-01-hello.gmi 2022-08-01 - Hello world\n"
+        b"=> about%20me.gmi About me\n"
+        b"\n"
+        b"=> atom.xml Atom feed\n"
+    )
+
+
+def test_content_index__incremental_scan(tmp_path: Path) -> None:
+    _write_posts(tmp_path)
+    content_index = ContentIndex("/", tmp_path, "My gemlog", "gemini://example.com")
+    assert content_index.parsed_files == 4
+    index_response = content_index.get_response("/")
+
+    # Nothing changed, nothing is parsed or rendered again
+    assert content_index.scan() == 0
+    assert content_index.parsed_files == 4
+    assert content_index.get_response("/") is index_response
+
+    post = tmp_path / "2022-08-01-hello.gmi"
+    post.write_text("# Hello again")
+    os.utime(post, ns=(0, 10**9))
+    (tmp_path / "2022-09-12-untitled.gmi").unlink()
+    (tmp_path / "2022-10-20-new.gmi").write_text("# New")
+
+    assert content_index.scan() == 3
+    assert content_index.parsed_files == 6
+    assert [entry.title for entry in content_index.entries] == [
+        "New",
+        "An idea & more",
+        "Hello again",
+        "About me",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_mount_content_index(tmp_path: Path) -> None:
+    _write_posts(tmp_path)
+    app = Application()
+    content_index = app.mount_content_index(
+        "/gemlog",
+        tmp_path,
+        "My gemlog",
+        "gemini://example.com",
+        poll_interval=0,
+        author="Alice & Bob",
+    )
+    client = TestClient(app)
+
+    resp = await client.request("/gemlog/")
+    assert resp.status_code == StatusCode.SUCCESS
+    assert resp.text().startswith("# My gemlog\n")
+
+    # The posts are served from the directory
+    resp = await client.request("/gemlog/2022-08-01-hello.gmi")
+    assert resp.text() == "# Hello world\n\nFirst post"
+
+    # The links of the index are percent-encoded
+    resp = await client.request("/gemlog/about%20me.gmi")
+    assert resp.text() == "# About me"
+
+    resp = await client.request("/gemlog/atom.xml")
+    assert resp.meta == "application/atom+xml"
+    feed = ElementTree.fromstring(resp.body)
+    assert feed.findtext(f"{_ATOM}title") == "My gemlog"
+    assert feed.findtext(f"{_ATOM}author/{_ATOM}name") == "Alice & Bob"
+    entries = feed.findall(f"{_ATOM}entry")
+    assert [entry.findtext(f"{_ATOM}id") for entry in entries] == [
+        "gemini://example.com/gemlog/drafts/idea.gmi",
+        "gemini://example.com/gemlog/2022-09-12-untitled.gmi",
+        "gemini://example.com/gemlog/2022-08-01-hello.gmi",
+        "gemini://example.com/gemlog/about%20me.gmi",
+    ]
+    assert entries[0].findtext(f"{_ATOM}published") == "2022-10-01T00:00:00+00:00"
+
+    # New posts show up after a background scan
+    (tmp_path / "2022-10-20-new.gmi").write_text("# New")
+    await client.request("/gemlog/")
+    await asyncio.sleep(0.1)
+    resp = await client.request("/gemlog/")
+    assert "=> 2022-10-20-new.gmi 2022-10-20 - New\n" in resp.text()
+    assert content_index.parsed_files == 5
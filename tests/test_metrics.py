@@ -0,0 +1,63 @@
+from gemapi.metrics import MetricsRegistry
+
+
+def test_metrics_registry__render() -> None:
+    registry = MetricsRegistry()
+    counter = registry.counter("requests_total", "Requests.", ("status_class",))
+    gauge = registry.gauge("in_flight", "In flight.")
+    histogram = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    registry.callback("hits_total", "Hits.", "counter", lambda: 3)
+
+    counter.inc("2x")
+    counter.inc("2x")
+    counter.inc('5"x')
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    assert registry.counter("requests_total", "Requests.") is counter
+    assert histogram.count() == 3
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requests.",
+        "# TYPE requests_total counter",
+        'requests_total{status_class="2x"} 2',
+        'requests_total{status_class="5\\"x"} 1',
+        "# HELP in_flight In flight.",
+        "# TYPE in_flight gauge",
+        "in_flight 1",
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="0.1"} 1',
+        'latency_seconds_bucket{le="1.0"} 2',
+        'latency_seconds_bucket{le="+Inf"} 3',
+        "latency_seconds_sum 5.55",
+        "latency_seconds_count 3",
+        "# HELP hits_total Hits.",
+        "# TYPE hits_total counter",
+        "hits_total 3",
+    ]
+
+
+def test_metrics_registry__const_labels() -> None:
+    registry = MetricsRegistry()
+    registry.const_labels["worker"] = "1"
+    counter = registry.counter("requests_total", "Requests.", ("status_class",))
+    histogram = registry.histogram("latency_seconds", "Latency.", buckets=(0.1,))
+    registry.callback("hits_total", "Hits.", "counter", lambda: 3)
+
+    counter.inc("2x")
+    histogram.observe(0.05)
+
+    assert [
+        line for line in registry.render().splitlines() if not line.startswith("#")
+    ] == [
+        'requests_total{worker="1",status_class="2x"} 1',
+        'latency_seconds_bucket{worker="1",le="0.1"} 1',
+        'latency_seconds_bucket{worker="1",le="+Inf"} 1',
+        'latency_seconds_sum{worker="1"} 0.05',
+        'latency_seconds_count{worker="1"} 1',
+        'hits_total{worker="1"} 3',
+    ]
@@ -0,0 +1,175 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from gemapi.applications import Application
+from gemapi.middleware import Middleware
+from gemapi.request import Request
+from gemapi.responses import NotFoundError
+from gemapi.responses import Response
+from gemapi.responses import StatusCode
+
+from .conftest import build_request
+
+
+class _Recorder(Middleware):
+    def __init__(self, name: str, calls: list[str]) -> None:
+        self.name = name
+        self.calls = calls
+
+    def before(self, req: Request) -> None:
+        self.calls.append(f"{self.name}.before")
+
+    async def after(self, req: Request, resp: Response) -> Response:
+        self.calls.append(f"{self.name}.after")
+        return resp
+
+
+class _Auth(Middleware):
+    async def before(self, req: Request) -> Response | None:
+        if req.query != "secret":
+            return Response(StatusCode.CERTIFICATE_NOT_AUTHORISED, "Not authorised")
+        return None
+
+
+class _Meta(Middleware):
+    def after(self, req: Request, resp: Response) -> Response:
+        resp.meta += "; lang=en"
+        return resp
+
+
+def _build_app(calls: list[str]) -> Application:
+    app = Application()
+
+    @app.route("/")
+    async def index(req: Request) -> Response:
+        calls.append("handler")
+        return Response(StatusCode.SUCCESS, "text/gemini", "# Hello")
+
+    @app.route("/missing")
+    async def missing(req: Request) -> Response:
+        raise NotFoundError("Missing")
+
+    return app
+
+
+@pytest.mark.asyncio
+async def test_middleware__order() -> None:
+    calls: list[str] = []
+    app = _build_app(calls)
+    app.add_middleware(_Recorder("a", calls))
+    app.add_middleware(_Recorder("b", calls))
+
+    resp = await app._process_request(build_request("gemini://localhost/"))
+
+    assert resp.status_code == StatusCode.SUCCESS
+    assert calls == ["a.before", "b.before", "handler", "b.after", "a.after"]
+
+
+@pytest.mark.asyncio
+async def test_middleware__before_short_circuits() -> None:
+    calls: list[str] = []
+    app = _build_app(calls)
+    app.add_middleware(_Auth())
+
+    resp = await app._process_request(build_request("gemini://localhost/"))
+    assert resp.status_code == StatusCode.CERTIFICATE_NOT_AUTHORISED
+    assert calls == []
+
+    resp = await app._process_request(build_request("gemini://localhost/?secret"))
+    assert resp.status_code == StatusCode.SUCCESS
+    assert calls == ["handler"]
+
+
+@pytest.mark.asyncio
+async def test_middleware__after_sees_errors() -> None:
+    app = _build_app([])
+    app.add_middleware(_Meta())
+
+    resp = await app._process_request(build_request("gemini://localhost/missing"))
+
+    assert resp.status_code == StatusCode.NOT_FOUND
+    assert resp.meta == "Missing; lang=en"
+
+
+@pytest.mark.asyncio
+async def test_middleware__composed_once_per_route() -> None:
+    app = _build_app([])
+    app.add_middleware(_Meta())
+
+    await app._process_request(build_request("gemini://localhost/"))
+    pipelines = dict(app._pipelines)
+    await app._process_request(build_request("gemini://localhost/"))
+    assert app._pipelines == pipelines
+
+    # Adding a middleware recomposes the pipelines
+    app.add_middleware(_Meta())
+    resp = await app._process_request(build_request("gemini://localhost/"))
+    assert resp.meta == "text/gemini; lang=en; lang=en"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("route_kwargs", [{"cache_ttl": 60}, {"coalesce": True}])
+async def test_middleware__shared_responses(route_kwargs: dict) -> None:
+    calls: list[str] = []
+    app = Application()
+    app.add_middleware(_Meta())
+
+    @app.route("/shared", **route_kwargs)
+    async def shared(req: Request) -> Response:
+        calls.append("handler")
+        await asyncio.sleep(0.1)
+        return Response(StatusCode.SUCCESS, "text/gemini", "# Shared")
+
+    # The concurrent requests share an execution when coalesced, the next
+    # ones are cache hits when cached
+    responses = await asyncio.gather(
+        *(
+            app._process_request(build_request("gemini://localhost/shared"))
+            for _ in range(3)
+        )
+    )
+    for _ in range(2):
+        responses.append(
+            await app._process_request(build_request("gemini://localhost/shared"))
+        )
+    assert len(calls) == 3
+
+    # Each request gets its own copy of the response modified by the hook
+    for resp in responses:
+        assert resp.meta == "text/gemini; lang=en"
+        assert resp.as_bytes() == b"20 text/gemini; lang=en\r\n# Shared"
+
+
+@pytest.mark.asyncio
+async def test_middleware__mounts(tmp_path: Path) -> None:
+    (tmp_path / "post.gmi").write_text("# Post")
+    app = _build_app([])
+    app.mount_static("/static", tmp_path)
+    app.mount_content_index("/gemlog", tmp_path, "Gemlog", "gemini://localhost")
+    app.add_middleware(_Auth())
+
+    # The mounts and the not found paths are protected like the routes
+    for path in ["/static/post.gmi", "/gemlog/", "/gemlog/post.gmi", "/nope"]:
+        resp = await app._process_request(build_request(f"gemini://localhost{path}"))
+        assert resp.status_code == StatusCode.CERTIFICATE_NOT_AUTHORISED
+
+    resp = await app._process_request(
+        build_request("gemini://localhost/static/post.gmi?secret")
+    )
+    assert resp.status_code == StatusCode.SUCCESS
+    resp = await app._process_request(
+        build_request("gemini://localhost/gemlog/?secret")
+    )
+    assert resp.status_code == StatusCode.SUCCESS
+    with pytest.raises(NotFoundError):
+        await app._process_request(build_request("gemini://localhost/nope?secret"))
+
+
+def test_middleware__without_hooks() -> None:
+    app = _build_app([])
+    app.add_middleware(Middleware())
+
+    with pytest.raises(ValueError):
+        app._get_pipeline(app._default_router._routes[0])
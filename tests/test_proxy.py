@@ -0,0 +1,158 @@
+import asyncio
+import multiprocessing
+import os
+import socket
+import time
+from pathlib import Path
+
+import pytest
+
+from gemapi.applications import Application
+from gemapi.middleware import Middleware
+from gemapi.request import Request
+from gemapi.responses import NotFoundError
+from gemapi.responses import Response
+from gemapi.responses import StatusCode
+from gemapi.responses import StreamingResponse
+from gemapi.server import Server
+from gemapi.testing import TestClient
+
+_UPSTREAM_PORT = 19662
+
+upstream_app = Application()
+
+
+@upstream_app.route("/")
+async def index(req: Request) -> Response:
+    return Response(20, "text/gemini; lang=en", f"# Upstream {req.query}")
+
+
+@upstream_app.route("/big")
+async def big(req: Request) -> Response:
+    return StreamingResponse(20, "text/plain", (b"x" * 1024 for _ in range(1024)))
+
+
+@upstream_app.route("/slow")
+async def slow(req: Request) -> Response:
+    await asyncio.sleep(0.2)
+    return Response(20, "text/plain", "slow")
+
+
+@upstream_app.route("/missing")
+async def missing(req: Request) -> Response:
+    raise NotFoundError("Nope")
+
+
+def _run_upstream(directory: Path) -> None:
+    os.chdir(directory)
+    asyncio.run(Server(upstream_app).run(port=_UPSTREAM_PORT))
+
+
+@pytest.fixture(scope="module")
+def upstream(tmp_path_factory):
+    proc = multiprocessing.get_context("fork").Process(
+        target=_run_upstream, args=(tmp_path_factory.mktemp("upstream"),)
+    )
+    proc.start()
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("localhost", _UPSTREAM_PORT)).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+
+    yield f"gemini://localhost:{_UPSTREAM_PORT}"
+    proc.terminate()
+    proc.join(5)
+
+
+@pytest.mark.asyncio
+async def test_proxy(upstream: str) -> None:
+    app = Application()
+    proxy = app.mount_proxy("/capsule", upstream)
+    client = TestClient(app)
+
+    resp = await client.request("/capsule?q")
+    assert resp.status_code == StatusCode.SUCCESS
+    assert resp.meta == "text/gemini; lang=en"
+    assert resp.text() == "# Upstream q"
+
+    resp = await client.request("/capsule/big")
+    assert resp.body == b"x" * 1024 * 1024
+
+    resp = await client.request("/capsule/missing")
+    assert resp.status_code == StatusCode.NOT_FOUND
+    assert resp.meta == "Nope"
+
+    # The TLS sessions are resumed after the first connection
+    assert proxy.upstream.connections == 3
+    assert proxy.upstream.resumed_sessions == 2
+
+
+@pytest.mark.asyncio
+async def test_proxy__cache(upstream: str) -> None:
+    app = Application()
+    proxy = app.mount_proxy("/", upstream, cache_ttl=60)
+    client = TestClient(app)
+
+    for _ in range(3):
+        resp = await client.request("/")
+        assert resp.text() == "# Upstream "
+
+    assert proxy.upstream.connections == 1
+    assert app.response_cache.hits == 2
+
+
+@pytest.mark.asyncio
+async def test_proxy__max_connections(upstream: str) -> None:
+    app = Application()
+    app.mount_proxy("/", upstream, max_connections=1)
+    client = TestClient(app)
+
+    started_at = time.monotonic()
+    responses = await asyncio.gather(*[client.request("/slow") for _ in range(3)])
+
+    assert [resp.text() for resp in responses] == ["slow"] * 3
+    assert time.monotonic() - started_at >= 0.6
+
+
+@pytest.mark.asyncio
+async def test_proxy__upstream_failure() -> None:
+    app = Application()
+    app.mount_proxy("/", "gemini://localhost:1")
+
+    resp = await TestClient(app).request("/")
+
+    assert resp.status_code == StatusCode.PROXY_ERROR
+
+
+def test_proxy__invalid_upstream_url() -> None:
+    with pytest.raises(ValueError):
+        Application().mount_proxy("/", "https://example.com")
+
+
+@pytest.mark.asyncio
+async def test_proxy__discarded_response(upstream: str) -> None:
+    class _ReplaceResponse(Middleware):
+        def after(self, req: Request, resp: Response) -> Response:
+            return Response(resp.status_code, resp.meta)
+
+    app = Application()
+    app.add_middleware(_ReplaceResponse())
+    app.mount_proxy("/", upstream, max_connections=1, timeout=1)
+    client = TestClient(app)
+
+    # The upstream connection is released even if the body is never written
+    for _ in range(2):
+        resp = await asyncio.wait_for(client.request("/big"), 5)
+        assert resp.status_code == StatusCode.SUCCESS
+
+
+def test_proxy__conflicting_upstream_settings() -> None:
+    app = Application()
+    app.mount_proxy("/a", "gemini://localhost:1966", max_connections=4)
+    app.mount_proxy("/b", "gemini://localhost:1966/b", max_connections=4)
+
+    with pytest.raises(ValueError):
+        app.mount_proxy("/c", "gemini://localhost:1966", max_connections=8)
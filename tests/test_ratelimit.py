@@ -0,0 +1,41 @@
+from unittest import mock
+
+import pytest
+
+from gemapi.ratelimit import RateLimiter
+from gemapi.ratelimit import SlowDownError
+
+
+def test_rate_limiter__token_bucket() -> None:
+    with mock.patch("time.monotonic", return_value=100.0) as monotonic:
+        rate_limiter = RateLimiter(rate=0.5, burst=2)
+
+        rate_limiter.check("127.0.0.1")
+        rate_limiter.check("127.0.0.1")
+        with pytest.raises(SlowDownError) as exc_info:
+            rate_limiter.check("127.0.0.1")
+
+        assert exc_info.value.retry_after == 2
+        assert exc_info.value.as_response().as_bytes() == b"44 2\r\n"
+        assert rate_limiter.throttled == 1
+
+        # Other clients have their own bucket
+        rate_limiter.check("127.0.0.2")
+
+        monotonic.return_value = 102.0
+        rate_limiter.check("127.0.0.1")
+
+
+def test_rate_limiter__bounded_memory() -> None:
+    with mock.patch("time.monotonic", return_value=100.0) as monotonic:
+        rate_limiter = RateLimiter(rate=1, burst=1, max_clients=3)
+        for i in range(10):
+            rate_limiter.check(f"10.0.0.{i}")
+
+        assert len(rate_limiter) == 3
+
+        # Buckets full again are dropped
+        monotonic.return_value = 101.0
+        rate_limiter.check("127.0.0.1")
+
+        assert len(rate_limiter) == 1
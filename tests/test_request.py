@@ -0,0 +1,80 @@
+import random
+from urllib.parse import urlparse
+
+import pytest
+
+from gemapi.request import RequestTarget
+from gemapi.request import parse_request_line
+from gemapi.responses import BadRequestError
+
+
+@pytest.mark.parametrize(
+    "data,expected",
+    [
+        (b"gemini://localhost\r\n", RequestTarget("gemini", "localhost", "/", "")),
+        (
+            b"gemini://localhost:1965/a/b?q=1\r\n",
+            RequestTarget("gemini", "localhost:1965", "/a/b", "q=1"),
+        ),
+        (b"GEMINI://localhost/\r\n", RequestTarget("gemini", "localhost", "/", "")),
+        (
+            b"gemini://[::1]:1965/?a#frag\r\n",
+            RequestTarget("gemini", "[::1]:1965", "/", "a"),
+        ),
+        (
+            "gemini://localhost/café/%20\r\n".encode(),
+            RequestTarget("gemini", "localhost", "/café/%20", ""),
+        ),
+    ],
+)
+def test_parse_request_line(data: bytes, expected: RequestTarget) -> None:
+    assert parse_request_line(data) == expected
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"https://localhost/\r\n",
+        b"gemini:/localhost/\r\n",
+        b"gemini://localhost/\n",
+        b"gemini://localhost/\xff\r\n",
+        b"gemini:///path\r\n",
+        b"gemini://user@localhost/\r\n",
+        b"gemini://localhost:abc/\r\n",
+        b"gemini://localhost:70000/\r\n",
+        b"gemini://[::1/\r\n",
+        b"gemini://localhost/a\tb\r\n",
+        b"gemini://localhost/%zz\r\n",
+        b"gemini://localhost/search?%4\r\n",
+        b"gemini://localhost/../etc/passwd\r\n",
+        b"gemini://localhost/a/./b\r\n",
+        b"gemini://localhost/%2e%2E/etc/passwd\r\n",
+        b"gemini://localhost/" + b"a" * 1024 + b"\r\n",
+    ],
+)
+def test_parse_request_line__invalid(data: bytes) -> None:
+    with pytest.raises(BadRequestError):
+        parse_request_line(data)
+
+
+def test_parse_request_line__urlparse_equivalence() -> None:
+    rand = random.Random(1965)
+    hosts = ["localhost", "example.com", "localhost:1965", "[::1]", "[::1]:1965"]
+    alphabet = list("abcXYZ019-_~!$&'()*+,;=:@/.é?") + ["%20", "%C3%A9"]
+
+    for _ in range(5000):
+        path = "".join(rand.choices(alphabet, k=rand.randint(0, 30)))
+        url = f"gemini://{rand.choice(hosts)}/{path}"
+        try:
+            target = parse_request_line(url.encode() + b"\r\n")
+        except BadRequestError:
+            # Only dot segments can be rejected with this alphabet
+            assert "/." in url
+            continue
+
+        expected = urlparse(url)
+        assert target.scheme == expected.scheme
+        assert target.netloc == expected.netloc
+        assert target.path == (expected.path or "/")
+        assert target.query == expected.query
+        assert target.geturl() == expected.geturl()
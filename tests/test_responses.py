@@ -0,0 +1,101 @@
+import io
+import threading
+from typing import AsyncIterator
+from typing import Iterator
+
+import pytest
+
+from gemapi.applications import Application
+from gemapi.request import Request
+from gemapi.responses import NotFoundError
+from gemapi.responses import Response
+from gemapi.responses import StatusCode
+from gemapi.responses import StreamingResponse
+from gemapi.responses import encode_header
+from gemapi.testing import TestClient
+
+from .conftest import build_request
+
+
+@pytest.mark.parametrize(
+    "body,expected",
+    [
+        (None, b"20 text/gemini\r\n"),
+        ("# Café", "20 text/gemini\r\n# Café".encode()),
+        (b"# Hello", b"20 text/gemini\r\n# Hello"),
+        (memoryview(b"# Hello"), b"20 text/gemini\r\n# Hello"),
+    ],
+)
+def test_response__as_bytes(
+    body: str | bytes | memoryview | None,
+    expected: bytes,
+) -> None:
+    assert Response(StatusCode.SUCCESS, "text/gemini", body).as_bytes() == expected
+
+
+def test_status_error__header_is_reused() -> None:
+    first = NotFoundError("Not found").as_response().as_bytes()
+    second = NotFoundError("Not found").as_response().as_bytes()
+
+    assert first == b"51 Not found\r\n"
+    assert first is second
+    assert encode_header(StatusCode.NOT_FOUND, "Not found") is first
+
+
+def test_request_and_response__are_slotted() -> None:
+    req = build_request("gemini://localhost/")
+    resp = Response(StatusCode.SUCCESS, "text/gemini")
+
+    for obj in [req, resp]:
+        assert not hasattr(obj, "__dict__")
+
+
+@pytest.mark.asyncio
+async def test_streaming_response__body_is_closed() -> None:
+    app = Application()
+    file_body = io.BytesIO(b"file")
+    threads = []
+
+    def _chunks() -> Iterator[bytes]:
+        threads.append(threading.current_thread())
+        yield b"sync"
+
+    @app.route("/file", run_in_executor=False)
+    def file(req: Request) -> Response:
+        return StreamingResponse(20, "text/plain", file_body)
+
+    @app.route("/iterator", run_in_executor=False)
+    def iterator(req: Request) -> Response:
+        return StreamingResponse(20, "text/plain", _chunks())
+
+    client = TestClient(app)
+
+    resp = await client.request("/file")
+    assert resp.body == b"file"
+    assert file_body.closed
+
+    # Sync iterators are run in a thread
+    resp = await client.request("/iterator")
+    assert resp.body == b"sync"
+    assert threads and threads[0] is not threading.current_thread()
+
+
+@pytest.mark.asyncio
+async def test_streaming_response__aclose() -> None:
+    closed = False
+
+    async def _chunks() -> AsyncIterator[bytes]:
+        nonlocal closed
+        try:
+            yield b"a"
+            yield b"b"
+        finally:
+            closed = True
+
+    body = _chunks()
+    resp = StreamingResponse(20, "text/plain", body)
+    assert await body.__anext__() == b"a"
+
+    # Responses discarded without being written release their body
+    await resp.aclose()
+    assert closed
@@ -0,0 +1,89 @@
+from gemapi.request import Request
+from gemapi.router import Router
+
+
+def _handler(req: Request) -> None:
+    return None
+
+
+def _handler_with_name(req: Request, name: str) -> None:
+    return None
+
+
+def _handler_with_version(req: Request, version: str) -> None:
+    return None
+
+
+def _handler_with_version_and_name(req: Request, name: str, version: str) -> None:
+    return None
+
+
+def test_router__static() -> None:
+    router = Router()
+    router.route("/")(_handler)
+    router.route("/about")(_handler)
+
+    route, params = router.match("/")
+    assert route is not None and route.path == "/"
+    assert params == {}
+
+    route, params = router.match("/about")
+    assert route is not None and route.path == "/about"
+    assert params == {}
+
+
+def test_router__not_found() -> None:
+    router = Router()
+    router.route("/about")(_handler)
+    router.route("/hello/{name:str}")(_handler_with_name)
+
+    assert router.match("/nope") == (None, None)
+    assert router.match("/about/nope") == (None, None)
+    assert router.match("/hello/") == (None, None)
+    assert router.match("/hello/thomas/nope") == (None, None)
+
+
+def test_router__path_params() -> None:
+    router = Router()
+    router.route("/hello/{name:str}")(_handler_with_name)
+    router.route("/docs/v{version}.gmi")(_handler_with_version)
+
+    route, params = router.match("/hello/thomas")
+    assert route is not None and route.path == "/hello/{name:str}"
+    assert params == {"name": "thomas"}
+
+    route, params = router.match("/docs/v2.gmi")
+    assert route is not None and route.path == "/docs/v{version}.gmi"
+    assert params == {"version": "2"}
+
+
+def test_router__static_takes_precedence() -> None:
+    router = Router()
+    router.route("/hello/{name}")(_handler_with_name)
+    router.route("/hello/world")(_handler)
+
+    route, params = router.match("/hello/world")
+    assert route is not None and route.path == "/hello/world"
+    assert params == {}
+
+
+def test_router__backtracking() -> None:
+    router = Router()
+    router.route("/hello/world/static")(_handler)
+    router.route("/hello/{name}/dynamic")(_handler_with_name)
+
+    route, params = router.match("/hello/world/dynamic")
+    assert route is not None and route.path == "/hello/{name}/dynamic"
+    assert params == {"name": "world"}
+
+
+def test_router__first_registered_route_wins() -> None:
+    router = Router()
+    router.route("/hello/{name}")(_handler_with_name)
+    router.route("/hello/{name:str}")(_handler_with_name)
+    router.route("/hello/{name}")(_handler_with_version_and_name)
+
+    route, _ = router.match("/hello/thomas")
+    assert route is not None
+    assert route.path == "/hello/{name}"
+    assert route.handler is _handler_with_name
@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import signal
+import socket
+import ssl
+import time
+from multiprocessing.context import ForkProcess
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from gemapi.applications import Application
+from gemapi.certificates import CertificateManager
+from gemapi.request import ClientCertificate
+from gemapi.request import Request
+from gemapi.responses import Response
+from gemapi.responses import StreamingResponse
+from gemapi.server import Server
+
+_PORT = 19661
+_BIG_BODY_SIZE = 16 * 1024 * 1024
+
+app = Application(write_timeout=0.5)
+
+
+@app.route("/slow")
+async def slow(req: Request) -> Response:
+    await asyncio.sleep(1.0)
+    return Response(20, "text/plain", "done")
+
+
+@app.route("/big")
+async def big(req: Request) -> Response:
+    return StreamingResponse(
+        20, "text/plain", (b"x" * 1024 * 1024 for _ in range(_BIG_BODY_SIZE // 2**20))
+    )
+
+
+@app.route("/whoami")
+async def whoami(req: Request, identity: ClientCertificate) -> Response:
+    return Response(20, "text/plain", f"{identity.subject} {identity.fingerprint}")
+
+
+def _run_server(directory: Path, server_kwargs: dict[str, Any]) -> None:
+    os.chdir(directory)
+    asyncio.run(Server(app, **server_kwargs).run(port=_PORT))
+
+
+def _connect(client_cm: CertificateManager | None = None) -> ssl.SSLSocket:
+    ssl_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    ssl_ctx.check_hostname = False
+    ssl_ctx.verify_mode = ssl.CERT_NONE
+    if client_cm is not None:
+        ssl_ctx.load_cert_chain(client_cm.certfile, client_cm.keyfile)
+    sock = socket.create_connection(("localhost", _PORT), timeout=5)
+    return ssl_ctx.wrap_socket(sock, server_hostname="localhost")
+
+
+def _read_all(sock: ssl.SSLSocket) -> bytes:
+    data = b""
+    try:
+        while chunk := sock.recv(4096):
+            data += chunk
+    except ConnectionError:
+        pass
+    return data
+
+
+def _request(url: bytes, client_cm: CertificateManager | None = None) -> bytes:
+    with _connect(client_cm) as sock:
+        sock.sendall(url + b"\r\n")
+        return _read_all(sock)
+
+
+def _start_server(tmp_path: Path, **server_kwargs: Any) -> ForkProcess:
+    proc = multiprocessing.get_context("fork").Process(
+        target=_run_server, args=(tmp_path, server_kwargs)
+    )
+    proc.start()
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            _connect().close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+
+    proc.kill()
+    raise RuntimeError("Server did not start")
+
+
+def test_server__drain_on_shutdown(tmp_path: Path) -> None:
+    proc = _start_server(tmp_path, drain_timeout=5.0)
+
+    in_flight = _connect()
+    in_flight.sendall(b"gemini://localhost/slow\r\n")
+    # Connected before the shutdown, but the request arrives during the drain
+    idle = _connect()
+    time.sleep(0.2)
+
+    os.kill(proc.pid, signal.SIGTERM)  # type: ignore
+    time.sleep(0.2)
+    idle.sendall(b"gemini://localhost/slow\r\n")
+
+    assert _read_all(idle) == b"41 Server is shutting down\r\n"
+    assert _read_all(in_flight) == b"20 text/plain\r\ndone"
+    # No new connections are accepted
+    with pytest.raises(OSError):
+        _connect()
+
+    proc.join(5)
+    assert proc.exitcode == 0
+
+
+def test_server__drain_timeout(tmp_path: Path) -> None:
+    proc = _start_server(tmp_path, drain_timeout=0.2)
+
+    in_flight = _connect()
+    in_flight.sendall(b"gemini://localhost/slow\r\n")
+    time.sleep(0.2)
+
+    started_at = time.monotonic()
+    os.kill(proc.pid, signal.SIGTERM)  # type: ignore
+
+    # The request is cancelled once the deadline is reached
+    assert _read_all(in_flight) == b""
+    proc.join(5)
+    assert proc.exitcode == 0
+    assert time.monotonic() - started_at < 1.0
+
+
+def test_server__client_certificates(tmp_path: Path) -> None:
+    client_cm = CertificateManager(["alice"], directory=tmp_path / "alice")
+    client_cm.initialize()
+    unknown_cm = CertificateManager(["bob"], directory=tmp_path / "bob")
+    unknown_cm.initialize()
+    der_cert = ssl.PEM_cert_to_DER_cert(client_cm.certfile.read_text())
+
+    proc = _start_server(tmp_path, trusted_client_certificates=client_cm.certfile)
+    try:
+        assert _request(b"gemini://localhost/whoami") == (
+            b"60 Client certificate required\r\n"
+        )
+        assert _request(b"gemini://localhost/whoami", client_cm) == (
+            b"20 text/plain\r\nCN=alice "
+            + hashlib.sha256(der_cert).hexdigest().encode()
+        )
+        # Unregistered certificates are rejected during the handshake (the
+        # server only verifies them after the client is done with TLS 1.3)
+        assert _request(b"gemini://localhost/whoami", unknown_cm) == b""
+    finally:
+        proc.terminate()
+        proc.join(5)
+
+
+def test_server__write_timeout(tmp_path: Path) -> None:
+    proc = _start_server(tmp_path)
+    try:
+        # Slow clients get the whole body as long as they keep reading, even
+        # if it takes longer than the write timeout
+        started_at = time.monotonic()
+        with _connect() as sock:
+            sock.sendall(b"gemini://localhost/big\r\n")
+            received = 0
+            while chunk := sock.recv(16 * 1024):
+                received += len(chunk)
+                time.sleep(0.001)
+        assert received == len(b"20 text/plain\r\n") + _BIG_BODY_SIZE
+        assert time.monotonic() - started_at > 0.5
+
+        # Clients that stop reading are dropped
+        with _connect() as sock:
+            sock.sendall(b"gemini://localhost/big\r\n")
+            time.sleep(1.5)
+            assert len(_read_all(sock)) < _BIG_BODY_SIZE
+    finally:
+        proc.terminate()
+        proc.join(5)
@@ -0,0 +1,59 @@
+from pathlib import Path
+
+import pytest
+
+from gemapi.responses import NotFoundError
+from gemapi.staticfiles import FileResponse
+from gemapi.staticfiles import StaticFiles
+
+
+def test_static_files__symlink_outside_directory(tmp_path: Path) -> None:
+    (tmp_path / "secret.txt").write_text("secret")
+    public = tmp_path / "public"
+    public.mkdir()
+    (public / "index.gmi").write_text("# Hello")
+    (public / "secret.txt").symlink_to(tmp_path / "secret.txt")
+
+    static_files = StaticFiles("/", public)
+
+    resp = static_files.get_response("/index.gmi")
+    assert isinstance(resp, FileResponse)
+    assert resp.meta == "text/gemini"
+    assert resp.size == len("# Hello")
+
+    with pytest.raises(NotFoundError):
+        static_files.get_response("/secret.txt")
+
+
+def test_static_files__cache_is_refreshed(tmp_path: Path) -> None:
+    static_files = StaticFiles("/files", tmp_path, cache_ttl=0)
+
+    with pytest.raises(NotFoundError):
+        static_files.get_response("/files/new.gmi")
+
+    (tmp_path / "new.gmi").write_text("new")
+    resp = static_files.get_response("/files/new.gmi")
+    assert isinstance(resp, FileResponse)
+    assert resp.size == 3
+
+
+def test_static_files__percent_encoded_path(tmp_path: Path) -> None:
+    public = tmp_path / "public"
+    public.mkdir()
+    (public / "my post.gmi").write_text("post")
+    (public / "café.gmi").write_text("café")
+    (tmp_path / "secret.txt").write_text("secret")
+
+    static_files = StaticFiles("/s", public)
+
+    resp = static_files.get_response("/s/my%20post.gmi")
+    assert isinstance(resp, FileResponse)
+    assert resp.path == public / "my post.gmi"
+
+    resp = static_files.get_response("/s/caf%C3%A9.gmi")
+    assert isinstance(resp, FileResponse)
+    assert resp.path == public / "café.gmi"
+
+    for path in ["/s/%2E%2E/secret.txt", "/s/..%2Fsecret.txt", "/s/a%00.gmi"]:
+        with pytest.raises(NotFoundError):
+            static_files.get_response(path)
@@ -0,0 +1,161 @@
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+import pytest
+
+from gemapi.templates import TemplateResponse
+from gemapi.templates import Templates
+from gemapi.templates import TemplateSyntaxError
+from gemapi.templates import compile_template
+
+
+@dataclass
+class Post:
+    url: str
+    title: str
+
+
+_PAGE = """# {{ title }}
+{{ intro }}
+
+{% for post in posts %}
+=> {{ post.url }} {{ post.title }}
+{% endfor %}
+{% if not posts %}
+No posts
+{% else %}
+{{ count }} posts
+{% endif %}
+```{{ lang }}
+{{ code }}
+```
+"""
+
+
+def _render(source: str, **context) -> str:
+    return b"".join(compile_template(source)(context)).decode()
+
+
+def test_compile_template() -> None:
+    output = _render(
+        _PAGE,
+        title="Blog",
+        intro="Hello",
+        posts=[Post("/a", "A"), {"url": "/b", "title": "B"}],
+        count=2,
+        lang="python",
+        code="print(1)",
+    )
+
+    assert output == (
+        "# Blog\n"
+        "Hello\n"
+        "\n"
+        "=> /a A\n"
+        "=> /b B\n"
+        "2 posts\n"
+        "```python\n"
+        "print(1)\n"
+        "```\n"
+    )
+
+
+def test_compile_template__chunks() -> None:
+    header = "# Title\n" + "Static text\n" * 100
+    render = compile_template(header + "{{ name }}\nMore {text}\n")
+
+    # Big static parts are emitted as is, the rest is rendered at once
+    assert render({"name": "x"}) == [header.encode(), b"x\nMore {text}\n"]
+
+
+def test_compile_template__escaping() -> None:
+    output = _render(
+        _PAGE,
+        title="Multi\nline",
+        intro="=> /evil Link\n# Heading\n```",
+        posts=[Post("/a\n=> /evil", "A\r\nB")],
+        count=1,
+        lang="",
+        code="```\n=> /not-a-link",
+    )
+
+    assert output == (
+        "# Multi line\n"
+        " => /evil Link\n"
+        " # Heading\n"
+        " ```\n"
+        "\n"
+        "=> /a%0A=>%20/evil A B\n"
+        "1 posts\n"
+        "```\n"
+        " ```\n"
+        "=> /not-a-link\n"
+        "```\n"
+    )
+
+
+def test_compile_template__line_start_at_render_time() -> None:
+    # Values start a line when the values before them are empty or end one
+    assert _render("{{ a }}{{ b }}\n", a="", b="# h") == " # h\n"
+    assert _render("{{ a }}{{ b }}\n", a="text", b="# h") == "text# h\n"
+    assert _render("x {{ a }}{{ b }}\n", a="", b="# h") == "x # h\n"
+    assert _render("x {{ a }}{{ b }}\n", a="y\n", b="# h") == "x y\n # h\n"
+
+
+def test_compile_template__link_url() -> None:
+    source = "=> {{ base }}/{{ path }} {{ title }}\n"
+
+    # The whitespaces of the URL are encoded, the label is kept as is
+    assert _render(source, base="gemini://a b", path="c d\te", title="My title") == (
+        "=> gemini://a%20b/c%20d%09e My title\n"
+    )
+
+
+def test_compile_template__raw() -> None:
+    assert _render("{{ body|raw }}\n", body="=> /a A\n# B") == "=> /a A\n# B\n"
+    assert _render("=> {{ n|raw }}\n", n=1) == "=> 1\n"
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "{{ 1 + 1 }}",
+        "{{ __import__('os') }}",
+        "{% for x in items %}\n",
+        "{% endif %}\n",
+        "{% if x %}\n{% endfor %}\n",
+        "{% while x %}\n",
+    ],
+)
+def test_compile_template__syntax_error(source: str) -> None:
+    with pytest.raises(TemplateSyntaxError):
+        compile_template(source)
+
+
+def test_templates__cache_and_reload(tmp_path: Path) -> None:
+    template = tmp_path / "page.gmi"
+    template.write_text("# {{ title }}\n")
+
+    templates = Templates(tmp_path)
+    reloading_templates = Templates(tmp_path, auto_reload=True)
+    assert templates.render("page.gmi", {"title": "A"}) == [b"# A\n"]
+    assert reloading_templates.render("page.gmi", {"title": "A"}) == [b"# A\n"]
+
+    template.write_text("## {{ title }}\n")
+    stat = template.stat()
+    os.utime(template, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert templates.render("page.gmi", {"title": "A"}) == [b"# A\n"]
+    assert reloading_templates.render("page.gmi", {"title": "A"}) == [b"## A\n"]
+
+
+def test_templates__outside_directory(tmp_path: Path) -> None:
+    with pytest.raises(ValueError):
+        Templates(tmp_path / "templates").render("../secret.gmi")
+
+
+def test_template_response() -> None:
+    resp = TemplateResponse([b"# Hello", b"\n"])
+
+    assert resp.as_bytes() == b"20 text/gemini\r\n# Hello\n"
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from gemapi.responses import StatusCode
+from gemapi.testing import TestClient
+
+from .app import app
+
+
+@pytest.mark.asyncio
+async def test_client() -> None:
+    client = TestClient(app)
+
+    resp = await client.request("/hello/world")
+    assert resp.status_code == StatusCode.SUCCESS
+    assert resp.meta == "text/gemini"
+    assert resp.text() == "Hello world"
+
+    resp = await client.request("/search")
+    assert resp.status_code == StatusCode.INPUT
+    assert resp.body == b""
+
+    resp = await client.request("/stream-sync")
+    assert len(resp.body) == 1024 * 1024
+
+    resp = await client.request("gemini://example.com/test")
+    assert resp.text() == "example.com test"
+
+
+@pytest.mark.asyncio
+async def test_client__static_files() -> None:
+    # Files are written without sendfile as there's no socket
+    resp = await TestClient(app).request("/static/hello.txt")
+
+    assert resp.status_code == StatusCode.SUCCESS
+    assert resp.meta == "text/plain"
+    assert resp.text() == "hello\n"
+
+
+@pytest.mark.asyncio
+async def test_client__bad_request() -> None:
+    resp = await TestClient(app).send(b"http://localhost/\r\n")
+
+    assert resp.status_code == StatusCode.BAD_REQUEST
+
+
+@pytest.mark.asyncio
+async def test_client__missing_crlf() -> None:
+    client = TestClient(app)
+
+    for data in [b"gemini://localhost/\n", b"gemini://localhost/"]:
+        resp = await client.send(data)
+        assert resp.status_code == StatusCode.BAD_REQUEST
+        assert resp.meta == "Not ending with a CRLF"
+
+    # Nothing is answered to the clients that sent nothing
+    with pytest.raises(ValueError):
+        await client.send(b"")
+
+
+@pytest.mark.asyncio
+async def test_client__concurrent_requests() -> None:
+    client = TestClient(app)
+
+    responses = await asyncio.gather(
+        *[client.request(f"/hello/{i}") for i in range(50)]
+    )
+
+    assert [resp.text() for resp in responses] == [f"Hello {i}" for i in range(50)]
@@ -0,0 +1,94 @@
+import multiprocessing
+import os
+import signal
+import socket
+import ssl
+import time
+from multiprocessing.context import ForkProcess
+from pathlib import Path
+
+from gemapi.applications import Application
+from gemapi.request import Request
+from gemapi.responses import Response
+from gemapi.workers import Supervisor
+
+_PORT = 19663
+
+app = Application()
+
+
+@app.route("/pid")
+async def pid(req: Request) -> Response:
+    return Response(20, "text/plain", str(os.getpid()))
+
+
+def _run_supervisor(directory: Path) -> None:
+    os.chdir(directory)
+    Supervisor(app, 2, port=_PORT).run()
+
+
+def _request_pid() -> int:
+    ssl_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    ssl_ctx.check_hostname = False
+    ssl_ctx.verify_mode = ssl.CERT_NONE
+    sock = socket.create_connection(("localhost", _PORT), timeout=5)
+    with ssl_ctx.wrap_socket(sock, server_hostname="localhost") as tls_sock:
+        tls_sock.sendall(b"gemini://localhost/pid\r\n")
+        data = b""
+        while chunk := tls_sock.recv(4096):
+            data += chunk
+
+    assert data.startswith(b"20 text/plain\r\n")
+    return int(data.split(b"\r\n", 1)[1])
+
+
+def _wait_for_workers(excluded_pids: frozenset[int] = frozenset()) -> set[int]:
+    # The kernel spreads the connections over the workers sharing the port
+    pids: set[int] = set()
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            pids.add(_request_pid())
+        except OSError:
+            time.sleep(0.1)
+            continue
+
+        pids -= excluded_pids
+        if len(pids) == 2:
+            return pids
+
+    raise RuntimeError(f"Workers did not start, pids={pids}")
+
+
+def _start_supervisor(tmp_path: Path) -> ForkProcess:
+    proc = multiprocessing.get_context("fork").Process(
+        target=_run_supervisor, args=(tmp_path,)
+    )
+    proc.start()
+    return proc
+
+
+def test_supervisor__restarts_workers(tmp_path: Path) -> None:
+    proc = _start_supervisor(tmp_path)
+    try:
+        worker_pids = _wait_for_workers()
+
+        killed_pid, alive_pid = sorted(worker_pids)
+        os.kill(killed_pid, signal.SIGKILL)
+
+        # The killed worker is replaced and the port is still served
+        new_pids = _wait_for_workers(excluded_pids=frozenset({killed_pid}))
+        assert alive_pid in new_pids
+        assert killed_pid not in new_pids
+
+        os.kill(proc.pid, signal.SIGTERM)  # type: ignore
+        proc.join(15)
+        assert proc.exitcode == 0
+        for worker_pid in new_pids:
+            assert not os.path.exists(f"/proc/{worker_pid}")
+    finally:
+        # SIGTERM lets the supervisor stop its workers, SIGKILL would orphan them
+        if proc.is_alive():
+            os.kill(proc.pid, signal.SIGTERM)  # type: ignore
+            proc.join(15)
+            proc.kill()